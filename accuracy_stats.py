@@ -0,0 +1,249 @@
+# --- Bootstrap confidence intervals and permutation tests for grouped accuracy ---
+# Works on the columns of an analysis.ResponseStore: accuracy by palette
+# (Exp 2), by shape-type combination (Exp 1) and by shape (Exp 4, where a
+# trial counts towards every shape shown in either plot).
+#
+# Resampling is vectorized: each chunk of resamples is one index matrix
+# (resamples x rows, drawn within groups), so memory stays bounded by
+# MAX_CELLS whatever the number of rows. For 0/1 outcomes the resampled
+# group sums have a closed form (Binomial for the bootstrap, Hypergeometric
+# for a permutation), which is what makes 10k resamples over 1M rows take
+# milliseconds; method="index" forces the index matrix for those too.
+#
+#   python accuracy_stats.py exp2 response_log/Eksperimen_2.jsonl --resamples 10000
+#   python accuracy_stats.py exp4 response_log/Eksperimen_4.jsonl --dim shape --out summaries/exp4
+import argparse
+import csv
+import os
+from itertools import combinations
+
+import numpy as np
+
+from analysis import CATEGORICAL, SCHEMAS, ResponseStore
+
+DEFAULT_RESAMPLES = 10000
+CONFIDENCE = 0.95
+# Index-matrix elements per chunk (~128 MB of int64 indices)
+MAX_CELLS = 1 << 24
+# Dimension reported when --dim is not given
+DEFAULT_DIMS = {"exp1": "shape_combination", "exp2": "palette", "exp4": "shape"}
+
+
+def _chunk_sizes(n_resamples, row_len, max_cells):
+    per_chunk = max(1, max_cells // max(row_len, 1))
+    for start in range(0, n_resamples, per_chunk):
+        yield start, min(start + per_chunk, n_resamples)
+
+
+def _seed_sequence(seed):
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def _sort_by_group(values, groups, n_groups):
+    order = np.argsort(groups, kind="stable")
+    sizes = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    return values[order], sizes, starts
+
+
+def bootstrap_means(values, groups, n_groups=None, n_resamples=DEFAULT_RESAMPLES, seed=None,
+                    method="auto", max_cells=MAX_CELLS):
+    """Resampled group means, shape (n_resamples, n_groups).
+
+    Rows are resampled with replacement within their group, so every
+    resample keeps the observed group sizes. Empty groups give NaN.
+    """
+    rng = np.random.default_rng(seed)
+    groups = np.asarray(groups, np.intp)
+    values = np.asarray(values)
+    n_groups = int(groups.max()) + 1 if n_groups is None else n_groups
+    sorted_values, sizes, starts = _sort_by_group(values, groups, n_groups)
+    out = np.full((n_resamples, n_groups), np.nan)
+    present = np.flatnonzero(sizes)
+
+    if method == "auto":
+        method = "binary" if values.dtype == np.bool_ else "index"
+    if method == "binary":
+        p = np.add.reduceat(sorted_values.astype(np.int64), starts[present]) / sizes[present]
+        for lo, hi in _chunk_sizes(n_resamples, len(present), max_cells):
+            hits = rng.binomial(sizes[present], p, size=(hi - lo, len(present)))
+            out[lo:hi, present] = hits / sizes[present]
+        return out
+
+    # One index matrix per chunk: column j draws from the rows of its group
+    sorted_values = sorted_values.astype(np.float64)
+    col_start = np.repeat(starts[present], sizes[present])
+    col_size = np.repeat(sizes[present], sizes[present])
+    bounds = starts[present] - starts[present[0]]
+    for lo, hi in _chunk_sizes(n_resamples, len(col_start), max_cells):
+        idx = col_start + (rng.random((hi - lo, len(col_start))) * col_size).astype(np.intp)
+        sums = np.add.reduceat(sorted_values[idx], bounds, axis=1)
+        out[lo:hi, present] = sums / sizes[present]
+    return out
+
+
+def bootstrap_ci(values, groups, n_groups=None, n_resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE,
+                 seed=None, method="auto", max_cells=MAX_CELLS):
+    """Percentile bootstrap CI per group: (estimate, low, high, n) arrays."""
+    groups = np.asarray(groups, np.intp)
+    values = np.asarray(values)
+    n_groups = int(groups.max()) + 1 if n_groups is None else n_groups
+    sizes = np.bincount(groups, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        estimate = np.bincount(groups, weights=values.astype(np.float64), minlength=n_groups) / sizes
+    means = bootstrap_means(values, groups, n_groups, n_resamples, seed, method, max_cells)
+    alpha = (1 - confidence) / 2
+    low, high = np.full(n_groups, np.nan), np.full(n_groups, np.nan)
+    present = sizes > 0
+    low[present], high[present] = np.quantile(means[:, present], [alpha, 1 - alpha], axis=0)
+    return estimate, low, high, sizes
+
+
+def permutation_test(values_a, values_b, n_resamples=DEFAULT_RESAMPLES, seed=None, method="auto",
+                     max_cells=MAX_CELLS):
+    """Two-sided permutation test for a difference in means: (difference, p-value)."""
+    rng = np.random.default_rng(seed)
+    a, b = np.asarray(values_a), np.asarray(values_b)
+    pooled = np.concatenate([a, b])
+    n_a, n_b = len(a), len(b)
+    total = pooled.sum(dtype=np.float64)
+    observed = a.mean() - b.mean()
+    if method == "auto":
+        method = "binary" if pooled.dtype == np.bool_ else "index"
+
+    extreme = 0
+    for lo, hi in _chunk_sizes(n_resamples, len(pooled), max_cells):
+        if method == "binary":
+            # Correct answers that land in A under a random relabelling
+            sum_a = rng.hypergeometric(int(total), len(pooled) - int(total), n_a, size=hi - lo).astype(np.float64)
+        else:
+            keys = rng.random((hi - lo, len(pooled)))
+            idx = np.argpartition(keys, n_a - 1, axis=1)[:, :n_a] if n_a < len(pooled) else np.argsort(keys, axis=1)
+            sum_a = pooled.astype(np.float64)[idx].sum(axis=1)
+        diff = sum_a / n_a - (total - sum_a) / n_b
+        extreme += int(np.count_nonzero(np.abs(diff) >= abs(observed) - 1e-12))
+    return float(observed), (extreme + 1) / (n_resamples + 1)
+
+
+def holm(p_values):
+    """Holm-Bonferroni adjusted p-values, in the input order."""
+    p = np.asarray(p_values, np.float64)
+    order = np.argsort(p)
+    adjusted = np.maximum.accumulate(p[order] * (len(p) - np.arange(len(p))))
+    out = np.empty_like(p)
+    out[order] = np.minimum(adjusted, 1.0)
+    return out
+
+
+def pairwise_tests(values, groups, n_groups=None, n_resamples=DEFAULT_RESAMPLES, seed=None, method="auto",
+                   max_cells=MAX_CELLS):
+    """Permutation test for every pair of non-empty groups.
+
+    Returns rows (a, b, difference, p, p_holm); each pair gets its own
+    child stream of *seed*.
+    """
+    groups = np.asarray(groups, np.intp)
+    values = np.asarray(values)
+    n_groups = int(groups.max()) + 1 if n_groups is None else n_groups
+    sorted_values, sizes, starts = _sort_by_group(values, groups, n_groups)
+    by_group = {g: sorted_values[starts[g]:starts[g] + sizes[g]] for g in np.flatnonzero(sizes)}
+    pairs = list(combinations(sorted(by_group), 2))
+    seeds = _seed_sequence(seed).spawn(len(pairs))
+    results = [permutation_test(by_group[a], by_group[b], n_resamples, s, method, max_cells)
+               for (a, b), s in zip(pairs, seeds)]
+    adjusted = holm([p for _, p in results]) if results else []
+    return [(int(a), int(b), diff, p, float(adj)) for (a, b), (diff, p), adj in zip(pairs, results, adjusted)]
+
+
+# --- Grouping from a ResponseStore ---
+def shape_rows(store):
+    """Exp 4: one (status, shape) row per shape shown in a trial.
+
+    Returns (values, shape codes, shape labels). A trial showing both shapes
+    of a pair counts for both, so pairwise tests between shapes are
+    approximate there.
+    """
+    dims = ("plot_a_shapes", "plot_b_shapes")
+    split = {dim: [[s.strip() for s in shape_set.split(",") if s.strip()]
+                   for shape_set in store.categories[dim].labels] for dim in dims}
+    labels = sorted({shape for dim in dims for shapes in split[dim] for shape in shapes})
+    codes = {shape: i for i, shape in enumerate(labels)}
+    shown = np.zeros((store.n, len(labels)), bool)
+    for dim in dims:
+        member = np.zeros((len(split[dim]), len(labels)), bool)
+        for i, shapes in enumerate(split[dim]):
+            member[i, [codes[s] for s in shapes]] = True
+        shown |= member[store.column(dim)]
+    rows, shapes = np.nonzero(shown)
+    return store.column("status")[rows], shapes, labels
+
+
+def grouped(store, dim):
+    """(values, group codes, group labels) for accuracy by *dim*."""
+    if dim == "shape":
+        if store.experiment != "exp4":
+            raise ValueError("Per-shape grouping needs Exp 4 responses")
+        return shape_rows(store)
+    if dim not in store.dimensions:
+        raise ValueError(f"Unknown dimension {dim!r}, expected one of {store.dimensions}")
+    codes = store.column(dim).astype(np.intp)
+    if dim in CATEGORICAL:
+        labels = list(store.categories[dim].labels)
+    else:
+        labels = [str(i) for i in range(int(codes.max()) + 1 if len(codes) else 0)]
+    return store.column("status"), codes, labels
+
+
+def summarize(store, dim, n_resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE, seed=None, method="auto"):
+    """CI rows (label, n, accuracy %, low %, high %) and pairwise rows (label a, label b, diff %, p, p_holm)."""
+    values, groups, labels = grouped(store, dim)
+    if not len(values):
+        return [], []
+    seeds = _seed_sequence(seed).spawn(2)
+    estimate, low, high, sizes = bootstrap_ci(values, groups, len(labels), n_resamples, confidence, seeds[0], method)
+    ci_rows = [(labels[g], int(sizes[g]), 100 * estimate[g], 100 * low[g], 100 * high[g])
+               for g in np.flatnonzero(sizes)]
+    pair_rows = [(labels[a], labels[b], 100 * diff, p, p_holm)
+                 for a, b, diff, p, p_holm in pairwise_tests(values, groups, len(labels), n_resamples, seeds[1], method)]
+    return ci_rows, pair_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap CIs and pairwise permutation tests for accuracy.")
+    parser.add_argument("experiment", choices=sorted(SCHEMAS))
+    parser.add_argument("sources", nargs="*", help="response log .jsonl files or Sheets CSV exports")
+    parser.add_argument("--state", default=None, help="columnar store saved by analysis.py")
+    parser.add_argument("--dim", default=None, help="grouping (default: palette / shape_combination / shape)")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--method", choices=("auto", "binary", "index"), default="auto")
+    parser.add_argument("--out", default=None, help="directory for ci_by_<dim>.csv and pairwise_<dim>.csv")
+    args = parser.parse_args(argv)
+
+    store = ResponseStore.load(args.state, args.experiment) if args.state else ResponseStore(args.experiment)
+    for source in args.sources:
+        store.ingest(source)
+    dim = args.dim or DEFAULT_DIMS[args.experiment]
+    ci_rows, pair_rows = summarize(store, dim, args.resamples, args.confidence, args.seed, args.method)
+
+    print(f"Accuracy by {dim}, {args.confidence:.0%} bootstrap CI ({args.resamples} resamples):")
+    for label, n, pct, low, high in ci_rows:
+        print(f"  {label!s:<28} {pct:6.2f}%  [{low:6.2f}, {high:6.2f}]  n={n}")
+    print("\nPairwise permutation tests (Holm-adjusted):")
+    for a, b, diff, p, p_holm in pair_rows:
+        print(f"  {a!s:<20} vs {b!s:<20} {diff:+7.2f} pp  p={p:.4f}  p_holm={p_holm:.4f}")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for name, header, rows in (("ci_by", [dim, "responses", "accuracy_pct", "ci_low_pct", "ci_high_pct"], ci_rows),
+                                   ("pairwise", [f"{dim}_a", f"{dim}_b", "difference_pp", "p", "p_holm"], pair_rows)):
+            path = os.path.join(args.out, f"{name}_{dim}.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+            print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# --- Incremental, columnar analysis of experiment responses ---
+# Replaces the notebooks' load-everything pandas code. Responses are ingested
+# from the local response log (response_log/<worksheet>.jsonl) or a Sheets CSV
+# export into typed NumPy columns (categorical codes for palette, shape
+# combination and status), and the accuracy tables the notebooks plot are
+# kept as running counts. Each source remembers how far it was read, so a
+# re-run only parses rows that arrived since the last one.
+#
+#   python analysis.py exp1 response_log/Eksperimen_1.jsonl --state analysis_state/exp1 --out summaries/exp1
+#   python analysis.py exp2 Eksperimen_HCI_ShapeItUp-Eksperimen_2.csv --state analysis_state/exp2
+import argparse
+import csv
+import io
+import json
+import os
+
+import numpy as np
+
+# 'Benar'/'Salah' (Exp 1), 'Correct'/'Incorrect' (Exp 2), True/False (Exp 4),
+# normalized once at ingest instead of on every pass
+STATUS_VALUES = {"benar": True, "correct": True, "true": True,
+                 "salah": False, "incorrect": False, "false": False}
+
+# column -> (CSV header, lower-cased; position in a logged row)
+SCHEMAS = {
+    "exp1": {"n_categories": ("jumlah kategori", 2),
+             "shape_combination": ("kombinasi tipe", 3),
+             "status": ("status", 6)},
+    "exp2": {"palette": ("palet", 1),
+             "n_categories": ("jumlah kategori", 2),
+             "status": ("status benar/salah", 5)},
+    # Exp 4 rows are the response_data dict values, headers are its keys
+    "exp4": {"plot_a_shapes": ("plota_shapes", 6),
+             "plot_b_shapes": ("plotb_shapes", 7),
+             "response_time": ("response_time", 5),
+             "status": ("is_correct", 4)},
+}
+CATEGORICAL = ("palette", "shape_combination", "plot_a_shapes", "plot_b_shapes")
+MEASURES = ("status", "response_time")
+DTYPES = {"n_categories": np.int8, "palette": np.int16, "shape_combination": np.int16,
+          "plot_a_shapes": np.int16, "plot_b_shapes": np.int16,
+          "response_time": np.float32, "status": np.bool_}
+
+
+def parse_status(value):
+    if isinstance(value, bool):
+        return value
+    try:
+        return STATUS_VALUES[str(value).strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown status value: {value!r}") from None
+
+
+class Categories:
+    """Dictionary encoding: label <-> small integer code."""
+
+    def __init__(self, labels=()):
+        self.labels = list(labels)
+        self.codes = {label: i for i, label in enumerate(self.labels)}
+
+    def encode(self, values):
+        out = np.empty(len(values), np.int16)
+        for i, v in enumerate(values):
+            v = str(v).strip()
+            code = self.codes.get(v)
+            if code is None:
+                code = self.codes[v] = len(self.labels)
+                self.labels.append(v)
+            out[i] = code
+        return out
+
+
+class ResponseStore:
+    """Typed columns plus running accuracy counts for one experiment."""
+
+    def __init__(self, experiment):
+        if experiment not in SCHEMAS:
+            raise ValueError(f"Unknown experiment {experiment!r}, expected one of {sorted(SCHEMAS)}")
+        self.experiment = experiment
+        self.schema = SCHEMAS[experiment]
+        self.n = 0
+        self.columns = {name: np.empty(0, DTYPES[name]) for name in self.schema}
+        self.categories = {name: Categories() for name in self.schema if name in CATEGORICAL}
+        self.cursors = {}  # source path -> byte offset read up to
+        self.seqs = {}  # JSONL path -> last seq seen, guards against re-reading entries
+        self.headers = {}  # CSV path -> column positions from its header row
+        self.dimensions = [name for name in self.schema if name not in MEASURES]
+        self.totals = {dim: np.zeros(0, np.int64) for dim in self.dimensions}
+        self.correct = {dim: np.zeros(0, np.int64) for dim in self.dimensions}
+
+    # --- Ingest ---
+    def _append(self, raw):
+        """Encode a batch of raw column lists, append it and update the counts."""
+        count = len(raw["status"])
+        if not count:
+            return 0
+        batch = {}
+        for name in self.schema:
+            if name in CATEGORICAL:
+                batch[name] = self.categories[name].encode(raw[name])
+            elif name == "status":
+                batch[name] = np.fromiter((parse_status(v) for v in raw[name]), np.bool_, count)
+            elif name == "response_time":
+                batch[name] = np.asarray(raw[name], DTYPES[name])
+            else:
+                batch[name] = np.asarray([int(float(v)) for v in raw[name]], DTYPES[name])
+
+        # Grow by doubling so appends stay amortized O(rows)
+        needed = self.n + count
+        for name, col in self.columns.items():
+            if len(col) < needed:
+                grown = np.empty(max(needed, 2 * len(col), 1024), col.dtype)
+                grown[:self.n] = col[:self.n]
+                self.columns[name] = grown
+            self.columns[name][self.n:needed] = batch[name]
+        self.n = needed
+
+        status = batch["status"]
+        for dim in self.dimensions:
+            codes = batch[dim].astype(np.intp)
+            size = max(len(self.totals[dim]), int(codes.max()) + 1)
+            self.totals[dim] = np.pad(self.totals[dim], (0, size - len(self.totals[dim])))
+            self.correct[dim] = np.pad(self.correct[dim], (0, size - len(self.correct[dim])))
+            self.totals[dim] += np.bincount(codes, minlength=size)
+            self.correct[dim] += np.bincount(codes[status], minlength=size)
+        return count
+
+    def ingest_jsonl(self, path):
+        """Read entries appended to a response log since the last byte offset."""
+        offset = self.cursors.get(path, 0)
+        last = self.seqs.get(path, 0)
+        with open(path, "rb") as f:
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0  # log was replaced, the seq check skips what was already read
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a torn last line is picked up once it is complete
+        raw = {name: [] for name in self.schema}
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry["seq"] <= last:
+                continue
+            for name, (_, pos) in self.schema.items():
+                raw[name].append(entry["row"][pos])
+            last = entry["seq"]
+        self.cursors[path] = offset + end
+        self.seqs[path] = last
+        return self._append(raw)
+
+    def ingest_csv(self, path):
+        """Read rows appended to a CSV export since the last byte offset."""
+        offset = self.cursors.get(path, 0)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # only complete lines
+        if not end:
+            return 0
+        reader = csv.reader(io.StringIO(data[:end].decode("utf-8-sig")))
+        if path not in self.headers:
+            header = [h.strip().lower() for h in next(reader)]
+            self.headers[path] = {name: header.index(col) for name, (col, _) in self.schema.items()}
+        positions = self.headers[path]
+        raw = {name: [] for name in self.schema}
+        for row in reader:
+            if not row or not row[positions["status"]].strip():
+                continue
+            for name, pos in positions.items():
+                raw[name].append(row[pos])
+        self.cursors[path] = offset + end
+        return self._append(raw)
+
+    def ingest(self, path):
+        path = os.path.abspath(path)
+        return self.ingest_jsonl(path) if path.endswith(".jsonl") else self.ingest_csv(path)
+
+    # --- Summaries ---
+    def column(self, name):
+        return self.columns[name][:self.n]
+
+    def overall_accuracy(self):
+        return float(self.column("status").mean()) if self.n else float("nan")
+
+    def accuracy_by(self, dim):
+        """Rows of (group, responses, correct, accuracy %) for groups seen so far."""
+        totals, correct = self.totals[dim], self.correct[dim]
+        rows = []
+        for code in np.flatnonzero(totals):
+            label = self.categories[dim].labels[code] if dim in CATEGORICAL else int(code)
+            rows.append((label, int(totals[code]), int(correct[code]), float(100.0 * correct[code] / totals[code])))
+        return rows
+
+    def export(self, out_dir):
+        """Write accuracy_by_<dimension>.csv for every dimension of this experiment."""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for dim in self.dimensions:
+            path = os.path.join(out_dir, f"accuracy_by_{dim}.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow([dim, "responses", "correct", "accuracy_pct"])
+                writer.writerows(self.accuracy_by(dim))
+            paths.append(path)
+        return paths
+
+    # --- Persistence ---
+    def save(self, state_dir):
+        os.makedirs(state_dir, exist_ok=True)
+        arrays = {f"col_{k}": self.column(k) for k in self.columns}
+        arrays.update({f"tot_{k}": v for k, v in self.totals.items()})
+        arrays.update({f"cor_{k}": v for k, v in self.correct.items()})
+        np.savez(os.path.join(state_dir, "columns.npz"), **arrays)
+        meta = {"experiment": self.experiment, "n": self.n, "cursors": self.cursors, "seqs": self.seqs,
+                "headers": self.headers,
+                "categories": {k: c.labels for k, c in self.categories.items()}}
+        tmp = os.path.join(state_dir, "state.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(state_dir, "state.json"))
+
+    @classmethod
+    def load(cls, state_dir, experiment):
+        """Restore a saved store, or start an empty one if *state_dir* has none."""
+        store = cls(experiment)
+        try:
+            with open(os.path.join(state_dir, "state.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return store
+        if meta["experiment"] != experiment:
+            raise ValueError(f"State in {state_dir} is for {meta['experiment']}, not {experiment}")
+        with np.load(os.path.join(state_dir, "columns.npz")) as arrays:
+            store.columns = {k: arrays[f"col_{k}"].copy() for k in store.columns}
+            store.totals = {k: arrays[f"tot_{k}"].copy() for k in store.dimensions}
+            store.correct = {k: arrays[f"cor_{k}"].copy() for k in store.dimensions}
+        store.n = meta["n"]
+        store.cursors = meta["cursors"]
+        store.seqs = meta["seqs"]
+        store.headers = meta["headers"]
+        store.categories = {k: Categories(v) for k, v in meta["categories"].items()}
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally aggregate experiment accuracy.")
+    parser.add_argument("experiment", choices=sorted(SCHEMAS))
+    parser.add_argument("sources", nargs="+", help="response log .jsonl files or Sheets CSV exports")
+    parser.add_argument("--state", default=None, help="directory to keep the columnar store between runs")
+    parser.add_argument("--out", default=None, help="directory for the summary CSVs")
+    args = parser.parse_args(argv)
+
+    store = ResponseStore.load(args.state, args.experiment) if args.state else ResponseStore(args.experiment)
+    for source in args.sources:
+        added = store.ingest(source)
+        print(f"{source}: {added} new rows")
+    if args.state:
+        store.save(args.state)
+
+    print(f"Total responses: {store.n}, accuracy: {100 * store.overall_accuracy():.2f}%")
+    for dim in store.dimensions:
+        print(f"\nAccuracy by {dim}:")
+        for label, total, correct, pct in store.accuracy_by(dim):
+            print(f"  {label!s:<28} {pct:6.2f}%  ({correct}/{total})")
+    if args.out:
+        for path in store.export(args.out):
+            print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
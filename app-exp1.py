@@ -2,57 +2,39 @@
 import streamlit as st
 import os
 import random
-import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+import time
+import uuid
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
+import metrics
+import client_render
+import response_clock
+from sprites import warm
+from response_log import get_response_log
+from sheets import get_worksheet
+import scheduler
+from trial_plan import exp1_conditions, make_exp1_plan
+from session_store import ResponseRecords
+from stimulus_cache import discard, get_png, prefetch, warm_renderer
+from stimuli import LABEL_MAP, SHAPE_TYPE_MAP, SPRITE_SIZE, collect_unique_shapes, exp1_figure, exp1_spec
+
+rerun_ns = time.perf_counter_ns()
+metrics.begin_rerun("exp1")
+if not client_render.ENABLED:
+    warm_renderer()  # matplotlib loads in the background while the page starts
 
 # --- Google Sheets Setup ---
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=scope)
-client = gspread.authorize(creds)
-sheet = client.open_by_key("1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g").worksheet("Eksperimen_1")
-
-# --- Shape Mapping ---
-SHAPE_TYPE_MAP = {
-    "circle": "filled", "circle-unfilled": "unfilled", "circle-filled": "filled", "dot": "filled",
-    "square": "filled", "square-unfilled": "unfilled", "square-x-open": "open", "square-filled": "filled",
-    "triangle-filled": "filled", "triangle-unfilled": "unfilled", "triangle-downward-unfilled": "unfilled",
-    "triangle-left-unfilled": "unfilled", "triangle-right-unfilled": "unfilled",
-    "star-filled": "filled", "star-unfilled": "unfilled", "sixlinestar-open": "open", "eightline-star-open": "open",
-    "plus-filled": "filled", "plus-unfilled": "unfilled", "plus-open": "open",
-    "cross-open": "open", "diamond": "filled", "diamond-filled": "filled", "diamond-unfilled": "unfilled",
-    "diamond-plus-open": "open", "y": "filled", "y-filled": "filled", "minus-open": "open",
-    "arrow-vertical-open": "open", "arrow-horizontal-open": "open",
-}
-
-LABEL_MAP = {k: k for k in SHAPE_TYPE_MAP}
-
-ROOT_FOLDERS = ["Shapes-D3", "Shapes-Excel", "Shapes-Tableau", "Shapes-Matlab", "Shapes-R"]
-
-# --- Utility to collect shapes ---
-def collect_unique_shapes():
-    shape_dict = {}
-    for folder in ROOT_FOLDERS:
-        if not os.path.exists(folder):
-            continue
-        for fname in os.listdir(folder):
-            if fname.endswith(".png"):
-                raw = os.path.splitext(fname)[0]
-                if raw in SHAPE_TYPE_MAP and raw not in shape_dict:
-                    shape_dict[raw] = os.path.join(folder, fname)
-    return list(shape_dict.values())
+response_log = get_response_log("Eksperimen_1", lambda: get_worksheet("Eksperimen_1"))
 
 SHAPE_POOL = collect_unique_shapes()
+warm(SHAPE_POOL, (SPRITE_SIZE,))
 
 # --- Initialize session state ---
 if "task_index" not in st.session_state:
     st.session_state.task_index = 0
     st.session_state.correct = 0
     st.session_state.total_tasks = 53
+    st.session_state.responses = ResponseRecords(st.session_state.total_tasks)
+    st.session_state.participant = uuid.uuid4().hex
 
 index = st.session_state.task_index
 mode = "latihan" if index < 3 else "eksperimen"
@@ -60,63 +42,47 @@ mode = "latihan" if index < 3 else "eksperimen"
 st.title("🧠 Experiment 1: Estimating Based on Shape")
 st.subheader(f"{'🔍 Training' if mode == 'latihan' else '📊 Experiment'} #{index + 1 if mode == 'latihan' else index - 2 + 1}")
 
-# --- Generate task ---
-if f"x_data_{index}" not in st.session_state:
-    shape_counts = {"filled": 0, "unfilled": 0, "open": 0}
-    for s in SHAPE_POOL:
-        label = os.path.splitext(os.path.basename(s))[0]
-        t = SHAPE_TYPE_MAP.get(label)
-        if t: shape_counts[t] += 1
-
-    valid_types = [t for t, c in shape_counts.items() if c >= 3]
-    if len(valid_types) < 1:
-        st.error("❌ Not enough shape types for experiment.")
+# --- Trial plan (all trials drawn once per session) ---
+# With TRIAL_SCHEDULER=adaptive the conditions come from the shared scheduler
+if "plan" not in st.session_state:
+    try:
+        with metrics.phase("trial_plan"):
+            conditions = None
+            if scheduler.ADAPTIVE:
+                conditions = scheduler.get_scheduler(1, exp1_conditions(SHAPE_POOL, SHAPE_TYPE_MAP)).assign(
+                    st.session_state.total_tasks)
+            st.session_state.plan = make_exp1_plan(SHAPE_POOL, SHAPE_TYPE_MAP, st.session_state.total_tasks,
+                                                   seed=random.randint(0, 2**32 - 1), conditions=conditions)
+    except ValueError as e:
+        st.error(f"❌ {e}")
         st.stop()
 
-    selected_types = random.sample(valid_types, random.randint(1, min(3, len(valid_types))))
-    valid_shapes = [s for s in SHAPE_POOL if SHAPE_TYPE_MAP.get(os.path.splitext(os.path.basename(s))[0]) in selected_types]
-    if len(valid_shapes) < 3:
-        st.error("❌ Not enough valid shapes to continue.")
-        st.stop()
-
-    N = random.randint(2, min(10, len(valid_shapes)))
-    chosen_shapes = random.sample(valid_shapes, N)
-    means = np.random.uniform(0.3, 1.0, N)
-    y_data = [np.random.normal(loc=m, scale=0.05, size=20) for m in means]
-    x_data = [np.random.uniform(0.0, 1.5, 20) for _ in range(N)]
-    target_idx = int(np.argmax([np.mean(y) for y in y_data]))
-
-    shape_labels = [LABEL_MAP[os.path.splitext(os.path.basename(s))[0]] for s in chosen_shapes]
-
-    st.session_state[f"x_data_{index}"] = x_data
-    st.session_state[f"y_data_{index}"] = y_data
-    st.session_state[f"chosen_shapes_{index}"] = chosen_shapes
-    st.session_state[f"shape_labels_{index}"] = shape_labels
-    st.session_state[f"target_idx_{index}"] = target_idx
+# --- End ---
+if index >= len(st.session_state.plan):
+    st.success(f"🎉 Experiment complete! Final score: {st.session_state.correct} out of 50.")
+    st.balloons()
+    st.stop()
 
-# --- Load state ---
-x_data = st.session_state[f"x_data_{index}"]
-y_data = st.session_state[f"y_data_{index}"]
-chosen_shapes = st.session_state[f"chosen_shapes_{index}"]
-shape_labels = st.session_state[f"shape_labels_{index}"]
-target_idx = st.session_state[f"target_idx_{index}"]
+# --- Load trial ---
+trial = st.session_state.plan.trial(index)
+chosen_shapes = trial["chosen_shapes"]
+shape_labels = [LABEL_MAP[label] for label in trial["shape_labels"]]
+target_idx = trial["target_idx"]
 
 # --- Visualize ---
-fig, ax = plt.subplots()
-for i in range(len(chosen_shapes)):
-    img = Image.open(chosen_shapes[i]).convert("RGBA").resize((20, 20))
-    im = OffsetImage(img, zoom=1.0)
-    for x, y in zip(x_data[i], y_data[i]):
-        ab = AnnotationBbox(im, (x, y), frameon=False)
-        ax.add_artist(ab)
-    ax.scatter([], [], label=f"Category {i+1} ({shape_labels[i]})")
-
-ax.set_xlim(-0.1, 1.6)
-ax.set_ylim(-0.1, 1.6)
-ax.set_xlabel("X")
-ax.set_ylabel("Y")
-ax.legend()
-st.pyplot(fig)
+plan = st.session_state.plan
+trial_id = f"exp1/{plan.seed}/{index}"
+if client_render.ENABLED:
+    with metrics.phase("stimulus"):
+        client_render.scatter(exp1_spec(trial), key="exp1-plot", stimulus=trial_id)
+else:
+    with metrics.phase("stimulus"):
+        png = get_png(("exp1", plan.seed, index), lambda: exp1_figure(trial))
+    with metrics.phase("st_image"):
+        st.image(png, width="stretch")
+response_clock.track(st.session_state, trial_id, rerun_ns, canvas=client_render.ENABLED)
+if index + 1 < len(plan) and not client_render.ENABLED:
+    prefetch(("exp1", plan.seed, index + 1), lambda: exp1_figure(plan.trial(index + 1)))
 
 # --- User Input ---
 selected_label = st.selectbox("📍 Select the category with the highest Y mean:",
@@ -125,6 +91,7 @@ selected_index = int(selected_label.split()[1]) - 1
 
 # --- Submit ---
 if st.button("🚀 Submit Answer"):
+    timing = response_clock.measure(st.session_state, rerun_ns)
     correct = selected_index == target_idx
     if correct:
         st.session_state.correct += 1
@@ -138,20 +105,29 @@ if st.button("🚀 Submit Answer"):
 
     if mode == "eksperimen":
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        shape_types_used = "+".join(sorted(set(SHAPE_TYPE_MAP.get(os.path.splitext(os.path.basename(s))[0], '') for s in chosen_shapes)))
+        shape_types_used = trial["shape_types_used"]
         row = [timestamp, index - 2 + 1, len(chosen_shapes), shape_types_used,
                shape_labels[selected_index], shape_labels[target_idx], "Benar" if correct else "Salah",
                ", ".join([os.path.basename(f) for f in chosen_shapes])]
+        row += [timing[field] for field in response_clock.FIELDS]
+        record = {"submitted_at": timestamp, "participant": st.session_state.participant, "mode": mode,
+                  "task_number": index - 2 + 1, "n_categories": len(chosen_shapes),
+                  "shape_combination": shape_types_used, "choice": shape_labels[selected_index],
+                  "answer": shape_labels[target_idx], "correct": bool(correct), "seed": plan.seed,
+                  "shapes": [os.path.basename(f) for f in chosen_shapes], **timing}
         try:
-            sheet.append_row(row)
+            seq = response_log.append(row, record)
+            discard(("exp1", plan.seed, index))
         except Exception as e:
-            st.warning(f"Failed to save to sheet: {e}")
+            seq = -1
+            st.warning(f"Failed to save response: {e}")
+        st.session_state.responses.add(index, selected_index, correct, timing["response_time"], seq)
+        if scheduler.ADAPTIVE:
+            scheduler.get_scheduler(1, exp1_conditions(SHAPE_POOL, SHAPE_TYPE_MAP)).record(
+                (len(chosen_shapes), shape_types_used), correct)
 
     st.session_state.task_index += 1
     st.rerun()
 
-# --- End ---
-if st.session_state.task_index == st.session_state.total_tasks:
-    st.success(f"🎉 Experiment complete! Final score: {st.session_state.correct} out of 50.")
-    st.balloons()
-    st.stop()
+metrics.panel()
+metrics.end_rerun()
@@ -1,35 +1,66 @@
 # --- Streamlit App Experiment 2 (Final & Clean - English Version) ---
 import streamlit as st
-import matplotlib.pyplot as plt
 import numpy as np
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
-import os
-from PIL import Image
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+import random
+import time
+import uuid
+import metrics
+import client_render
+import response_clock
+import scheduler
+from sprites import warm
+from response_log import get_response_log
+from sheets import get_worksheet
+from session_store import ResponseRecords
+from stimulus_cache import discard, get_png, warm_renderer
+from stimuli import (PALETTES, SPRITE_SIZE, exp2_figure, exp2_spec, exp2_target, make_exp2_trial, palette_dir,
+                     palette_files, palette_folder, palette_paths)
 
-# --- Google Sheets Authentication ---
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=scope)
-client = gspread.authorize(creds)
-worksheet = client.open_by_key("1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g").worksheet("Eksperimen_2")
+rerun_ns = time.perf_counter_ns()
+metrics.begin_rerun("exp2")
+if not client_render.ENABLED:
+    warm_renderer()  # matplotlib loads in the background while the page starts
+
+# --- Google Sheets Logging ---
+response_log = get_response_log("Eksperimen_2", lambda: get_worksheet("Eksperimen_2"))
 
 # --- UI Header ---
 st.title("🧪 Experiment 2: Evaluating Shape Palettes in Scatterplots")
 st.info("Select the category (shape) that has the highest **mean Y value**. Shapes are taken from popular visualization tool palettes.")
 
+
+def show_feedback(is_correct, true_idx):
+    if is_correct:
+        st.success(f"✅ Correct! Category {true_idx+1} had the highest Y mean.")
+    else:
+        st.error(f"❌ Incorrect. The correct answer was Category {true_idx+1}.")
+
+
+if "last_answer" in st.session_state:
+    show_feedback(*st.session_state.pop("last_answer"))
+
 # --- Select Palette & Category Count ---
-available_palettes = ["D3", "Tableau", "Excel", "Matlab", "R"]
-selected_palette = st.selectbox("🎨 Select a shape palette:", available_palettes)
-n_categories = st.selectbox("🔢 Select number of categories:", list(range(2, 11)))
+# With TRIAL_SCHEDULER=adaptive the shared scheduler assigns them, one trial at a time
+available_palettes = PALETTES
+for p in available_palettes:
+    warm(palette_paths(p), (SPRITE_SIZE,))
+if scheduler.ADAPTIVE:
+    exp2_scheduler = scheduler.get_scheduler(2, scheduler.exp2_conditions(
+        {p: len(palette_files(p)) for p in available_palettes}))
+    if "condition" not in st.session_state:
+        st.session_state.condition = exp2_scheduler.assign()[0]
+    selected_palette, n_categories = st.session_state.condition
+    st.markdown(f"🎨 Palette: **{selected_palette}** · 🔢 Categories: **{n_categories}**")
+else:
+    selected_palette = st.selectbox("🎨 Select a shape palette:", available_palettes)
+    n_categories = st.selectbox("🔢 Select number of categories:", list(range(2, 11)))
 
 # --- Load Shape Files ---
-palette_path = f"Shapes-{selected_palette}"
-try:
-    shape_files = sorted([f for f in os.listdir(palette_path) if f.endswith(".png")])
-except FileNotFoundError:
-    st.error(f"Folder '{palette_path}' not found.")
+palette_path = palette_dir(selected_palette)
+shape_files = palette_files(selected_palette)
+if not shape_files:
+    st.error(f"Folder '{palette_folder(selected_palette)}' not found.")
     st.stop()
 
 if len(shape_files) < n_categories:
@@ -37,52 +68,46 @@ if len(shape_files) < n_categories:
     st.stop()
 
 # --- Trial Identity & Session State Check ---
+# Only the trial's seed is kept; shapes and data are redrawn from it each rerun
 current_key = (selected_palette, n_categories)
-if (
-    "selected_shapes" not in st.session_state
-    or "x_data" not in st.session_state
-    or "y_data" not in st.session_state
-    or st.session_state.get("current_key") != current_key
-):
+if "trial_seed" not in st.session_state or st.session_state.get("current_key") != current_key:
+    if "trial_seed" in st.session_state:
+        discard(("exp2", st.session_state.trial_seed))
     st.session_state.current_key = current_key
-    st.session_state.selected_shapes = np.random.choice(shape_files, size=n_categories, replace=False)
-    st.session_state.x_data = [np.random.uniform(0, 1.5, 20) for _ in range(n_categories)]
-    st.session_state.y_data = [np.random.normal(loc=np.random.uniform(0.3, 1.2), scale=0.1, size=20) for _ in range(n_categories)]
+    st.session_state.trial_seed = random.randint(0, 2**32 - 1)
+if "responses" not in st.session_state:
+    st.session_state.responses = ResponseRecords(53)
+    st.session_state.participant = uuid.uuid4().hex
 
-# --- Retrieve From State ---
-selected_shapes = st.session_state.selected_shapes
-x_data = st.session_state.x_data
-y_data = st.session_state.y_data
+trial = make_exp2_trial(shape_files, n_categories, np.random.default_rng(st.session_state.trial_seed))
+selected_shapes = trial["selected_shapes"]
+x_data = trial["x_data"]
+y_data = trial["y_data"]
 
 # --- Plot Scatterplot ---
-fig, ax = plt.subplots()
-for i in range(n_categories):
-    shape_path = os.path.join(palette_path, selected_shapes[i])
-    label_name = selected_shapes[i].replace(".png", "")
-    img = Image.open(shape_path).convert("RGBA").resize((20, 20))
-    im = OffsetImage(img, zoom=1.0)
-
-    for x, y in zip(x_data[i], y_data[i]):
-        ab = AnnotationBbox(im, (x, y), frameon=False)
-        ax.add_artist(ab)
-
-    ax.scatter([], [], label=f"Category {i+1} ({label_name})")
-
-ax.set_xlim(-0.1, 1.6)
-ax.set_ylim(-0.1, 1.6)
-ax.set_xlabel("X")
-ax.set_ylabel("Y")
-ax.legend()
-st.pyplot(fig)
+# Rendered once per trial; selectbox reruns reuse the cached image
+trial_id = f"exp2/{st.session_state.trial_seed}"
+if client_render.ENABLED:
+    with metrics.phase("stimulus"):
+        client_render.scatter(exp2_spec(palette_path, selected_shapes, x_data, y_data), key="exp2-plot",
+                              stimulus=trial_id)
+else:
+    with metrics.phase("stimulus"):
+        png = get_png(("exp2", st.session_state.trial_seed),
+                      lambda: exp2_figure(palette_path, selected_shapes, x_data, y_data))
+    with metrics.phase("st_image"):
+        st.image(png, width="stretch")
+response_clock.track(st.session_state, trial_id, rerun_ns, canvas=client_render.ENABLED)
 
 # --- User Selection ---
 selected_label = st.selectbox("📍 Choose the category with the **highest Y mean**:",
                               [f"Category {i+1}" for i in range(n_categories)])
 selected_index = int(selected_label.split()[1]) - 1
-true_idx = int(np.argmax([np.mean(y) for y in y_data]))
+true_idx = exp2_target(y_data)
 
 # --- Submission ---
 if st.button("🚀 Submit Answer"):
+    timing = response_clock.measure(st.session_state, rerun_ns)
     is_correct = (selected_index == true_idx)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     response = [
@@ -92,14 +117,29 @@ if st.button("🚀 Submit Answer"):
         selected_label,
         f"Category {true_idx+1}",
         "Correct" if is_correct else "Incorrect",
-        ", ".join(selected_shapes)
+        ", ".join(selected_shapes),
+        *(timing[field] for field in response_clock.FIELDS)
     ]
+    record = {"submitted_at": timestamp, "participant": st.session_state.participant,
+              "palette": selected_palette, "n_categories": n_categories, "choice": selected_label,
+              "answer": f"Category {true_idx+1}", "correct": bool(is_correct),
+              "seed": st.session_state.trial_seed, "shapes": list(selected_shapes), **timing}
 
     try:
-        worksheet.append_row(response)
-        if is_correct:
-            st.success(f"✅ Correct! Category {true_idx+1} had the highest Y mean.")
-        else:
-            st.error(f"❌ Incorrect. The correct answer was Category {true_idx+1}.")
+        seq = response_log.append(response, record)
+        st.session_state.responses.add(st.session_state.responses.n, selected_index, is_correct,
+                                       timing["response_time"], seq)
+        if scheduler.ADAPTIVE:
+            # Straight on to the next assigned condition, with this answer's feedback on top;
+            # dropping the trial key draws a new trial even if the cell repeats
+            exp2_scheduler.record(current_key, is_correct)
+            st.session_state.condition = exp2_scheduler.assign()[0]
+            st.session_state.last_answer = (is_correct, true_idx)
+            del st.session_state["current_key"]
+            st.rerun()
+        show_feedback(is_correct, true_idx)
     except Exception as e:
         st.error(f"Failed to log response: {e}")
+
+metrics.panel()
+metrics.end_rerun()
@@ -1,13 +1,21 @@
 import streamlit as st
 import os
 import random
-import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+import time
+import uuid
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
+import metrics
+import client_render
+import response_clock
+from sprites import warm
+from response_log import get_response_log
+from sheets import get_worksheet
+from trial_plan import make_exp4_plan
+from session_store import ResponseRecords
+from stimulus_cache import discard, get_png, prefetch, warm_renderer
+from stimuli import ALL_SHAPES, EXP4_SPRITE_SIZE, SHAPES_FOLDER, exp4_spec, generate_scatterplot, palette_paths
+
+rerun_ns = time.perf_counter_ns()
 
 # --- Configuration ---
 st.set_page_config(page_title="Shape Correlation Experiment", layout="wide")
@@ -15,83 +23,46 @@ st.set_page_config(page_title="Shape Correlation Experiment", layout="wide")
 # --- Constants ---
 TOTAL_TASKS = 54
 TRAINING_TASKS = 3
-SHAPES_FOLDER = "Shapes-All"
 
-# --- Google Sheets Setup ---
-def init_google_sheets():
-    try:
-        scope = ["https://spreadsheets.google.com/feeds", 
-                "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=scope)
-        client = gspread.authorize(creds)
-        return client.open_by_key("1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g").worksheet("Eksperimen_4")
-    except Exception as e:
-        st.error(f"Failed to connect to Google Sheets: {str(e)}")
-        return None
+warm(palette_paths(ALL_SHAPES), (EXP4_SPRITE_SIZE,))
+if not client_render.ENABLED:
+    warm_renderer()  # matplotlib loads in the background while the page starts
 
 # --- Shape Management ---
 def load_shapes():
-    if not os.path.exists(SHAPES_FOLDER):
+    shapes = palette_paths(ALL_SHAPES)
+    if not shapes:
         st.error(f"Shape folder '{SHAPES_FOLDER}' not found!")
         return []
-    
-    try:
-        shapes = [os.path.join(SHAPES_FOLDER, f) 
-                for f in os.listdir(SHAPES_FOLDER) 
-                if f.lower().endswith('.png')]
-        
-        if len(shapes) < 4:
-            st.error(f"Need at least 4 shapes in {SHAPES_FOLDER}, found {len(shapes)}")
-            return []
-        
-        return shapes
-    except Exception as e:
-        st.error(f"Error loading shapes: {str(e)}")
+
+    if len(shapes) < 4:
+        st.error(f"Need at least 4 shapes in {SHAPES_FOLDER}, found {len(shapes)}")
         return []
 
+    return shapes
+
 # --- Plot Generation ---
-def generate_scatterplot(is_high_corr, shape_paths, seed):
-    """Generate a scatterplot with fixed randomness using seed"""
-    try:
-        np.random.seed(seed)  # Fix randomness with seed
-        
-        fig, ax = plt.subplots(figsize=(4, 4))
-        for shape_path in shape_paths:
-            mean = np.random.uniform(0.3, 1.2, 2)
-            
-            if is_high_corr:
-                cov = [[0.02, 0.015], [0.015, 0.02]]
-            else:
-                cov = [[0.02, 0], [0, 0.02]]
-                
-            data = np.random.multivariate_normal(mean, cov, 20)
-            
-            img = Image.open(shape_path).convert("RGBA").resize((12, 12))
-            im = OffsetImage(img, zoom=1.0)
-            
-            for x, y in data:
-                ab = AnnotationBbox(im, (x, y), frameon=False)
-                ax.add_artist(ab)
-        
-        ax.set_xlim(0, 1.6)
-        ax.set_ylim(0, 1.6)
-        ax.axhline(0.8, color='gray', linestyle='--', linewidth=0.5)
-        ax.axvline(0.8, color='gray', linestyle='--', linewidth=0.5)
-        ax.set_xticks([])
-        ax.set_yticks([])
-        return fig
-    except Exception as e:
-        st.error(f"Error generating plot: {str(e)}")
-        return None
+def plot_image(plan, step, plot, background=False):
+    """PNG bytes of Plot A/B for a step, rendered once (or queued for rendering)"""
+    task_data = plan.trial(step)
+    key = ("exp4", plan.seed, step, plot)
+    build = lambda: generate_scatterplot(
+        task_data['high_corr_plot'] == plot,
+        task_data[f'plot{plot}_shapes'],
+        task_data['seed'],
+        plot
+    )
+    if background:
+        return prefetch(key, build)
+    return get_png(key, build)
 
 # --- Session State Initialization ---
 def init_session_state():
     if 'initialized' not in st.session_state:
         st.session_state.step = 0
-        st.session_state.saved_data = [None] * TOTAL_TASKS
-        st.session_state.start_time = datetime.now()
-        st.session_state.responses = []
-        st.session_state.current_seed = random.randint(0, 1000000)
+        st.session_state.plan = None
+        st.session_state.responses = ResponseRecords(TOTAL_TASKS)
+        st.session_state.participant = uuid.uuid4().hex
         st.session_state.initialized = True
 
 # --- Main App ---
@@ -101,7 +72,7 @@ def main():
         init_session_state()
         
         # Load other components
-        sheet = init_google_sheets()
+        response_log = get_response_log("Eksperimen_4", lambda: get_worksheet("Eksperimen_4"))
         shapes = load_shapes()
         
         if not shapes or len(shapes) < 4:
@@ -133,25 +104,17 @@ def main():
         st.subheader(f"{current_mode} Task {st.session_state.step + 1}/{TOTAL_TASKS}")
         st.progress((st.session_state.step + 1) / TOTAL_TASKS)
         
-        # Initialize task data if not exists
-        if st.session_state.saved_data[st.session_state.step] is None:
+        # Draw the whole session's trials once
+        if st.session_state.plan is None:
             try:
-                plotA_shapes = random.sample(shapes, random.randint(2, 4))
-                plotB_shapes = random.sample(shapes, random.randint(2, 4))
-                high_corr_plot = random.choice(["A", "B"])
-                
-                st.session_state.saved_data[st.session_state.step] = {
-                    'plotA_shapes': plotA_shapes,
-                    'plotB_shapes': plotB_shapes,
-                    'high_corr_plot': high_corr_plot,
-                    'seed': st.session_state.current_seed
-                }
+                with metrics.phase("trial_plan"):
+                    st.session_state.plan = make_exp4_plan(shapes, TOTAL_TASKS, seed=random.randint(0, 2**32 - 1))
             except Exception as e:
                 st.error(f"Error initializing task: {str(e)}")
                 st.stop()
         
         # Safely get task data
-        task_data = st.session_state.saved_data[st.session_state.step]
+        task_data = st.session_state.plan.trial(st.session_state.step)
         if not isinstance(task_data, dict) or 'high_corr_plot' not in task_data:
             st.error("Invalid task data format. Resetting experiment.")
             st.session_state.clear()
@@ -159,30 +122,34 @@ def main():
             return
         
         # Display the two plots
+        plan = st.session_state.plan
+        trial_id = f"exp4/{plan.seed}/{st.session_state.step}"
         col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("**Plot A**")
-            figA = generate_scatterplot(
-                task_data['high_corr_plot'] == "A",
-                task_data['plotA_shapes'],
-                task_data['seed']
-            )
-            if figA:
-                st.pyplot(figA)
-            else:
-                st.stop()
-
-        with col2:
-            st.markdown("**Plot B**")
-            figB = generate_scatterplot(
-                task_data['high_corr_plot'] == "B",
-                task_data['plotB_shapes'],
-                task_data['seed']
-            )
-            if figB:
-                st.pyplot(figB)
-            else:
-                st.stop()
+        for col, plot in ((col1, "A"), (col2, "B")):
+            with col:
+                st.markdown(f"**Plot {plot}**")
+                try:
+                    if client_render.ENABLED:
+                        with metrics.phase("stimulus"):
+                            client_render.scatter(exp4_spec(task_data['high_corr_plot'] == plot,
+                                                            task_data[f'plot{plot}_shapes'],
+                                                            task_data['seed'], plot), key=f"exp4-plot-{plot}",
+                                              stimulus=f"{trial_id}/{plot}")
+                    else:
+                        with metrics.phase("stimulus"):
+                            png = plot_image(plan, st.session_state.step, plot)
+                        with metrics.phase("st_image"):
+                            st.image(png, width="stretch")
+                except Exception as e:
+                    st.error(f"Error generating plot: {str(e)}")
+                    st.stop()
+        response_clock.track(st.session_state, trial_id, rerun_ns, [f"{trial_id}/{plot}" for plot in "AB"],
+                             canvas=client_render.ENABLED)
+        
+        # Render the next step's plots while the participant answers
+        if st.session_state.step + 1 < TOTAL_TASKS and not client_render.ENABLED:
+            for plot in ("A", "B"):
+                plot_image(plan, st.session_state.step + 1, plot, background=True)
         
         # User response
         choice = st.radio("Which plot shows higher correlation?", ["A", "B"], index=None)
@@ -194,7 +161,8 @@ def main():
             
             # Calculate response metrics
             is_correct = choice == task_data['high_corr_plot']
-            response_time = (datetime.now() - st.session_state.start_time).total_seconds()
+            timing = response_clock.measure(st.session_state, rerun_ns)
+            response_time = timing["response_time"]
             
             # Store response
             response_data = {
@@ -207,18 +175,30 @@ def main():
                 "plotA_shapes": ", ".join([os.path.basename(p) for p in task_data['plotA_shapes']]),
                 "plotB_shapes": ", ".join([os.path.basename(p) for p in task_data['plotB_shapes']]),
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "seed": task_data['seed']
+                "seed": task_data['seed'],
+                "render_ms": timing["render_ms"],
+                "transfer_ms": timing["transfer_ms"],
+                "decision_ms": timing["decision_ms"]
             }
             
-            # Save to Google Sheets (only for actual experiment)
-            if not is_training and sheet:
+            # Log response; flushed to Google Sheets in the background (only for actual experiment)
+            seq = -1
+            if not is_training:
                 try:
-                    sheet.append_row(list(response_data.values()))
+                    record = {"submitted_at": response_data["timestamp"], "participant": st.session_state.participant,
+                              "mode": current_mode, "task_number": response_data["task_number"],
+                              "choice": choice, "answer": task_data['high_corr_plot'], "correct": is_correct,
+                              "seed": int(task_data['seed']), **timing,
+                              "shapes": {"A": list(task_data['plotA_shapes']), "B": list(task_data['plotB_shapes'])}}
+                    seq = response_log.append(list(response_data.values()), record)
                 except Exception as e:
                     st.error(f"Failed to save data: {str(e)}")
             
-            # Store in session
-            st.session_state.responses.append(response_data)
+            # Store in session; the rendered plots are no longer needed
+            st.session_state.responses.add(st.session_state.step, "AB".index(choice), is_correct,
+                                           response_time, seq)
+            for plot in ("A", "B"):
+                discard(("exp4", plan.seed, st.session_state.step, plot))
             
             # Provide feedback during training
             if is_training:
@@ -229,10 +209,8 @@ def main():
                 
                 st.info("This was a training example. The actual experiment will begin next.")
             
-            # Move to next task with new seed
+            # Move to next task
             st.session_state.step += 1
-            st.session_state.start_time = datetime.now()
-            st.session_state.current_seed = random.randint(0, 1000000)
             st.rerun()
     
     except Exception as e:
@@ -242,4 +220,7 @@ def main():
         st.rerun()
 
 if __name__ == "__main__":
+    metrics.begin_rerun("exp4")
     main()
+    metrics.panel()
+    metrics.end_rerun()
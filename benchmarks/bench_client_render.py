@@ -0,0 +1,58 @@
+# --- Server cost and bytes per trial: PNG rendering vs client-side payload ---
+# Usage: python benchmarks/bench_client_render.py [--trials 20]
+# For Exp 1 and Exp 4 plans, times figure_from_spec + PNG encode against
+# client_render.payload for the same specs and reports the bytes each sends.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import client_render  # noqa: E402
+from stimuli import (ALL_SHAPES, SHAPE_TYPE_MAP, collect_unique_shapes, exp1_spec, exp4_spec,  # noqa: E402
+                     figure_from_spec, palette_paths)
+from stimulus_cache import figure_to_png  # noqa: E402
+from trial_plan import make_exp1_plan, make_exp4_plan  # noqa: E402
+
+
+def specs(trials):
+    plan = make_exp1_plan(collect_unique_shapes(), SHAPE_TYPE_MAP, trials, seed=1)
+    yield "exp1", [exp1_spec(plan.trial(i)) for i in range(trials)]
+    plan = make_exp4_plan(palette_paths(ALL_SHAPES), trials, seed=1)
+    out = []
+    for i in range(trials):
+        t = plan.trial(i)
+        out += [exp4_spec(t["high_corr_plot"] == p, t[f"plot{p}_shapes"], t["seed"], p) for p in "AB"]
+    yield "exp4", out
+
+
+def payload_bytes(args):
+    return len(args["points"]) + len(json.dumps({k: v for k, v in args.items() if k != "points"}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20)
+    args = parser.parse_args()
+
+    name, _ = client_render.atlas()
+    atlas_bytes = os.path.getsize(os.path.join(client_render.COMPONENT_DIR, name))
+    print(f"atlas {name}: {atlas_bytes:,} B, fetched once per browser\n")
+    print(f"{'':<6} {'PNG ms':>8} {'PNG B':>9} {'client ms':>10} {'client B':>9}")
+    for exp, batch in specs(args.trials):
+        t0 = time.perf_counter()
+        pngs = [figure_to_png(figure_from_spec(spec)) for spec in batch]
+        t1 = time.perf_counter()
+        payloads = [client_render.payload(spec) for spec in batch]
+        t2 = time.perf_counter()
+        n = len(batch)
+        print(f"{exp:<6} {1000 * (t1 - t0) / n:>8.1f} {np.mean([len(p) for p in pngs]):>9,.0f} "
+              f"{1000 * (t2 - t1) / n:>10.3f} {np.mean([payload_bytes(p) for p in payloads]):>9,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# --- Cost of the metrics hooks, on and off ---
+# Usage: python benchmarks/bench_metrics.py [--calls 200000]
+# Times phase()/count() per call and compares with a typical rerun budget.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import metrics  # noqa: E402
+
+# Hooks hit per rerun of the heaviest app (Exp 4): begin/end, ~8 phases, ~4 counters
+HOOKS_PER_RERUN = 14
+RERUN_MS = 50.0  # a fast, fully cached rerun
+
+
+def per_call_ns(calls):
+    t0 = time.perf_counter_ns()
+    for _ in range(calls):
+        with metrics.phase("bench"):
+            pass
+        metrics.count("bench")
+    return (time.perf_counter_ns() - t0) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+    metrics.METRICS_FILE = os.path.join(tempfile.mkdtemp(prefix="bench-metrics-"), "metrics.prom")
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        metrics.begin_rerun("bench")
+        ns = per_call_ns(args.calls)
+        metrics.end_rerun()
+        share = HOOKS_PER_RERUN * ns / 1e6 / RERUN_MS
+        print(f"metrics {'on ' if enabled else 'off'}: {ns:7.0f} ns per phase+count, "
+              f"{share:.3%} of a {RERUN_MS:.0f} ms rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# --- Micro-benchmark: AnnotationBbox-per-point vs batched SpriteLayer ---
+# Usage: python benchmarks/bench_render.py [--repeat 5] [--dpi 200] [--size 20] [--subpixel 2]
+# The batched layer is timed twice: resampling every sprite per point
+# (SUBPIXEL_STEPS = 0, the default, within a few levels) and once per snapped
+# sub-pixel phase (--subpixel, opt-in), with the largest pixel difference
+# of each against the AnnotationBbox figure and the time of the sprite layer's
+# own draw.
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.offsetbox import AnnotationBbox, OffsetImage
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import rendering  # noqa: E402
+from rendering import add_sprite_markers  # noqa: E402
+
+
+def make_trial(n, sprites, rng):
+    """Exp 1 style data: n categories × 20 points."""
+    means = rng.uniform(0.3, 1.0, n)
+    y_data = [rng.normal(loc=m, scale=0.05, size=20) for m in means]
+    x_data = [rng.uniform(0.0, 1.5, 20) for _ in range(n)]
+    return list(zip(sprites[:n], x_data, y_data))
+
+
+def _setup_axes(ax, groups):
+    for i in range(len(groups)):
+        ax.scatter([], [], label=f"Category {i+1}")
+    ax.set_xlim(-0.1, 1.6)
+    ax.set_ylim(-0.1, 1.6)
+    ax.set_xlabel("X")
+    ax.set_ylabel("Y")
+    ax.legend()
+
+
+def plot_annotationbbox(groups):
+    fig, ax = plt.subplots()
+    for sprite, xs, ys in groups:
+        im = OffsetImage(sprite, zoom=1.0)
+        for x, y in zip(xs, ys):
+            ax.add_artist(AnnotationBbox(im, (x, y), frameon=False))
+    _setup_axes(ax, groups)
+    return fig
+
+
+def plot_batched(groups):
+    fig, ax = plt.subplots()
+    add_sprite_markers(ax, groups)
+    _setup_axes(ax, groups)
+    return fig
+
+
+def to_png(fig, dpi):
+    # Same savefig options st.pyplot uses
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def time_render(plot, groups, dpi, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        to_png(plot(groups), dpi)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def pixel_diff(groups, dpi):
+    """(max, mean) absolute channel difference between the two PNGs, None if their sizes differ."""
+    a = np.asarray(Image.open(io.BytesIO(to_png(plot_annotationbbox(groups), dpi))), dtype=np.int16)
+    b = np.asarray(Image.open(io.BytesIO(to_png(plot_batched(groups), dpi))), dtype=np.int16)
+    if a.shape != b.shape:
+        return None
+    d = np.abs(a - b)
+    return d.max(), d.mean()
+
+
+def time_layer(groups, dpi, repeat):
+    """Best time of the SpriteLayer composite alone, on an already drawn figure."""
+    fig = plot_batched(groups)
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    layer, renderer = fig.axes[0].artists[0], fig.canvas.get_renderer()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        layer.draw(renderer)
+        best = min(best, time.perf_counter() - t0)
+    plt.close(fig)
+    return best
+
+
+def time_batched(groups, dpi, repeat, steps):
+    """(PNG seconds, layer seconds, pixel diff) of the batched layer with SUBPIXEL_STEPS = *steps*."""
+    rendering.SUBPIXEL_STEPS = steps
+    return (time_render(plot_batched, groups, dpi, repeat), time_layer(groups, dpi, repeat),
+            pixel_diff(groups, dpi))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--size", type=int, default=20, help="sprite size in px (20 for Exp 1/2, 12 for Exp 4)")
+    parser.add_argument("--subpixel", type=int, default=2,
+                        help="snapped steps per pixel to compare with per-point resampling")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT, "Shapes-All", "*.png")))[:10]
+    sprites = [np.asarray(Image.open(p).convert("RGBA").resize((args.size, args.size))) for p in paths]
+    rng = np.random.default_rng(0)
+
+    snapped = f"1/{args.subpixel} px"
+    print(f"{'':>12} {'annbbox':>8} | {'per point':^36} | {snapped:^36}")
+    columns = f" | {'png ms':>8} {'speedup':>8} {'layer ms':>8} {'px diff':>9}"
+    print(f"{'N':>3} {'artists':>8} {'png ms':>8}" + columns * 2)
+    for n in range(2, 11):
+        groups = make_trial(n, sprites, rng)
+        old = time_render(plot_annotationbbox, groups, args.dpi, args.repeat)
+        line = f"{n:>3} {n * 20:>8} {old * 1e3:>8.1f}"
+        for steps in (0, args.subpixel):
+            new, layer, diff = time_batched(groups, args.dpi, args.repeat, steps)
+            diff = "size" if diff is None else f"{diff[0]}/{diff[1]:.2f}"
+            line += f" | {new * 1e3:>8.1f} {old / new:>7.2f}x {layer * 1e3:>8.1f} {diff:>9}"
+        print(line)
+    print("px diff: max/mean absolute difference per channel against the AnnotationBbox PNG")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# --- SQLite response store: batched inserts and analytic queries at scale ---
+# Usage: python benchmarks/bench_response_db.py [--trials 1000000] [--batch 1000] [--db path]
+# Fills a fresh database with synthetic Exp 2 trials through ResponseDB.insert
+# (the response log's store path), then times accuracy by palette x
+# n_categories and by shape, each from the running counts and over the
+# trials tables, and checks that both ways agree.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from response_db import ResponseDB  # noqa: E402
+
+PALETTES = ("D3", "Excel", "Matlab", "R", "Tableau")
+SHAPES = [f"shape{i}" for i in range(12)]
+
+
+def records(n, seed):
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(len(PALETTES), size=n)
+    n_cat = rng.integers(2, 11, size=n)
+    correct = rng.random(n) < 0.5 + 0.04 * palette   # palettes differ in accuracy
+    for i in range(n):
+        shapes = rng.choice(len(SHAPES), n_cat[i], replace=False)
+        yield {"submitted_at": "2025-01-01 12:00:00", "participant": f"p{i // 53}",
+               "palette": PALETTES[palette[i]], "n_categories": int(n_cat[i]), "choice": "Category 1",
+               "answer": "Category 1", "correct": bool(correct[i]), "shapes": [SHAPES[s] for s in shapes]}
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=1000, help="rows per insert transaction")
+    parser.add_argument("--db", default=None, help="database file (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "responses.db")
+    db = ResponseDB(path)
+    seq, batch = db.last_seq("Eksperimen_2"), []
+    start = time.perf_counter()
+    for record in records(args.trials, args.seed):
+        seq += 1
+        batch.append((seq, None, record))
+        if len(batch) == args.batch:
+            db.insert("Eksperimen_2", batch)
+            batch = []
+    db.insert("Eksperimen_2", batch)
+    insert_s = time.perf_counter() - start
+    print(f"{args.trials:,} trials inserted in batches of {args.batch}: {insert_s:.1f} s "
+          f"({args.trials / insert_s:,.0f} trials/s), {os.path.getsize(path) / 1e6:.0f} MB")
+
+    for by, repeat in ((("palette", "n_categories"), 5), (("shape",), 1)):
+        counts, counts_s = timed(lambda: db.accuracy(2, by))
+        grouped, grouped_s = timed(lambda: db.accuracy(2, by, from_counts=False), repeat)
+        assert [row[:-1] for row in counts] == [row[:-1] for row in grouped]
+        assert np.allclose([row[-1] for row in counts], [row[-1] for row in grouped])
+        name = " x ".join(by)
+        print(f"  accuracy by {name:<24} running counts {1000 * counts_s:8.2f} ms, "
+              f"over trials {1000 * grouped_s:8.1f} ms ({len(counts)} groups)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# --- Bytes per session: original session_state layout vs the compact one ---
+# Usage: python benchmarks/bench_session_state.py [--sessions 500]
+# Builds the state one participant holds at the end of Exp 1 (53 trials) and
+# Exp 4 (54 trials) both ways and sizes it with session_store.session_bytes.
+import argparse
+import os
+import random
+import sys
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+from session_store import ResponseRecords, session_bytes  # noqa: E402
+from stimuli import ALL_SHAPES, SHAPE_TYPE_MAP, SHAPES_FOLDER, collect_unique_shapes, palette_paths  # noqa: E402
+from trial_plan import make_exp1_plan, make_exp4_plan, shape_label  # noqa: E402
+
+EXP1_TRIALS = 53
+EXP4_TRIALS = 54
+
+
+def exp1_before(pool):
+    # One set of keys per trial, never evicted (the original app-exp1.py)
+    state = {"task_index": EXP1_TRIALS, "correct": 40, "total_tasks": EXP1_TRIALS}
+    for i in range(EXP1_TRIALS):
+        n = random.randint(2, 10)
+        chosen = random.sample(pool, n)
+        y = [np.random.normal(m, 0.05, 20) for m in np.random.uniform(0.3, 1.0, n)]
+        state[f"x_data_{i}"] = [np.random.uniform(0.0, 1.5, 20) for _ in range(n)]
+        state[f"y_data_{i}"] = y
+        state[f"chosen_shapes_{i}"] = chosen
+        state[f"shape_labels_{i}"] = [shape_label(p) for p in chosen]
+        state[f"target_idx_{i}"] = int(np.argmax([np.mean(v) for v in y]))
+    return state
+
+
+def exp1_after(pool):
+    plan = make_exp1_plan(pool, SHAPE_TYPE_MAP, EXP1_TRIALS, seed=random.randint(0, 2**32 - 1))
+    responses = ResponseRecords(EXP1_TRIALS)
+    for i in range(EXP1_TRIALS):
+        responses.add(i, 0, True, seq=i)
+    return {"task_index": EXP1_TRIALS, "correct": 40, "total_tasks": EXP1_TRIALS,
+            "plan": plan, "responses": responses}
+
+
+def exp4_response(i, shapes_a, shapes_b):
+    return {"task_number": i + 1, "mode": "Experiment", "choice": "A", "correct_answer": "B",
+            "is_correct": False, "response_time": 3.2,
+            "plotA_shapes": ", ".join(os.path.basename(p) for p in shapes_a),
+            "plotB_shapes": ", ".join(os.path.basename(p) for p in shapes_b),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "seed": random.randint(0, 1000000)}
+
+
+def exp4_before(shapes):
+    # saved_data per step plus every response dict (the original app-exp4.py)
+    saved, responses = [], []
+    for i in range(EXP4_TRIALS):
+        listing = [os.path.join(SHAPES_FOLDER, os.path.basename(p)) for p in shapes]  # fresh per rerun
+        a, b = random.sample(listing, random.randint(2, 4)), random.sample(listing, random.randint(2, 4))
+        saved.append({"plotA_shapes": a, "plotB_shapes": b, "high_corr_plot": "A", "seed": 12345})
+        responses.append(exp4_response(i, a, b))
+    return {"step": EXP4_TRIALS, "saved_data": saved, "current_seed": 12345,
+            "start_time": datetime.now(), "responses": responses, "initialized": True}
+
+
+def exp4_after(shapes):
+    plan = make_exp4_plan(shapes, EXP4_TRIALS, seed=random.randint(0, 2**32 - 1))
+    responses = ResponseRecords(EXP4_TRIALS)
+    for i in range(EXP4_TRIALS):
+        responses.add(i, 0, False, 3.2, i)
+    return {"step": EXP4_TRIALS, "plan": plan, "start_time": datetime.now(),
+            "responses": responses, "initialized": True}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500, help="concurrent sessions to extrapolate to")
+    args = parser.parse_args()
+    random.seed(0)
+    np.random.seed(0)
+
+    pool = collect_unique_shapes()
+    shapes = palette_paths(ALL_SHAPES)
+    # Path strings of the process-wide pools are shared by every session
+    shared = pool + shapes
+    print(f"{'':<6} {'before':>10} {'after':>10} {'ratio':>7}   at {args.sessions} sessions")
+    for name, before, after, source in (("exp1", exp1_before, exp1_after, pool),
+                                        ("exp4", exp4_before, exp4_after, shapes)):
+        b = session_bytes(before(source), shared)
+        a = session_bytes(after(source), shared)
+        print(f"{name:<6} {b:>9,}B {a:>9,}B {b / a:>6.1f}x   "
+              f"{b * args.sessions / 2**20:.1f} MB -> {a * args.sessions / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
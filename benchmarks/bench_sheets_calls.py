@@ -0,0 +1,95 @@
+# --- Auth / metadata calls per 100 reruns: per-rerun auth vs shared client ---
+# Usage: python benchmarks/bench_sheets_calls.py [--reruns 100]
+# Runs offline against a counting stand-in for the gspread client. "before"
+# runs copies of the apps' setup from before the shared client (Exp 1's
+# module-level block, Exp 4's init_google_sheets()) once per rerun, as
+# Streamlit did, with gspread.authorize handing out the same stand-in that
+# sheets.set_client_factory gets for "after".
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import sheets  # noqa: E402
+
+WORKSHEET = "Eksperimen_1"
+
+
+class CountingClient:
+    """Counts the calls that hit Google for auth and spreadsheet metadata."""
+
+    calls = {"auth": 0, "metadata": 0}
+
+    def __init__(self):
+        CountingClient.calls["auth"] += 1
+
+    def open_by_key(self, key):
+        CountingClient.calls["metadata"] += 1
+        return self
+
+    def worksheet(self, name):
+        CountingClient.calls["metadata"] += 1
+        return object()
+
+
+# --- Baseline: the apps' Sheets setup before sheets.py, names as they used them ---
+gspread = SimpleNamespace(authorize=lambda creds: CountingClient())
+Credentials = SimpleNamespace(from_service_account_info=lambda info, scopes: object())
+st = SimpleNamespace(secrets={"google_sheets": {}})
+
+
+def exp1_module_setup():
+    # Top of app-exp1.py (Exp 2 and 3 alike), run on every rerun
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=scope)
+    client = gspread.authorize(creds)
+    sheet = client.open_by_key("1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g").worksheet("Eksperimen_1")
+    return sheet
+
+
+def init_google_sheets():
+    # app-exp4.py, called from main() on every rerun; the st.error fallback is left out
+    scope = ["https://spreadsheets.google.com/feeds",
+             "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=scope)
+    client = gspread.authorize(creds)
+    return client.open_by_key("1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g").worksheet("Eksperimen_4")
+
+
+def before(reruns, setup):
+    CountingClient.calls = {"auth": 0, "metadata": 0}
+    for _ in range(reruns):
+        setup()
+    return dict(CountingClient.calls)
+
+
+def after(reruns):
+    CountingClient.calls = {"auth": 0, "metadata": 0}
+    sheets.set_client_factory(CountingClient)
+    try:
+        for _ in range(reruns):
+            sheets.get_worksheet(WORKSHEET)
+        stats = sheets.stats()
+    finally:
+        sheets.set_client_factory(None)
+    assert stats["auth_calls"] == CountingClient.calls["auth"]
+    return dict(CountingClient.calls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'':>12} {'auth':>6} {'metadata':>9}   (per {args.reruns} reruns)")
+    for label, fn in (("before exp1", lambda n: before(n, exp1_module_setup)),
+                      ("before exp4", lambda n: before(n, init_google_sheets)),
+                      ("after", after)):
+        calls = fn(args.reruns)
+        print(f"{label:>12} {calls['auth']:>6} {calls['metadata']:>9}")
+
+
+if __name__ == "__main__":
+    main()
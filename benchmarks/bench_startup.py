@@ -0,0 +1,140 @@
+# --- Cold start per app: import time and time to first paint ---
+# Usage: python benchmarks/bench_startup.py [app-exp1.py ...] [--repeat 3] [--json out.json]
+# Import time: the app's own import statements in a fresh `python -X importtime`
+# process, with the slowest direct imports listed. First paint: a fresh
+# `streamlit run` process, timed from launch to a healthy server, to the first
+# element of the first script run reaching a websocket client, to the first
+# stimulus (image or component) and to the end of the run. Runs offline: the
+# apps only touch Google Sheets when a response is flushed.
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = ("app-exp1.py", "app-exp2.py", "app-exp3.py", "app-exp4.py")
+STIMULUS_ELEMENTS = ("imgs", "image", "component_instance")
+TIMEOUT = 60.0
+
+
+# --- Imports ---
+def import_profile(app):
+    """(total seconds, [(module, seconds)] slowest first) for the app's import statements."""
+    src = open(os.path.join(ROOT, app), encoding="utf-8").read()
+    modules = [a or b for a, b in re.findall(r"^(?:from (\S+) import|import (\S+))", src, re.M)]
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, env=_env())
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    direct = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):   # direct imports only, not their dependencies
+            direct.append((name.strip(), int(cumulative) / 1e6))
+    return sum(s for _, s in direct), sorted(direct, key=lambda m: -m[1])
+
+
+# --- First paint ---
+def _env():
+    env = dict(os.environ)
+    env.setdefault("RESPONSE_LOG_DIR", tempfile.mkdtemp(prefix="startup-"))
+    env["PYTHONPATH"] = ROOT
+    return env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _first_run(port, marks, start):
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                  subprotocols=["streamlit"], max_size=None) as ws:
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        await ws.send(msg.SerializeToString())
+        while True:
+            fm = ForwardMsg()
+            fm.ParseFromString(await asyncio.wait_for(ws.recv(), TIMEOUT))
+            kind = fm.WhichOneof("type")
+            if kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                marks.setdefault("first_paint", time.perf_counter() - start)
+                if fm.delta.new_element.WhichOneof("type") in STIMULUS_ELEMENTS:
+                    marks.setdefault("first_stimulus", time.perf_counter() - start)
+            elif kind == "script_finished":
+                marks["script_finished"] = time.perf_counter() - start
+                return
+
+
+def first_paint(app):
+    """Seconds from `streamlit run` to server ready, first element, first stimulus, run end."""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+                             "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+                            cwd=ROOT, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    marks = {}
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{app} exited: {proc.stderr.read().decode()[-2000:]}")
+            if time.perf_counter() - start > TIMEOUT:
+                raise TimeoutError(f"{app} did not become healthy")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.02)
+        marks["server_ready"] = time.perf_counter() - start
+        asyncio.run(_first_run(port, marks, start))
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("apps", nargs="*", default=list(APPS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="slowest direct imports to list")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    results = {}
+    for app in args.apps:
+        imports = [import_profile(app) for _ in range(args.repeat)]
+        paints = [first_paint(app) for _ in range(args.repeat)]
+        total = statistics.median(t for t, _ in imports)
+        result = {"import_s": total, "slowest_imports": dict(imports[-1][1][:args.top])}
+        for mark in ("server_ready", "first_paint", "first_stimulus", "script_finished"):
+            values = [p[mark] for p in paints if mark in p]
+            if values:
+                result[f"{mark}_s"] = statistics.median(values)
+        results[app] = result
+        print(f"{app}: imports {1000 * total:.0f} ms  "
+              + "  ".join(f"{k[:-2]} {1000 * v:.0f} ms" for k, v in result.items() if k.endswith("_s") and k != "import_s"))
+        print("  slowest: " + ", ".join(f"{m} {1000 * s:.0f} ms" for m, s in result["slowest_imports"].items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
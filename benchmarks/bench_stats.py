@@ -0,0 +1,59 @@
+# --- Bootstrap CIs / permutation tests over large synthetic response sets ---
+# Usage: python benchmarks/bench_stats.py [--rows 1000000] [--resamples 10000] [--groups 5]
+# Times the closed-form path used for 0/1 accuracy and the index-matrix path
+# (continuous values, or --method index), and checks that both agree.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import accuracy_stats  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--groups", type=int, default=5, help="palettes / combinations / shapes")
+    parser.add_argument("--index-resamples", type=int, default=100,
+                        help="resamples for the index-matrix run over --rows (time scales linearly)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, args.groups, args.rows)
+    correct = rng.random(args.rows) < 0.6 + 0.3 * groups / args.groups
+    times = rng.gamma(2.0, 1.5, args.rows).astype(np.float32)
+    print(f"{args.rows} rows, {args.groups} groups")
+
+    _, t = timed(accuracy_stats.bootstrap_ci, correct, groups, n_resamples=args.resamples, seed=1)
+    print(f"  bootstrap CI, accuracy      {args.resamples:>6} resamples  {t:8.3f}s")
+    pairs, t = timed(accuracy_stats.pairwise_tests, correct, groups, n_resamples=args.resamples, seed=1)
+    print(f"  permutation, {len(pairs):>3} pairs     {args.resamples:>6} resamples  {t:8.3f}s")
+
+    n = args.index_resamples
+    _, t = timed(accuracy_stats.bootstrap_ci, correct, groups, n_resamples=n, seed=1, method="index")
+    print(f"  bootstrap CI, index matrix  {n:>6} resamples  {t:8.3f}s"
+          f"  (~{t / n * args.resamples:.0f}s for {args.resamples})")
+    _, t = timed(accuracy_stats.bootstrap_ci, times, groups, n_resamples=n, seed=1)
+    print(f"  bootstrap CI, response time {n:>6} resamples  {t:8.3f}s")
+
+    # Same bootstrap distribution either way: compare interval bounds on a subsample
+    sub = slice(0, 20000)
+    closed = accuracy_stats.bootstrap_ci(correct[sub], groups[sub], n_resamples=4000, seed=2)
+    index = accuracy_stats.bootstrap_ci(correct[sub], groups[sub], n_resamples=4000, seed=3, method="index")
+    gap = np.nanmax(np.abs(np.concatenate([closed[1] - index[1], closed[2] - index[2]])))
+    print(f"  closed form vs index matrix CI bounds, 20k rows: max gap {100 * gap:.2f} pp")
+
+
+if __name__ == "__main__":
+    main()
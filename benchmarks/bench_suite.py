@@ -0,0 +1,319 @@
+# --- Regression suite: stimulus generation, rendering and logging ---
+# Usage: python benchmarks/bench_suite.py run [--repeat 7] [--only render] [--json results.json]
+#        python benchmarks/bench_suite.py compare base.json new.json [--threshold 0.2] [--normalize]
+# Fixed-seed cases for the per-trial hot paths: trial plans and Exp 2 trials
+# for 2-10 categories, figures at 20 px and 12 px sprites, PNG encoding,
+# shape-folder scanning and batched response logging. Runs offline: shapes
+# come from the repo's folders, responses go to a temporary log directory,
+# a temporary SQLite store and an in-memory fake worksheet.
+#
+# `run` times each case like timeit (enough calls per sample to take at
+# least MIN_SAMPLE seconds, best and median of --repeat samples) and writes
+# seconds per call. `compare` prints new/base of the best times per case and
+# exits with 1 when any case got slower by more than --threshold, so it can
+# gate a CI job:
+#   git stash && python benchmarks/bench_suite.py run --json base.json && git stash pop
+#   python benchmarks/bench_suite.py run --json new.json
+#   python benchmarks/bench_suite.py compare base.json new.json
+# Every run also times a fixed reference workload; with --normalize the
+# ratios are divided by its ratio, for runs on different or busy machines.
+import argparse
+import atexit
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Never touch the real response log or store
+SCRATCH = tempfile.mkdtemp(prefix="bench-suite-")
+os.environ["RESPONSE_LOG_DIR"] = SCRATCH
+os.environ["RESPONSE_DB"] = os.path.join(SCRATCH, "responses.db")
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+
+import response_log  # noqa: E402
+from response_db import ResponseDB  # noqa: E402
+import scheduler  # noqa: E402
+from shape_registry import ShapeRegistry  # noqa: E402
+from sprites import warm  # noqa: E402
+from stimuli import (ALL_SHAPES, EXP4_SPRITE_SIZE, PALETTES, SHAPE_TYPE_MAP, SPRITE_SIZE,  # noqa: E402
+                     collect_unique_shapes, exp1_spec, exp4_spec, figure_from_spec, make_exp2_trial,
+                     palette_files, palette_folder, palette_paths)
+from stimulus_cache import DPI, figure_to_png  # noqa: E402
+from trial_plan import exp1_conditions, make_exp1_plan, make_exp4_plan  # noqa: E402
+
+SEED = 20240601
+MIN_SAMPLE = 0.1        # seconds per sample; fast cases are called repeatedly
+LOG_ROWS = 500          # responses per logging case
+REFERENCE = "reference"  # machine speed, for compare --normalize
+EXP2_PALETTE = "Tableau"  # has the 10 shapes the largest Exp 2 trial needs
+
+
+# --- Cases ---
+# Each case is set up once, outside the timing, and returns the callable that is timed.
+def trial_cases():
+    pool = collect_unique_shapes()
+    cells = exp1_conditions(pool, SHAPE_TYPE_MAP)
+    conditions = scheduler.Scheduler(cells, seed=SEED).assign(53)
+    files = palette_files(EXP2_PALETTE)
+    all_paths = palette_paths(ALL_SHAPES)
+    yield "trials/exp1_plan", lambda: make_exp1_plan(pool, SHAPE_TYPE_MAP, 53, SEED)
+    yield "trials/exp1_plan_adaptive", lambda: make_exp1_plan(pool, SHAPE_TYPE_MAP, 53, SEED, conditions)
+    yield "trials/exp4_plan", lambda: make_exp4_plan(all_paths, 54, SEED)
+    for n in range(2, 11):
+        yield f"trials/exp2_n{n}", lambda n=n: make_exp2_trial(files, n, np.random.default_rng(SEED))
+
+
+def _exp1_spec(size):
+    """The 10-category Exp 1 plot of the suite's plan, drawn with *size* px sprites."""
+    plan = make_exp1_plan(collect_unique_shapes(), SHAPE_TYPE_MAP, 53, SEED)
+    i = int(np.flatnonzero(plan.n_categories == plan.n_categories.max())[0])
+    spec = exp1_spec(plan.trial(i))
+    return dict(spec, groups=[(path, size, xs, ys) for path, _, xs, ys in spec["groups"]])
+
+
+def _exp4_spec():
+    plan = make_exp4_plan(palette_paths(ALL_SHAPES), 54, SEED)
+    trial = plan.trial(0)
+    return exp4_spec(trial["high_corr_plot"] == "A", trial["plotA_shapes"], trial["seed"], "A")
+
+
+def _specs():
+    warm(collect_unique_shapes(), (SPRITE_SIZE, EXP4_SPRITE_SIZE))
+    warm(palette_paths(ALL_SHAPES), (EXP4_SPRITE_SIZE,))
+    return {"exp1_20px": _exp1_spec(SPRITE_SIZE), "exp1_12px": _exp1_spec(EXP4_SPRITE_SIZE),
+            "exp4_12px": _exp4_spec()}
+
+
+def _draw(spec):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = figure_from_spec(spec)
+    fig.set_dpi(DPI)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return canvas
+
+
+def render_cases():
+    for name, spec in _specs().items():
+        yield f"render/{name}", lambda spec=spec: _draw(spec)
+
+
+def png_cases():
+    from PIL import Image
+    for name, spec in _specs().items():
+        pixels = np.asarray(_draw(spec).buffer_rgba())
+
+        def encode(pixels=pixels):
+            # What savefig's PNG writer does with the drawn canvas
+            buf = io.BytesIO()
+            Image.fromarray(pixels).save(buf, format="png")
+            return buf.getvalue()
+        yield f"png/{name}", encode
+        # Build, draw (twice for the tight bbox) and encode: what a cache miss costs the apps
+        yield f"png/{name}_stimulus", lambda spec=spec: figure_to_png(figure_from_spec(spec))
+
+
+def shape_cases():
+    folders = {p: palette_folder(p) for p in PALETTES + [ALL_SHAPES]}
+    registry = ShapeRegistry(folders, SHAPE_TYPE_MAP, refresh_interval=0)
+    yield "shapes/scan", lambda: ShapeRegistry(folders, SHAPE_TYPE_MAP, refresh_interval=0)
+    yield "shapes/refresh_unchanged", registry.refresh
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread worksheet: no latency, no network."""
+
+    def __init__(self):
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def append_rows(self, rows, value_input_option=None):
+        with self.lock:
+            start = len(self.rows) + 1
+            self.rows.extend(rows)
+            # Shaped like the Sheets API response gspread returns
+            return {"updates": {"updatedRange": f"Sheet1!A{start}:Z{len(self.rows)}", "updatedRows": len(rows)}}
+
+    def get_all_values(self):
+        with self.lock:
+            return [list(map(str, row)) for row in self.rows]
+
+
+def _responses(n):
+    """*n* fixed Exp 2 (row, record) pairs, as app-exp2.py logs them."""
+    rng = np.random.default_rng(SEED)
+    files = palette_files(EXP2_PALETTE)
+    out = []
+    for i in range(n):
+        k = int(rng.integers(2, 11))
+        shapes = [str(s) for s in rng.choice(files, k, replace=False)]
+        choice, answer = (f"Category {int(c) + 1}" for c in rng.integers(k, size=2))
+        timing = {"response_time": 2.5, "render_ms": 40.0, "transfer_ms": 15.0, "decision_ms": 2400.0}
+        row = ["2025-01-01 12:00:00", EXP2_PALETTE, k, choice, answer,
+               "Correct" if choice == answer else "Incorrect", ", ".join(shapes), *timing.values()]
+        record = {"submitted_at": row[0], "participant": f"p{i // 41}", "palette": EXP2_PALETTE,
+                  "n_categories": k, "choice": choice, "answer": answer, "correct": choice == answer,
+                  "seed": i, "shapes": shapes, **timing}
+        out.append((row, record))
+    return out
+
+
+def _log_responses(responses, backends):
+    """Append *responses* to a fresh log and drain it to every backend in production-sized batches.
+
+    The log runs without worker threads and is drained here, so the time is
+    spent on appends, sends and inserts rather than on the workers' waits.
+    Each call gets its own directory and SQLite store, so no sample inserts
+    into a database grown by the ones before it.
+    """
+    directory = tempfile.mkdtemp(dir=SCRATCH)
+    db = ResponseDB(os.path.join(directory, "responses.db")) if "sqlite" in backends else None
+    log = response_log.ResponseLog("Eksperimen_2", FakeWorksheet, directory, backends, workers=False, db=db)
+    try:
+        for row, record in responses:
+            log.append(row, record)
+        while log.mirror and log._send_batch():
+            pass
+        while log.db and log._store_batch():
+            pass
+        if log.pending_count() or log.unstored_count():
+            raise RuntimeError(f"log not drained: {log.stats()}")
+    finally:
+        log.close()
+
+
+def log_cases():
+    responses = _responses(LOG_ROWS)
+    yield "log/append", lambda: _log_responses(responses, frozenset())
+    yield "log/sheets_batches", lambda: _log_responses(responses, frozenset({"sheets"}))
+    yield "log/sqlite_batches", lambda: _log_responses(responses, frozenset({"sqlite"}))
+    yield "log/both", lambda: _log_responses(responses, frozenset({"sqlite", "sheets"}))
+
+
+def _reference():
+    """Fixed interpreter and numpy work that no change to the repo can speed up or slow down."""
+    total = sum(i * i for i in range(20000))
+    return total, np.sort(np.random.default_rng(SEED).random(20000))
+
+
+GROUPS = {"trials": trial_cases, "render": render_cases, "png": png_cases,
+          "shapes": shape_cases, "log": log_cases}
+
+
+# --- Timing ---
+def measure(fn, repeat):
+    """{median, min} seconds per call over *repeat* samples, plus the calls per sample."""
+    fn()  # warm caches and lazy imports
+    number, elapsed = 1, _sample(fn, 1)
+    while elapsed < MIN_SAMPLE:
+        number = max(number * 2, int(number * MIN_SAMPLE / max(elapsed, 1e-9)))
+        elapsed = _sample(fn, number)
+    samples = [_sample(fn, number) / number for _ in range(repeat)]
+    return {"median": statistics.median(samples), "min": min(samples), "number": number, "repeat": repeat}
+
+
+def _sample(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+def _meta():
+    import matplotlib
+    import PIL
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "seed": SEED,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "matplotlib": matplotlib.__version__, "pillow": PIL.__version__}
+
+
+def _fmt(seconds):
+    return f"{seconds * 1e3:10.3f} ms" if seconds >= 1e-3 else f"{seconds * 1e6:10.1f} µs"
+
+
+def run(args):
+    results = {"meta": _meta(), "cases": {}}
+    groups = args.only or list(GROUPS)
+    print(f"{'case':<28} {'median':>13} {'min':>13} {'calls':>6}")
+    cases = (case for group in groups for case in GROUPS[group]())
+    for name, fn in [(REFERENCE, _reference), *cases]:
+        result = results["cases"][name] = measure(fn, args.repeat)
+        print(f"{name:<28} {_fmt(result['median'])} {_fmt(result['min'])} {result['number']:>6}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.json}")
+    return 0
+
+
+def compare(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base {base['meta']['commit']} ({base['meta']['created']}), "
+          f"new {new['meta']['commit']} ({new['meta']['created']}), {args.metric}, "
+          f"threshold {args.threshold:.0%}")
+    speed = 1.0
+    if args.normalize:
+        speed = new["cases"][REFERENCE][args.metric] / base["cases"][REFERENCE][args.metric]
+        print(f"ratios divided by the reference ratio {speed:.2f}x (machine speed)")
+    print(f"{'case':<28} {'base':>13} {'new':>13} {'ratio':>7}")
+    regressions = []
+    for name in sorted(set(base["cases"]) | set(new["cases"])):
+        if name not in base["cases"] or name not in new["cases"]:
+            print(f"{name:<28} {'only in ' + ('new' if name in new['cases'] else 'base'):>35}")
+            continue
+        b, n = base["cases"][name][args.metric], new["cases"][name][args.metric]
+        ratio = n / b / speed
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + args.threshold):
+            flag = "  faster"
+        print(f"{name:<28} {_fmt(b)} {_fmt(n)} {ratio:>6.2f}x{flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("no regressions")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline regression benchmarks for the experiment hot paths.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="time every case")
+    run_parser.add_argument("--repeat", type=int, default=7, help="samples per case")
+    run_parser.add_argument("--only", nargs="+", choices=list(GROUPS), help="case groups to run")
+    run_parser.add_argument("--json", help="write the results here")
+    cmp_parser = sub.add_parser("compare", help="flag cases that got slower between two runs")
+    cmp_parser.add_argument("base")
+    cmp_parser.add_argument("new")
+    cmp_parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    cmp_parser.add_argument("--normalize", action="store_true",
+                            help="divide out the change in machine speed (runs on different or busy hosts)")
+    cmp_parser.add_argument("--metric", choices=("min", "median"), default="min",
+                            help="min (default) is the least disturbed by other load on the machine")
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
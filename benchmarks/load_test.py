@@ -0,0 +1,315 @@
+# --- Headless load test: N concurrent participants clicking through an app ---
+# Usage: python benchmarks/load_test.py exp1 [exp2 exp3 exp4] [--sessions 50] [--think 2.0]
+#                                       [--sheets-latency 0.3] [--json results.json]
+# Drives the apps in-process with Streamlit's AppTest, one AppTest per
+# participant on its own thread, so sessions share the module-level caches
+# and contend for the GIL like they do in one server process. Google Sheets
+# is replaced by a local stub (sheets.set_client_factory) and the response
+# log and SQLite store go to a temporary directory, so this runs offline.
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Before response_log is imported anywhere: keep the harness's log out of the repo
+LOG_DIR = tempfile.mkdtemp(prefix="load-test-log-")
+os.environ["RESPONSE_LOG_DIR"] = LOG_DIR
+
+import numpy as np  # noqa: E402
+from streamlit import config as st_config  # noqa: E402
+from streamlit.runtime.runtime import Runtime  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import scheduler  # noqa: E402
+import sheets  # noqa: E402
+from stimuli import exp2_target, make_exp2_trial, palette_files  # noqa: E402
+
+APPS = {"exp1": "app-exp1.py", "exp2": "app-exp2.py", "exp3": "app-exp3.py", "exp4": "app-exp4.py"}
+TRIALS = {"exp1": 53, "exp2": 53, "exp3": 1, "exp4": 54}
+ACCURACY = 0.8          # chance a simulated participant picks the right answer
+RUN_TIMEOUT = 120       # seconds, per rerun, generous because sessions queue on the GIL
+
+
+# --- Google Sheets stand-in ---
+class StubWorksheet:
+    def __init__(self, latency):
+        self.latency = latency
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def append_rows(self, rows, value_input_option=None):
+        time.sleep(self.latency)
+        with self.lock:
+            start = len(self.rows) + 1
+            self.rows.extend(rows)
+            # Shaped like the Sheets API response gspread returns
+            return {"updates": {"updatedRange": f"Sheet1!A{start}:Z{len(self.rows)}", "updatedRows": len(rows)}}
+
+    def append_row(self, row, value_input_option=None):
+        self.append_rows([row], value_input_option)
+
+    def get_all_values(self):
+        with self.lock:
+            return [list(map(str, row)) for row in self.rows]
+
+
+class StubClient:
+    def __init__(self, latency):
+        self.latency = latency
+        self.worksheets = {}
+
+    def open_by_key(self, key):
+        return self
+
+    def worksheet(self, name):
+        return self.worksheets.setdefault(name, StubWorksheet(self.latency))
+
+
+# --- One participant ---
+class ScriptError(Exception):
+    """The app raised during a run; ends the session with the app's own message."""
+
+
+class Session:
+    def __init__(self, app, seed, think, results, first_run_lock):
+        self.at = AppTest.from_file(os.path.join(ROOT, APPS[app]), default_timeout=RUN_TIMEOUT)
+        self.rng = random.Random(seed)
+        self.think_mean = think
+        self.results = results
+        self.first_run_lock = first_run_lock
+        self.started = False
+        self.responses = 0
+
+    def run(self, action=None):
+        """One rerun, timed; *action* sets widget values on self.at first.
+
+        Raises ScriptError if the app raised, so drivers never read widgets
+        of a page that did not render.
+        """
+        if action is not None:
+            action(self.at)
+        # First runs go one at a time: compiling the script on several threads at
+        # once can hit a SystemError in ast.parse (Python 3.11), which is not the app
+        with nullcontext() if self.started else self.first_run_lock:
+            t0 = time.perf_counter()
+            self.at.run()
+            self.results["latencies"].append(time.perf_counter() - t0)
+        self.started = True
+        if self.at.exception:
+            raise ScriptError(self.at.exception[0].message)
+        return self.at
+
+    def think(self):
+        if self.think_mean > 0:
+            time.sleep(self.rng.lognormvariate(math.log(self.think_mean), 0.5))
+
+    def answer(self, correct_idx, n_options):
+        if self.rng.random() < ACCURACY:
+            return correct_idx
+        return self.rng.randrange(n_options)
+
+
+def drive_exp1(s):
+    at = s.run()
+    for _ in range(10 * TRIALS["exp1"]):  # training retries included, never loops forever
+        state = at.session_state
+        if "plan" not in state or state["task_index"] >= len(state["plan"]):
+            break
+        trial = state["plan"].trial(state["task_index"])
+        box = at.selectbox[0]
+        pick = box.options[s.answer(trial["target_idx"], len(box.options))]
+        s.think()
+        at = s.run(lambda at: (box.set_value(pick), at.button[0].click()))
+        s.responses += 1
+
+
+def drive_exp2(s):
+    at = s.run()
+    palettes = None if scheduler.ADAPTIVE else at.selectbox[0].options
+    for _ in range(4 * TRIALS["exp2"]):
+        if s.responses >= TRIALS["exp2"]:
+            break
+        if scheduler.ADAPTIVE:
+            palette, n = at.session_state["condition"]  # assigned; a submit moves on to the next
+        else:
+            # A new trial starts when the palette or category count changes
+            palette, n = s.rng.choice(palettes), s.rng.randint(2, 10)
+            if palette != at.selectbox[0].value:
+                at = s.run(lambda at: at.selectbox[0].set_value(palette))
+            if n != at.selectbox[1].value:
+                at = s.run(lambda at: at.selectbox[1].set_value(n))
+            if len(at.selectbox) < 3:
+                continue  # palette has fewer shapes than categories, pick again
+        box = at.selectbox[-1]
+        trial = make_exp2_trial(palette_files(palette), n, np.random.default_rng(at.session_state["trial_seed"]))
+        pick = box.options[s.answer(exp2_target(trial["y_data"]), len(box.options))]
+        s.think()
+        at = s.run(lambda at: (box.set_value(pick), at.button[0].click()))
+        s.responses += 1
+
+
+def drive_exp3(s):
+    at = s.run()
+    if not at.multiselect:
+        return  # the app stopped before showing the ranking
+    ranking = at.multiselect(key="ranking")
+    order = s.rng.sample(ranking.options, len(ranking.options))
+    s.think()
+
+    # The whole ranking and the participant ID go in with one form submit
+    def rank(at):
+        at.multiselect(key="ranking").set_value(order)
+        at.text_input(key="user_id").input(f"load-{id(s)}")
+        at.button[0].click()
+    at = s.run(rank)
+    if at.success:
+        s.responses += 1
+
+
+def drive_exp4(s):
+    at = s.run()
+    for _ in range(2 * TRIALS["exp4"]):
+        state = at.session_state
+        if "step" not in state or state["step"] >= TRIALS["exp4"] or state["plan"] is None:
+            break
+        target = "AB".index(state["plan"].trial(state["step"])["high_corr_plot"])
+        pick = "AB"[s.answer(target, 2)]
+        s.think()
+        at = s.run(lambda at: (at.radio[0].set_value(pick), at.button[0].click()))
+        s.responses += 1
+
+
+DRIVERS = {"exp1": drive_exp1, "exp2": drive_exp2, "exp3": drive_exp3, "exp4": drive_exp4}
+
+
+# --- Load test ---
+def _allow_concurrent_apptests():
+    """AppTest assumes one run at a time: it sets process-wide state for the
+    duration of a run and clears it afterwards, which would pull it out from
+    under the other sessions' runs. Keep that state in place instead."""
+    st_config.set_option("global.appTest", True)
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        runtime = cls._instance or last.get("runtime")
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def load_test(app, sessions, think, ramp, seed):
+    results = {"latencies": [], "errors": []}
+    responses = []
+    first_run_lock = threading.Lock()
+
+    def participant(i):
+        time.sleep(ramp * i / max(sessions, 1))
+        s = Session(app, seed + i, think, results, first_run_lock)
+        try:
+            DRIVERS[app](s)
+        except ScriptError as e:  # the app failed this session; its message, not a driver traceback
+            results["errors"].append(str(e))
+        except Exception as e:  # a driver bug or a broken page; keep the other sessions going
+            results["errors"].append(f"{type(e).__name__}: {e}")
+            if os.environ.get("LOAD_TEST_TRACEBACK"):
+                traceback.print_exc()
+        responses.append(s.responses)
+
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(participant, range(sessions)))
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+
+    latencies = results["latencies"]
+    return {
+        "app": APPS[app],
+        "sessions": sessions,
+        "think_s": think,
+        "reruns": len(latencies),
+        "responses": sum(responses),
+        "wall_s": wall,
+        "p50_ms": 1000 * _percentile(latencies, 50),
+        "p95_ms": 1000 * _percentile(latencies, 95),
+        "p99_ms": 1000 * _percentile(latencies, 99),
+        "max_ms": 1000 * max(latencies, default=float("nan")),
+        # Process CPU, so background prefetch and the log writer are included
+        "cpu_ms_per_rerun": 1000 * cpu / max(len(latencies), 1),
+        "responses_per_s": sum(responses) / wall,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "errors": len(results["errors"]),
+        "first_errors": sorted(set(results["errors"]))[:5],
+    }
+
+
+def report(r):
+    print(f"{r['app']}: {r['sessions']} sessions, {r['reruns']} reruns, {r['responses']} responses "
+          f"in {r['wall_s']:.1f}s")
+    print(f"  rerun latency   p50 {r['p50_ms']:.0f} ms  p95 {r['p95_ms']:.0f} ms  "
+          f"p99 {r['p99_ms']:.0f} ms  max {r['max_ms']:.0f} ms")
+    print(f"  CPU per rerun   {r['cpu_ms_per_rerun']:.1f} ms")
+    print(f"  throughput      {r['responses_per_s']:.2f} responses/s")
+    print(f"  peak RSS        {r['peak_rss_mb']:.0f} MB (process-wide, cumulative over apps)")
+    if r["errors"]:
+        print(f"  errors          {r['errors']}: " + "; ".join(r["first_errors"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent participants against the apps offline.")
+    parser.add_argument("apps", nargs="+", choices=sorted(APPS))
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent participants per app")
+    parser.add_argument("--think", type=float, default=2.0, help="median think time per trial in seconds (0: none)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which sessions start")
+    parser.add_argument("--sheets-latency", type=float, default=0.3, help="seconds per stub append_rows call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="write the results here")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # shape folders are relative to the repo root
+    _allow_concurrent_apptests()
+    client = StubClient(args.sheets_latency)
+    sheets.set_client_factory(lambda: client)
+    try:
+        results = []
+        for app in args.apps:
+            results.append(load_test(app, args.sessions, args.think, args.ramp, args.seed))
+            report(results[-1])
+        import response_log
+        for log in response_log._logs.values():
+            log.flush(timeout=30)
+        received = {name: len(ws.rows) for name, ws in client.worksheets.items()}
+        print(f"rows received by the Sheets stub: {received}")
+        stored = {name: log.stats()["stored"] for name, log in response_log._logs.items() if log.db}
+        print(f"trials written to the SQLite store: {stored}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"results": results, "sheets_rows": received, "stored_trials": stored}, f, indent=2)
+    finally:
+        sheets.set_client_factory(None)
+        shutil.rmtree(LOG_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
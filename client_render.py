@@ -0,0 +1,95 @@
+# --- Client-side stimulus rendering ---
+# Alternative to the server-rendered PNGs of stimulus_cache.py, switched on
+# with STIMULUS_RENDER=client. The server sends a plot spec (stimuli.py) as a
+# few hundred bytes of JSON plus the points as float32 bytes, and a static
+# Streamlit component (components/scatter/index.html) draws it on a canvas
+# with the same figure size, axes box, limits and marker sizes in points as
+# the matplotlib figure. Sprites come from the sprite atlas (sprite_atlas.py),
+# whose content-hashed PNG is copied into the component folder: the browser
+# fetches it once and caches it.
+import os
+import shutil
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+import sprites
+
+RENDER_MODE = os.environ.get("STIMULUS_RENDER", "server")
+ENABLED = RENDER_MODE == "client"
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "scatter")
+
+_lock = threading.Lock()
+_component = None
+
+
+# --- Sprite atlas ---
+_published = set()   # atlas PNG names already copied into the component folder
+
+
+def atlas():
+    """(file name, {(abs path, size): (x, y, w, h)}) of the current sprite atlas."""
+    current = sprites.get_atlas()
+    if current is None:
+        raise RuntimeError("client-side rendering needs the sprite atlas (python sprite_atlas.py)")
+    if current.png not in _published:
+        target = os.path.join(COMPONENT_DIR, current.png)
+        if not os.path.exists(target):
+            tmp = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(os.path.join(current.directory, current.png), tmp)
+            os.replace(tmp, target)
+        _published.add(current.png)
+    return current.png, current.rects
+
+
+# --- Payload ---
+# Default subplot box and tick label size (rcParams figure.subplot.*, font.size)
+AXES_FRACTION = (0.9 - 0.125, 0.88 - 0.11)
+FONT_SIZE = 10.0
+
+
+@lru_cache(maxsize=16)
+def _ticks(size, xlim, ylim):
+    """Major tick positions matplotlib's default AutoLocator picks for these axes.
+
+    Same bin count as Axis.get_tick_space (x labels need 3 font sizes, y
+    labels 2), so only matplotlib.ticker is imported, not the figure stack.
+    """
+    from matplotlib.ticker import MaxNLocator
+
+    def locate(lim, length_pt, label_pt):
+        nbins = min(max(int(length_pt / label_pt), 1), 9)
+        ticks = MaxNLocator(nbins=nbins, steps=[1, 2, 2.5, 5, 10]).tick_values(*lim)
+        return [float(t) for t in ticks if min(lim) - 1e-9 <= t <= max(lim) + 1e-9]
+
+    return (locate(xlim, size[0] * 72 * AXES_FRACTION[0], 3 * FONT_SIZE),
+            locate(ylim, size[1] * 72 * AXES_FRACTION[1], 2 * FONT_SIZE))
+
+
+def payload(spec):
+    """Component arguments for a spec: JSON-able fields plus the points as float32 bytes."""
+    name, rects = atlas()
+    groups, points = [], []
+    for path, size, xs, ys in spec["groups"]:
+        rect = rects.get((os.path.abspath(path), size))
+        if rect is None:
+            raise KeyError(f"{path} at {size}px is not in the sprite atlas")
+        xy = np.column_stack([np.asarray(xs, np.float32), np.asarray(ys, np.float32)])
+        groups.append({"rect": rect, "n": len(xy)})
+        points.append(xy.ravel())
+    xticks, yticks = _ticks(tuple(spec["size"]), tuple(spec["xlim"]), tuple(spec["ylim"])) if spec["ticks"] else ([], [])
+    meta = {k: spec[k] for k in ("size", "xlim", "ylim", "xlabel", "ylabel", "guides", "legend")}
+    meta.update(groups=groups, xticks=xticks, yticks=yticks)
+    data = np.concatenate(points) if points else np.zeros(0, np.float32)
+    return {"atlas": name, "spec": meta, "points": data.astype("<f4").tobytes()}
+
+
+def scatter(spec, key, stimulus=None):
+    """Draw *spec* in the browser; its first paint is announced as *stimulus* (response_clock.py)."""
+    global _component
+    with _lock:
+        if _component is None:
+            import streamlit.components.v1 as components
+            _component = components.declare_component("shape_scatter", path=COMPONENT_DIR)
+    return _component(**payload(spec), stimulus=stimulus, key=key, default=None)
@@ -0,0 +1,187 @@
+# --- Offline bulk stimulus generator for Experiments 1, 2 and 4 ---
+# Renders stimuli with the same code the apps use (stimuli.py) across a
+# process pool and streams images plus a JSONL manifest with the ground truth
+# (target_idx / high_corr_plot) into an output directory.
+#
+#   python generate_stimuli.py exp1 --count 5000 --out stimuli/exp1 --seed 7
+#   python generate_stimuli.py exp4 --count 1000 --out stimuli/exp4 --workers 8
+#   python generate_stimuli.py exp2 --count 2000 --out /tmp/s --scaling
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+EXPERIMENTS = ("exp1", "exp2", "exp4")
+
+# Per-worker state, filled in by _init_worker
+_worker = {}
+
+
+def _init_worker(experiment, count, seed, dpi):
+    import matplotlib
+    matplotlib.use("Agg")  # never touch a GUI backend in the workers
+    import numpy as np
+    import sprites
+    import stimuli
+    from trial_plan import make_exp1_plan, make_exp4_plan
+
+    _worker.update(experiment=experiment, seed=seed, dpi=dpi)
+    if experiment == "exp1":
+        pool = stimuli.collect_unique_shapes()
+        sprites.warm(pool, (stimuli.SPRITE_SIZE,))
+        _worker["plan"] = make_exp1_plan(pool, stimuli.SHAPE_TYPE_MAP, count, seed)
+    elif experiment == "exp2":
+        _worker["shape_files"] = {p: stimuli.palette_files(p) for p in stimuli.PALETTES
+                                  if stimuli.palette_files(p)}
+        for p in _worker["shape_files"]:
+            sprites.warm(stimuli.palette_paths(p), (stimuli.SPRITE_SIZE,))
+        _worker["rng"] = lambda i: np.random.default_rng([seed, i])
+    else:
+        shapes = stimuli.palette_paths(stimuli.ALL_SHAPES)
+        sprites.warm(shapes, (stimuli.EXP4_SPRITE_SIZE,))
+        _worker["plan"] = make_exp4_plan(shapes, count, seed)
+
+
+def _save(fig, out_dir, name):
+    from stimulus_cache import figure_to_png
+    with open(os.path.join(out_dir, name), "wb") as f:
+        f.write(figure_to_png(fig, dpi=_worker["dpi"]))
+    return name
+
+
+def _render_exp1(i, out_dir):
+    import stimuli
+    trial = _worker["plan"].trial(i)
+    return {
+        "trial": i,
+        "file": _save(stimuli.exp1_figure(trial), out_dir, f"exp1_{i:06d}.png"),
+        "n_categories": len(trial["chosen_shapes"]),
+        "shape_types": trial["shape_types_used"],
+        "shapes": [os.path.basename(p) for p in trial["chosen_shapes"]],
+        "target_idx": trial["target_idx"],
+        "target_shape": trial["shape_labels"][trial["target_idx"]],
+    }
+
+
+def _render_exp2(i, out_dir):
+    import stimuli
+    rng = _worker["rng"](i)
+    palettes = sorted(_worker["shape_files"])
+    palette = palettes[rng.integers(len(palettes))]
+    shape_files = _worker["shape_files"][palette]
+    n = int(rng.integers(2, min(10, len(shape_files)) + 1))
+    trial = stimuli.make_exp2_trial(shape_files, n, rng)
+    fig = stimuli.exp2_figure(stimuli.palette_dir(palette), trial["selected_shapes"],
+                              trial["x_data"], trial["y_data"])
+    return {
+        "trial": i,
+        "file": _save(fig, out_dir, f"exp2_{i:06d}.png"),
+        "palette": palette,
+        "n_categories": n,
+        "shapes": list(trial["selected_shapes"]),
+        "target_idx": stimuli.exp2_target(trial["y_data"]),
+    }
+
+
+def _render_exp4(i, out_dir):
+    import stimuli
+    task = _worker["plan"].trial(i)
+    files = {}
+    for plot in ("A", "B"):
+        fig = stimuli.generate_scatterplot(task["high_corr_plot"] == plot, task[f"plot{plot}_shapes"], task["seed"], plot)
+        files[plot] = _save(fig, out_dir, f"exp4_{i:06d}_{plot}.png")
+    return {
+        "trial": i,
+        "fileA": files["A"],
+        "fileB": files["B"],
+        "plotA_shapes": [os.path.basename(p) for p in task["plotA_shapes"]],
+        "plotB_shapes": [os.path.basename(p) for p in task["plotB_shapes"]],
+        "high_corr_plot": task["high_corr_plot"],
+        "seed": task["seed"],
+    }
+
+
+_RENDERERS = {"exp1": _render_exp1, "exp2": _render_exp2, "exp4": _render_exp4}
+
+
+def _render_chunk(start, stop, out_dir):
+    render = _RENDERERS[_worker["experiment"]]
+    return [render(i, out_dir) for i in range(start, stop)]
+
+
+def generate(experiment, count, out_dir, seed=0, workers=None, dpi=200, chunk=8, quiet=False):
+    """Render *count* trials into *out_dir*; returns (figures, seconds)."""
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    per_trial = 2 if experiment == "exp4" else 1
+    chunks = [(s, min(s + chunk, count), out_dir) for s in range(0, count, chunk)] or [(0, 0, out_dir)]
+
+    t0 = time.perf_counter()
+    done = 0
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(experiment, count, seed, dpi)) as pool:
+        for records in pool.map(_render_chunk, *zip(*chunks)):
+            for record in records:
+                manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            done += len(records)
+            if not quiet:
+                elapsed = time.perf_counter() - t0
+                print(f"\r{done}/{count} trials, {done * per_trial / elapsed:.1f} fig/s",
+                      end="", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - t0
+    if not quiet:
+        print(file=sys.stderr)
+    return done * per_trial, elapsed
+
+
+def _scaling(args):
+    max_workers = args.workers or os.cpu_count() or 1
+    counts, w = [], 1
+    while w < max_workers:
+        counts.append(w)
+        w *= 2
+    counts.append(max_workers)
+    base = None
+    print(f"{'workers':>7} {'fig/s':>8} {'speedup':>8} {'efficiency':>10}")
+    for w in counts:
+        tmp = tempfile.mkdtemp(prefix="stimuli-scaling-")
+        try:
+            figures, elapsed = generate(args.experiment, args.count, tmp, args.seed, w, args.dpi, args.chunk, quiet=True)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        rate = figures / elapsed
+        base = base or rate
+        print(f"{w:>7} {rate:>8.1f} {rate / base:>7.2f}x {rate / base / w:>9.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Exp 1/2/4 stimuli offline with ground truth.")
+    parser.add_argument("experiment", choices=EXPERIMENTS)
+    parser.add_argument("--count", type=int, default=100, help="number of trials")
+    parser.add_argument("--out", default="stimuli", help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--chunk", type=int, default=8, help="trials per task sent to a worker")
+    parser.add_argument("--scaling", action="store_true",
+                        help="measure throughput at 1, 2, 4, ... workers instead of keeping output")
+    args = parser.parse_args(argv)
+    # Shape folders are relative to the repo root, like in the apps
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.scaling:
+        _scaling(args)
+        return
+    figures, elapsed = generate(args.experiment, args.count, args.out, args.seed, args.workers, args.dpi, args.chunk)
+    print(f"{figures} figures in {elapsed:.1f}s ({figures / elapsed:.1f} fig/s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
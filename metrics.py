@@ -0,0 +1,249 @@
+# --- Per-rerun phase timers and counters shared by the apps ---
+# Off unless APP_METRICS=1. When off, phase() hands back one shared no-op
+# context manager and count() returns straight away, so instrumented code
+# pays a function call and nothing else.
+#
+# When on, every phase feeds a latency histogram keyed by (app, phase), and
+# counters accumulate per (app, name); work done on background threads
+# (prefetch, the Sheets writer) is recorded with app="". Exported as
+# Prometheus text:
+#   METRICS_FILE   file rewritten every METRICS_INTERVAL seconds (default metrics/<pid>.prom)
+#   METRICS_PORT   also serve it on http://127.0.0.1:<port>/metrics
+#   METRICS_ADMIN_TOKEN  panel() shows a timing table to visitors of ?admin=<token>
+import atexit
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+ENABLED = os.environ.get("APP_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join("metrics", f"{os.getpid()}.prom"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_INTERVAL = 10.0
+ADMIN_TOKEN = os.environ.get("METRICS_ADMIN_TOKEN", "")
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_RERUNS = 200
+
+_NULL = nullcontext()
+_lock = threading.Lock()
+_local = threading.local()       # .rerun: the record of the rerun running on this thread
+_histograms = {}                 # (app, phase) -> [bucket counts..., +Inf count, sum seconds]
+_counters = {}                   # (app, name) -> value
+_recent = deque(maxlen=RECENT_RERUNS)   # finished rerun records, newest last
+_open = {}                       # session id -> rerun record not closed by end_rerun()
+
+
+def _observe(app, name, seconds):
+    key = (app, name)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        hist[bisect.bisect_left(BUCKETS, seconds)] += 1
+        hist[-1] += seconds
+
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        seconds = (end - self.start) / 1e9
+        record = getattr(_local, "rerun", None)
+        if record is None:
+            _observe("", self.name, seconds)
+        else:
+            record["phases"][self.name] = record["phases"].get(self.name, 0.0) + seconds
+            record["last_ns"] = end
+            _observe(record["app"], self.name, seconds)
+        return False
+
+
+def phase(name):
+    """``with phase("render"):`` times the block into the current rerun."""
+    return _Phase(name) if ENABLED else _NULL
+
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    record = getattr(_local, "rerun", None)
+    app = "" if record is None else record["app"]
+    with _lock:
+        _counters[(app, name)] = _counters.get((app, name), 0) + n
+    if record is not None:
+        record["counters"][name] = record["counters"].get(name, 0) + n
+
+
+# --- Rerun lifecycle ---
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def _close(record, end_ns):
+    record["total"] = (end_ns - record["start_ns"]) / 1e9
+    _observe(record["app"], "rerun", record["total"])
+    with _lock:
+        _recent.append(record)
+
+
+def begin_rerun(app):
+    """Call at the top of an app script.
+
+    Reruns that leave through st.stop() or st.rerun() never reach
+    end_rerun(); they are closed at their last timed phase when the same
+    session starts its next rerun.
+    """
+    if not ENABLED:
+        return
+    _start_exporters()
+    session = _session_id()
+    previous = _open.pop(session, None)
+    if previous is not None:
+        _close(previous, previous["last_ns"])
+    start = time.perf_counter_ns()
+    record = {"app": app, "session": session, "start_ns": start, "last_ns": start,
+              "wall": time.time(), "phases": {}, "counters": {}}
+    _local.rerun = record
+    _open[session] = record
+    count("reruns")
+
+
+def end_rerun():
+    if not ENABLED:
+        return
+    record = getattr(_local, "rerun", None)
+    if record is None:
+        return
+    _local.rerun = None
+    _open.pop(record["session"], None)
+    _close(record, time.perf_counter_ns())
+
+
+# --- Export ---
+def _labels(app, **extra):
+    pairs = ([("app", app)] if app else []) + list(extra.items())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def prometheus_text():
+    """All histograms and counters in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines = ["# TYPE shapeitup_phase_seconds histogram"]
+    for (app, name), hist in sorted(histograms.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), hist[:-1]):
+            cumulative += n
+            lines.append(f"shapeitup_phase_seconds_bucket{_labels(app, phase=name, le=bound)} {cumulative}")
+        lines.append(f"shapeitup_phase_seconds_sum{_labels(app, phase=name)} {hist[-1]:.6f}")
+        lines.append(f"shapeitup_phase_seconds_count{_labels(app, phase=name)} {cumulative}")
+    for name in sorted({name for _, name in counters}):
+        lines.append(f"# TYPE shapeitup_{name}_total counter")
+        for (app, counter), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"shapeitup_{name}_total{_labels(app)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path=None):
+    path = path or METRICS_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def _write_loop():
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        try:
+            write_file()
+        except OSError:
+            pass  # keep serving; the next interval tries again
+
+
+def _serve(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode()
+            self.send_response(200 if self.path.rstrip("/") in ("", "/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+_exporters_started = False
+
+
+def _start_exporters():
+    global _exporters_started
+    with _lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    threading.Thread(target=_write_loop, name="metrics-writer", daemon=True).start()
+    atexit.register(write_file)
+    if METRICS_PORT:
+        try:
+            _serve(METRICS_PORT)
+        except OSError as e:  # port taken, e.g. by another app's process
+            logging.getLogger(__name__).warning("not serving metrics on port %d: %s", METRICS_PORT, e)
+
+
+# --- Admin panel ---
+def summary():
+    """Per (app, phase): count, mean and max over the recent reruns, newest data first."""
+    with _lock:
+        recent = list(_recent)
+    rows = {}
+    for record in recent:
+        for name, seconds in list(record["phases"].items()) + [("rerun", record["total"])]:
+            row = rows.setdefault((record["app"], name), [0, 0.0, 0.0])
+            row[0] += 1
+            row[1] += seconds
+            row[2] = max(row[2], seconds)
+    return [{"app": app, "phase": name, "reruns": n, "mean_ms": 1000 * total / n, "max_ms": 1000 * peak}
+            for (app, name), (n, total, peak) in sorted(rows.items())]
+
+
+def panel():
+    """Timing table for admins (?admin=<METRICS_ADMIN_TOKEN>); does nothing otherwise."""
+    if not ENABLED or not ADMIN_TOKEN:
+        return
+    import streamlit as st
+    if st.query_params.get("admin") != ADMIN_TOKEN:
+        return
+    with st.expander("⏱️ Rerun timings (admin)"):
+        st.dataframe(summary(), hide_index=True)
+        with _lock:
+            counters = {f"{app or 'background'}/{name}": v for (app, name), v in sorted(_counters.items())}
+        st.json(counters)
@@ -0,0 +1,182 @@
+# --- Exp 3 preference rankings: mean rank, Borda count, Bradley-Terry, Plackett-Luce ---
+# Every submission is one row of an int16 matrix holding shape codes in rank
+# order (column 0 = most preferred), padded with -1 where a ranking covers
+# fewer shapes than exist. All statistics are a handful of whole-matrix NumPy
+# passes, so 100k submissions of 25 shapes aggregate in about a second, and
+# the number of shapes is whatever the rankings contain.
+#
+#   python preference_stats.py response_log/Eksperimen_3.jsonl --out summaries/exp3
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from analysis import Categories
+
+RANK_OFFSET = 2          # logged rows are [timestamp, participant, rank 1, rank 2, ...]
+TOLERANCE = 1e-8
+MAX_ITER = 10000
+
+
+# --- Loading ---
+def read_rankings(paths, categories=None):
+    """(order matrix, Categories) from response log .jsonl files or Sheets CSV exports."""
+    categories = categories or Categories()
+    rows = []
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line)["row"][RANK_OFFSET:])
+                    except (ValueError, KeyError):
+                        continue  # torn line
+        else:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # header
+                rows.extend(row[RANK_OFFSET:] for row in reader)
+    return encode_rankings(rows, categories), categories
+
+
+def encode_rankings(rows, categories):
+    """Shape names per row -> (n, longest ranking) int16 codes, -1 padded."""
+    rows = [[name for name in row if str(name).strip()] for row in rows]
+    width = max((len(row) for row in rows), default=0)
+    order = np.full((len(rows), width), -1, np.int16)
+    for i, row in enumerate(rows):
+        order[i, :len(row)] = categories.encode(row)
+    return order
+
+
+# --- Position-based scores ---
+def rank_positions(order, n_items):
+    """(n, n_items) zero-based rank of each item per submission, -1 where unranked."""
+    n, k = order.shape
+    pos = np.full((n, n_items), -1, np.int32)
+    rows, cols = np.nonzero(order >= 0)
+    pos[rows, order[rows, cols]] = cols
+    return pos
+
+
+def mean_rank(order, n_items):
+    """(mean 1-based rank, submissions ranking the item) per item; NaN if never ranked."""
+    ranked = order >= 0
+    codes = order[ranked]
+    cols = np.broadcast_to(np.arange(order.shape[1]), order.shape)[ranked]
+    counts = np.bincount(codes, minlength=n_items)
+    sums = np.bincount(codes, weights=cols + 1.0, minlength=n_items)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts, counts
+
+
+def borda(order, n_items):
+    """Borda points per item: n_items - 1 for rank 1 down to 0; unranked items get 0."""
+    ranked = order >= 0
+    cols = np.broadcast_to(np.arange(order.shape[1]), order.shape)[ranked]
+    return np.bincount(order[ranked], weights=(n_items - 1 - cols).astype(float), minlength=n_items)
+
+
+def pairwise_wins(order, n_items):
+    """W[i, j] = submissions ranking i above j (ranked items beat unranked ones)."""
+    pos = rank_positions(order, n_items)
+    pos[pos < 0] = np.iinfo(np.int32).max  # unranked: below every ranked item, tied with each other
+    wins = np.empty((n_items, n_items), np.int64)
+    for i in range(n_items):
+        wins[i] = (pos[:, i:i + 1] < pos).sum(axis=0)
+    return wins
+
+
+# --- Model fits (Hunter 2004 MM algorithms) ---
+def bradley_terry(wins, tol=TOLERANCE, max_iter=MAX_ITER):
+    """(strengths summing to 1, iterations) of the Bradley-Terry model for a win matrix."""
+    wins = np.asarray(wins, float)
+    total = wins.sum(axis=1)
+    games = wins + wins.T
+    p = np.full(len(wins), 1.0 / len(wins))
+    for it in range(1, max_iter + 1):
+        denom = (games / (p[:, None] + p[None, :])).sum(axis=1)
+        new = np.divide(total, denom, out=np.zeros_like(p), where=denom > 0)
+        new /= new.sum()
+        done = np.abs(new - p).max() <= tol * new.max()
+        p = new
+        if done:
+            break
+    return p, it
+
+
+def plackett_luce(order, n_items, tol=TOLERANCE, max_iter=MAX_ITER):
+    """(worths summing to 1, iterations) of the Plackett-Luce model for (partial) rankings.
+
+    A top-k ranking is read as k successive choices, each from the items not
+    chosen yet (ranked or not); a complete ranking's last item is no choice.
+    """
+    n, k = order.shape
+    ranked = order >= 0
+    lengths = ranked.sum(axis=1)
+    choices = np.where(lengths >= n_items, n_items - 1, lengths)
+    stage = ranked & (np.arange(k) < choices[:, None])
+    codes = np.where(ranked, order, 0)
+    chosen = np.bincount(codes[stage], minlength=n_items).astype(float)
+    ranked_codes = codes[ranked]
+
+    gamma = np.full(n_items, 1.0 / n_items)
+    for it in range(1, max_iter + 1):
+        g = np.where(ranked, gamma[codes], 0.0)
+        unranked = gamma.sum() - g.sum(axis=1)
+        # Worth still in play at stage t: unranked items plus those ranked t or later
+        remaining = unranked[:, None] + np.cumsum(g[:, ::-1], axis=1)[:, ::-1]
+        inv = np.divide(1.0, remaining, out=np.zeros_like(remaining), where=stage)
+        through = np.cumsum(inv, axis=1)    # stages an item ranked at t takes part in
+        total = through[:, -1]              # ... and an unranked item takes part in all
+        denom = (total.sum()
+                 - np.bincount(ranked_codes, weights=np.broadcast_to(total[:, None], (n, k))[ranked], minlength=n_items)
+                 + np.bincount(ranked_codes, weights=through[ranked], minlength=n_items))
+        new = np.divide(chosen, denom, out=np.zeros_like(gamma), where=denom > 0)
+        new /= new.sum()
+        done = np.abs(new - gamma).max() <= tol * new.max()
+        gamma = new
+        if done:
+            break
+    return gamma, it
+
+
+# --- Summary ---
+def summarize(order, labels):
+    """Rows of (shape, submissions, mean rank, Borda, Bradley-Terry, Plackett-Luce), best first."""
+    n_items = len(labels)
+    means, counts = mean_rank(order, n_items)
+    points = borda(order, n_items)
+    bt, _ = bradley_terry(pairwise_wins(order, n_items))
+    pl, _ = plackett_luce(order, n_items)
+    rows = [(labels[i], int(counts[i]), float(means[i]), float(points[i]), float(bt[i]), float(pl[i]))
+            for i in range(n_items)]
+    return sorted(rows, key=lambda row: -row[5])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate Exp 3 shape preference rankings.")
+    parser.add_argument("sources", nargs="+", help="response log .jsonl files or Sheets CSV exports")
+    parser.add_argument("--out", default=None, help="directory for preference_summary.csv")
+    args = parser.parse_args(argv)
+
+    order, categories = read_rankings(args.sources)
+    rows = summarize(order, categories.labels)
+    print(f"{len(order)} rankings of {len(categories.labels)} shapes")
+    print(f"  {'shape':<28} {'n':>6} {'mean rank':>9} {'Borda':>9} {'BT':>7} {'PL':>7}")
+    for label, n, mean, points, bt, pl in rows:
+        print(f"  {label:<28} {n:>6} {mean:>9.2f} {points:>9.0f} {bt:>7.4f} {pl:>7.4f}")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        path = os.path.join(args.out, "preference_summary.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["shape", "submissions", "mean_rank", "borda", "bradley_terry", "plackett_luce"])
+            writer.writerows(rows)
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
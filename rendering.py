@@ -0,0 +1,253 @@
+# --- Shared rendering helpers for the scatterplot experiments ---
+# Imported lazily (by stimuli.figure_from_spec), so apps and processes that
+# never rasterize a figure do not pay for matplotlib.
+import os
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # no GUI backend probing; figures only go to PNG
+import matplotlib.image as mimage
+from matplotlib.artist import Artist
+from matplotlib.backend_bases import RendererBase
+from matplotlib.transforms import Affine2D, Bbox
+
+import metrics
+
+# 0 (default): every marker is resampled at its own position, as AnnotationBbox
+# does, so figures match it to within a few levels. SPRITE_SUBPIXEL_STEPS=N
+# opts in to snapping positions to 1/N px, so each sprite is resampled at most
+# N**2 times per size; a marker then sits up to 1/(2N) px off, which can move a
+# whole edge column of its pixels (benchmarks/bench_render.py compares both).
+SUBPIXEL_STEPS = int(os.environ.get("SPRITE_SUBPIXEL_STEPS", "0"))
+
+
+# --- Sprite resampling ---
+def _premultiply(sprite):
+    """uint8 RGBA -> premultiplied float32 in [0, 1]."""
+    data = np.divide(sprite, 0xff, dtype=np.float32)
+    alpha = data[..., 3]
+    if (alpha != 1).any():
+        data = data * alpha[..., None]
+        data[..., 3] = alpha
+    return data
+
+
+def _resample_sprite(prem, left, bottom, width, height):
+    """Resample one premultiplied sprite the way OffsetImage/BboxImage would.
+
+    Returns premultiplied float32 pixels and the integer (x0, y0) pixel corner
+    they go to.
+    """
+    ny, nx = prem.shape[:2]
+    # Same half-pixel rounding as matplotlib's _make_image
+    x0 = np.floor(left + 0.5)
+    y0 = np.ceil(bottom - 0.5 - 1e-8)
+    x1 = np.floor(left + width + 0.5 + 1e-8)
+    y1 = np.ceil(bottom + height - 0.5)
+    out_shape = (int(y1 - y0), int(x1 - x0))
+    if out_shape[0] <= 0 or out_shape[1] <= 0:
+        return None, 0, 0
+
+    # image.origin = 'upper': row 0 of the sprite is the top of the marker
+    t = (Affine2D().translate(0, -ny).scale(1, -1)
+         .scale(width / nx, height / ny)
+         .translate(left - x0, bottom - y0))
+
+    if ((width > 3 * nx or width in (nx, 2 * nx))
+            and (height > 3 * ny or height in (ny, 2 * ny))):
+        interpolation = mimage.NEAREST
+        # Agg picks the right neighbour on exact edges, matplotlib flips to get the left one
+        data = prem[::-1, ::-1]
+        t = Affine2D().translate(-nx, 0).scale(-1, 1) + Affine2D().translate(0, -ny).scale(1, -1) + t
+    else:
+        interpolation = mimage.HANNING
+        data = prem
+
+    out = np.zeros(out_shape + (4,), np.float32)
+    mimage.resample(np.ascontiguousarray(data), out, t, interpolation, False, 1.0, True, 4.0)
+    return out, int(x0), int(y0)
+
+
+def _place_group(prem, lefts, bottoms, width, height):
+    """Resampled tiles and integer pixel corners for one sprite drawn at many positions.
+
+    Positions are snapped to 1/SUBPIXEL_STEPS px (unless that is 0) and
+    split into whole pixels and a sub-pixel phase; the sprite is resampled
+    once per phase that occurs. Returns (tiles (phases, h, w, 4) zero-padded
+    to one size, tile index per marker, (x, y) corner per marker), or None if
+    the sprite is smaller than a pixel.
+    """
+    if SUBPIXEL_STEPS:
+        lefts = np.rint(lefts * SUBPIXEL_STEPS) / SUBPIXEL_STEPS
+        bottoms = np.rint(bottoms * SUBPIXEL_STEPS) / SUBPIXEL_STEPS
+    ix, iy = np.floor(lefts), np.floor(bottoms)
+    phase = np.column_stack([lefts - ix, bottoms - iy])
+    phases, which = np.unique(phase, axis=0, return_inverse=True)
+    resampled = [_resample_sprite(prem, fx, fy, width, height) for fx, fy in phases]
+    if any(out is None for out, _, _ in resampled):
+        return None
+    x_min = min(x0 for _, x0, _ in resampled)
+    y_min = min(y0 for _, _, y0 in resampled)
+    h = max(y0 + out.shape[0] for out, _, y0 in resampled) - y_min
+    w = max(x0 + out.shape[1] for out, x0, _ in resampled) - x_min
+    tiles = np.zeros((len(phases), h, w, 4), np.float32)
+    for tile, (out, x0, y0) in zip(tiles, resampled):
+        tile[y0 - y_min:y0 - y_min + out.shape[0], x0 - x_min:x0 - x_min + out.shape[1]] = out
+    corners = np.column_stack([ix, iy]).astype(np.intp) + (x_min, y_min)
+    return tiles, which.ravel(), corners
+
+
+def _rounds(corners, width, height):
+    """Round of each marker such that markers of one round never overlap.
+
+    A marker's round is one past the latest round of any earlier marker its
+    tile overlaps, so drawing round by round gives the same result as
+    drawing one marker after another.
+    """
+    d = np.abs(corners[:, None, :] - corners[None, :, :])
+    earlier = np.tri(len(corners), k=-1, dtype=bool) & (d[..., 0] < width) & (d[..., 1] < height)
+    rounds = np.zeros(len(corners), np.intp)
+    while True:
+        new = np.where(earlier, rounds + 1, 0).max(axis=1, initial=0)
+        if (new == rounds).all():
+            return rounds
+        rounds = new
+
+
+# --- Batched marker artist ---
+class SpriteLayer(Artist):
+    """Draw every sprite marker of a plot as one composited image.
+
+    Replaces one ``AnnotationBbox(OffsetImage(...))`` per point. Each group is a
+    ``(sprite, xs, ys)`` triple where *sprite* is a uint8 RGBA array, typically
+    20×20 (Exp 1/2) or 12×12 (Exp 4). Markers are centered on their data point,
+    sized in points like ``OffsetImage(zoom=...)`` and skipped when the point is
+    outside the axes, so the output matches the per-point artists.
+    """
+
+    zorder = 1
+
+    def __init__(self, groups, zoom=1.0):
+        super().__init__()
+        self._groups = []
+        for sprite, xs, ys in groups:
+            sprite = np.ascontiguousarray(sprite, dtype=np.uint8)
+            if sprite.ndim != 3 or sprite.shape[2] != 4:
+                raise ValueError(f"Expected an RGBA sprite, got shape {sprite.shape}")
+            xy = np.column_stack([np.asarray(xs, float), np.asarray(ys, float)])
+            self._groups.append((_premultiply(sprite), xy))
+        self._zoom = zoom
+
+    def _marker_boxes(self, renderer):
+        """Yield (prem, lefts, bottoms, width, height, inside) per group, in display pixels."""
+        scale = renderer.points_to_pixels(1.) * self._zoom
+        trans = self.axes.transData
+        (xmin, xmax), (ymin, ymax) = sorted(self.axes.get_xlim()), sorted(self.axes.get_ylim())
+        for prem, xy in self._groups:
+            ny, nx = prem.shape[:2]
+            w, h = nx * scale, ny * scale
+            disp = trans.transform(xy)
+            inside = ((xy[:, 0] >= xmin) & (xy[:, 0] <= xmax)
+                      & (xy[:, 1] >= ymin) & (xy[:, 1] <= ymax))
+            yield prem, disp[:, 0] - w / 2, disp[:, 1] - h / 2, w, h, inside
+
+    def get_window_extent(self, renderer=None):
+        if renderer is None:
+            renderer = self.get_figure(root=True)._get_renderer()
+        boxes = []
+        for _, lefts, bottoms, w, h, _ in self._marker_boxes(renderer):
+            if len(lefts):
+                boxes.append(Bbox([[lefts.min(), bottoms.min()],
+                                   [lefts.max() + w, bottoms.max() + h]]))
+        return Bbox.union(boxes) if boxes else Bbox.null()
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        if getattr(renderer.draw_image, "__wrapped__", None) is RendererBase.draw_image:
+            # savefig(bbox_inches="tight") first lays the figure out with every draw_*
+            # method replaced by a no-op (RendererBase._draw_disabled): nothing would show
+            self.stale = False
+            return
+        with metrics.phase("sprite_composite"):
+            self._composite(renderer)
+
+    def _composite(self, renderer):
+        width, height = renderer.get_canvas_width_height()
+        placed = [_place_group(prem, lefts[inside], bottoms[inside], w, h)
+                  for prem, lefts, bottoms, w, h, inside in self._marker_boxes(renderer) if inside.any()]
+        placed = [p for p in placed if p is not None]
+        if not placed:
+            self.stale = False
+            return
+
+        # Every group's tiles in one zero-padded stack, markers in draw order
+        th = max(p[0].shape[1] for p in placed)
+        tw = max(p[0].shape[2] for p in placed)
+        tiles = np.zeros((sum(len(p[0]) for p in placed), th, tw, 4), np.float32)
+        tile_of, k = [], 0
+        for t, which, _ in placed:
+            tiles[k:k + len(t), :t.shape[1], :t.shape[2]] = t
+            tile_of.append(which + k)
+            k += len(t)
+        tile_of = np.concatenate(tile_of)
+        corners = np.concatenate([p[2] for p in placed])
+
+        # Composite onto a canvas covering every tile, so none needs clipping
+        ux0, uy0 = corners.min(axis=0)
+        cw = int(corners[:, 0].max() - ux0) + tw
+        ch = int(corners[:, 1].max() - uy0) + th
+        canvas = np.zeros((ch, cw, 4), np.float32)
+        # windows[y, x] is the (th, tw, 4) block of the canvas whose corner is (x, y), writable
+        windows = np.lib.stride_tricks.as_strided(
+            canvas, (ch - th + 1, cw - tw + 1, th, tw, 4), canvas.strides[:2] + canvas.strides)
+        rounds = _rounds(corners, tw, th)
+        order = np.argsort(rounds, kind="stable")
+        for batch in np.split(order, np.flatnonzero(np.diff(rounds[order])) + 1):
+            # Porter-Duff "over" in premultiplied space; tiles of one round never overlap
+            xs, ys = corners[batch, 0] - ux0, corners[batch, 1] - uy0
+            src = tiles[tile_of[batch]]
+            windows[ys, xs] = windows[ys, xs] * (1 - src[..., 3:4]) + src
+
+        # Only the part on the figure is drawn
+        cx0, cy0 = max(ux0, 0), max(uy0, 0)
+        cx1 = min(ux0 + cw, int(np.ceil(width)))
+        cy1 = min(uy0 + ch, int(np.ceil(height)))
+        if cx1 <= cx0 or cy1 <= cy0:
+            self.stale = False
+            return
+        canvas = canvas[cy0 - uy0:cy1 - uy0, cx0 - ux0:cx1 - ux0]
+
+        # Back to straight alpha and 0-255 with one multiply per channel
+        alpha = canvas[..., 3]
+        scale = np.repeat(np.divide(255, alpha, out=np.zeros_like(alpha), where=alpha > 0)[..., None], 4, axis=2)
+        scale[..., 3] = 255
+        canvas *= scale
+        canvas += 0.5
+        image = np.minimum(canvas, 255, out=canvas).astype(np.uint8)
+
+        gc = renderer.new_gc()
+        gc.set_alpha(self.get_alpha())
+        renderer.draw_image(gc, int(cx0), int(cy0), image)
+        gc.restore()
+        self.stale = False
+
+
+def warm():
+    """Load the figure stack and the default font by saving one tiny figure."""
+    import io
+    from matplotlib import font_manager
+    from matplotlib.figure import Figure
+    font_manager.get_font(font_manager.findfont(font_manager.FontProperties()))
+    fig = Figure(figsize=(1, 1))
+    ax = fig.subplots()
+    ax.set_xlabel("X")
+    ax.legend(handles=[ax.scatter([], [], label="0")])
+    fig.savefig(io.BytesIO(), format="png", dpi=20)
+
+
+def add_sprite_markers(ax, groups, zoom=1.0):
+    """Add one SpriteLayer holding all ``(sprite, xs, ys)`` groups to *ax*."""
+    layer = SpriteLayer(groups, zoom=zoom)
+    ax.add_artist(layer)
+    return layer
@@ -0,0 +1,79 @@
+# --- Response timing: render, transfer and decision time per trial ---
+# Server phases are timed with time.perf_counter_ns (monotonic, so wall-clock
+# jumps never reach the data). What happens in the browser is timed there by
+# an invisible component (components/clock/index.html), which reports once
+# per trial when the stimulus was on screen: for st.image PNGs it watches the
+# page's images, for client-side plots (client_render.py) the scatter
+# component announces its first paint. The report comes back as a component
+# value, i.e. in one extra rerun per trial, and never blocks the participant.
+#
+# Per trial, with S times on the server's clock and C times on the browser's:
+#   render_ms      S: start of the rerun that first shows the trial -> stimulus handed to Streamlit
+#   transfer_ms    handed over -> on screen: half the round trip
+#                  (S_ack - S_sent) - (C_ack - C_received), plus C_displayed - C_received
+#   decision_ms    on screen -> submit: (S_submit - S_ack) + (C_ack - C_displayed); the
+#                  report and the submit click travel the same way, so upstream latency cancels
+#   response_time  S: stimulus handed over -> submit received, seconds
+# Without a report (no browser, e.g. AppTest) transfer_ms and decision_ms are None.
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "clock")
+FIELDS = ("response_time", "render_ms", "transfer_ms", "decision_ms")
+
+_lock = threading.Lock()
+_component = None
+
+
+@dataclass
+class TrialClock:
+    """Timestamps of one trial's stimulus, kept in session state."""
+    trial: str
+    rerun_ns: int              # start of the rerun that first showed the trial
+    sent_ns: int               # stimulus handed to Streamlit
+    ack_ns: int = None         # start of the rerun that brought the browser's report
+    report: dict = None        # browser ms: received, displayed, sent
+
+
+def _clock():
+    global _component
+    with _lock:
+        if _component is None:
+            import streamlit.components.v1 as components
+            _component = components.declare_component("trial_clock", path=COMPONENT_DIR)
+    return _component
+
+
+def track(state, trial, rerun_ns, stimuli=None, canvas=False):
+    """Stamp the first display of *trial* and place the browser clock; call right after the stimulus.
+
+    *stimuli* are the ids the scatter components were given (canvas mode) or
+    just as many entries as there are stimulus images (PNG mode).
+    """
+    trial = str(trial)
+    clock = state.get("trial_clock")
+    if clock is None or clock.trial != trial:
+        clock = state["trial_clock"] = TrialClock(trial, rerun_ns, time.perf_counter_ns())
+    report = _clock()(trial=trial, stimuli=list(stimuli or [trial]), canvas=canvas,
+                      key="trial-clock", default=None)
+    if report and report.get("trial") == trial and clock.report is None:
+        clock.report, clock.ack_ns = report, rerun_ns
+    return clock
+
+
+def measure(state, submit_ns):
+    """{response_time, render_ms, transfer_ms, decision_ms} of the current trial, answered at *submit_ns*."""
+    clock = state.get("trial_clock")
+    if clock is None:
+        return dict.fromkeys(FIELDS)
+    timing = {"response_time": round((submit_ns - clock.sent_ns) / 1e9, 4),
+              "render_ms": round((clock.sent_ns - clock.rerun_ns) / 1e6, 1),
+              "transfer_ms": None, "decision_ms": None}
+    r = clock.report
+    if r is not None:
+        round_trip = (clock.ack_ns - clock.sent_ns) / 1e6 - (r["sent"] - r["received"])
+        timing["transfer_ms"] = round(max(round_trip, 0.0) / 2 + r["displayed"] - r["received"], 1)
+        timing["decision_ms"] = round((submit_ns - clock.ack_ns) / 1e6 + r["sent"] - r["displayed"], 1)
+    return timing
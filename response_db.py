@@ -0,0 +1,404 @@
+# --- Normalized SQLite response store ---
+# Typed, queryable copy of every response, fed from the response log
+# (response_log.py) by one background thread per worksheet. Sheets stays an
+# optional downstream mirror of the same log (RESPONSE_BACKENDS).
+#
+#   participants  one row per participant (Exp 3 name/ID, else one per browser session)
+#   shapes        one row per shape file name, without .png
+#   trials        one row per submitted answer: experiment, palette, category count,
+#                 typed correctness (0/1), response time and its render / transfer /
+#                 decision split (response_clock.py)
+#   trial_shapes  the shapes a trial showed, in category order (plot 'A'/'B' in
+#                 Exp 4), or an Exp 3 ranking in rank order
+#   cell_counts   running trial/correct counts per (experiment, palette, n_categories)
+#   shape_counts  running trial/correct counts per (experiment, shape shown); both are
+#                 kept in the same transaction as the inserts
+#
+# Inserts are batched: one transaction per batch, rows numbered in Python and
+# written with executemany. The database runs in WAL mode, so analysis queries
+# read while the apps write. Accuracy by palette x n_categories or by shape
+# comes from the running counts and takes milliseconds at any size; other
+# breakdowns group over a covering index of trials.
+#
+#   python response_db.py import Eksperimen_2 response_log/Eksperimen_2.jsonl
+#   python response_db.py accuracy 2 --by palette n_categories
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+from analysis import parse_status
+
+DB_PATH = os.environ.get("RESPONSE_DB", os.path.join(os.environ.get("RESPONSE_LOG_DIR", "response_log"),
+                                                     "responses.db"))
+EXPERIMENTS = {"Eksperimen_1": 1, "Eksperimen_2": 2, "Eksperimen_3": 3, "Eksperimen_4": 4}
+BUSY_TIMEOUT_MS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    participant_id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    shape_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS trials (
+    trial_id INTEGER PRIMARY KEY,
+    experiment INTEGER NOT NULL,
+    log_seq INTEGER,                  -- response log sequence number, NULL for CSV imports
+    submitted_at TEXT NOT NULL,
+    participant_id INTEGER REFERENCES participants,
+    mode TEXT,
+    task_number INTEGER,
+    palette TEXT,
+    n_categories INTEGER,
+    shape_combination TEXT,
+    choice TEXT,
+    answer TEXT,
+    correct INTEGER,                  -- 0/1, NULL for Exp 3
+    response_time REAL,               -- seconds
+    seed INTEGER,
+    render_ms REAL,
+    transfer_ms REAL,
+    decision_ms REAL,
+    UNIQUE (experiment, log_seq)
+);
+CREATE TABLE IF NOT EXISTS trial_shapes (
+    trial_id INTEGER NOT NULL REFERENCES trials,
+    plot TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL,
+    shape_id INTEGER NOT NULL REFERENCES shapes,
+    PRIMARY KEY (trial_id, plot, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cell_counts (
+    experiment INTEGER NOT NULL,
+    palette TEXT NOT NULL,            -- '' where the experiment has none
+    n_categories INTEGER NOT NULL,    -- 0 where the experiment has none
+    trials INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (experiment, palette, n_categories)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shape_counts (
+    experiment INTEGER NOT NULL,
+    shape_id INTEGER NOT NULL REFERENCES shapes,
+    trials INTEGER NOT NULL,          -- trials showing the shape (once per trial)
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (experiment, shape_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trials_cell ON trials (experiment, palette, n_categories, correct);
+CREATE INDEX IF NOT EXISTS trials_participant ON trials (participant_id);
+CREATE INDEX IF NOT EXISTS trial_shapes_shape ON trial_shapes (shape_id);
+"""
+
+TRIAL_COLUMNS = ("experiment", "log_seq", "submitted_at", "participant_id", "mode", "task_number", "palette",
+                 "n_categories", "shape_combination", "choice", "answer", "correct", "response_time", "seed",
+                 "render_ms", "transfer_ms", "decision_ms")
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = {"trials": (("render_ms", "REAL"), ("transfer_ms", "REAL"), ("decision_ms", "REAL"))}
+GROUP_COLUMNS = ("palette", "n_categories", "shape_combination", "mode", "participant_id")
+
+
+# --- Sheet rows -> records ---
+# For log entries written without a record and for Sheets CSV exports; the
+# positions are those of the rows the apps append.
+def _split_shapes(value):
+    if isinstance(value, list):
+        return value
+    return [s.strip() for s in str(value).split(",") if s.strip()]
+
+
+def _int(value):
+    return int(float(value)) if str(value).strip() not in ("", "None") else None
+
+
+def _float(value):
+    return float(value) if str(value).strip() not in ("", "None") else None
+
+
+def _timing(row, start):
+    """response_time, render_ms, transfer_ms, decision_ms from row[start:], where logged."""
+    fields = ("response_time", "render_ms", "transfer_ms", "decision_ms")
+    return {name: _float(value) for name, value in zip(fields, row[start:start + len(fields)])}
+
+
+def _exp1_record(row):
+    return {"submitted_at": row[0], "task_number": _int(row[1]), "n_categories": _int(row[2]),
+            "shape_combination": row[3], "choice": row[4], "answer": row[5],
+            "correct": parse_status(row[6]), "shapes": _split_shapes(row[7]), **_timing(row, 8)}
+
+
+def _exp2_record(row):
+    return {"submitted_at": row[0], "palette": row[1], "n_categories": _int(row[2]), "choice": row[3],
+            "answer": row[4], "correct": parse_status(row[5]), "shapes": _split_shapes(row[6]),
+            **_timing(row, 7)}
+
+
+def _exp3_record(row):
+    ranking = [name for name in row[2:] if str(name).strip()]
+    return {"submitted_at": row[0], "participant": row[1], "n_categories": len(ranking), "shapes": ranking}
+
+
+def _exp4_record(row):
+    return {"task_number": _int(row[0]), "mode": row[1], "choice": row[2], "answer": row[3],
+            "correct": parse_status(row[4]), "response_time": float(row[5]),
+            "shapes": {"A": _split_shapes(row[6]), "B": _split_shapes(row[7])},
+            "submitted_at": row[8], "seed": _int(row[9]),
+            **dict(zip(("render_ms", "transfer_ms", "decision_ms"), map(_float, row[10:13])))}
+
+
+ROW_PARSERS = {1: _exp1_record, 2: _exp2_record, 3: _exp3_record, 4: _exp4_record}
+
+
+def record_from_row(experiment, row):
+    """Typed record of a row as the experiment's app appends it to the sheet."""
+    return ROW_PARSERS[experiment](row)
+
+
+# --- Store ---
+class ResponseDB:
+    """One SQLite database of responses; a connection per thread."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._ids_lock = threading.Lock()
+        self._ids = {"shapes": {}, "participants": {}}   # committed name -> id
+        conn = self.connection()
+        with conn:
+            conn.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for name, kind in columns:
+                    if name not in have:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")   # the response log is the durable copy
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+    def last_seq(self, worksheet):
+        """Highest response log sequence number of *worksheet* already stored (0 if none)."""
+        row = self.connection().execute("SELECT MAX(log_seq) FROM trials WHERE experiment = ?",
+                                        (EXPERIMENTS[worksheet],)).fetchone()
+        return row[0] or 0
+
+    def _lookup(self, conn, table, names, new_ids):
+        """name -> id for *names* in shapes/participants, inserting unknown ones."""
+        key = "name" if table == "shapes" else "label"
+        with self._ids_lock:
+            known = self._ids[table]
+            missing = sorted({n for n in names if n not in known and n not in new_ids})
+        if missing:
+            conn.executemany(f"INSERT OR IGNORE INTO {table} ({key}) VALUES (?)", [(n,) for n in missing])
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                new_ids.update(conn.execute(
+                    f"SELECT {key}, rowid FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})", chunk))
+        return lambda name: known.get(name) or new_ids[name]
+
+    def insert(self, worksheet, entries, rejected=None):
+        """Store log entries [(seq, row, record or None)] of *worksheet* in one transaction.
+
+        Entries at or below the stored sequence number are skipped, so a batch
+        that was written before a crash can be sent again. seq None (CSV
+        imports) is always stored. An entry that does not parse raises, unless
+        a *rejected* list is given: then (seq, row, record, error) goes there
+        and the rest of the batch is stored. Returns the number of trials written.
+        """
+        if not entries:
+            return 0
+        experiment = EXPERIMENTS[worksheet]
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = self.last_seq(worksheet)
+            records = []
+            for seq, row, record in entries:
+                if seq is None or seq > last:
+                    try:
+                        record = record if record is not None else record_from_row(experiment, row)
+                        if record.get("submitted_at") is None:
+                            raise KeyError("submitted_at")
+                        records.append((seq, record, _shape_lists(record)))
+                    except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+                        if rejected is None:
+                            raise
+                        rejected.append((seq, row, record, e))
+            new_ids = {"shapes": {}, "participants": {}}
+            shape_id = self._lookup(conn, "shapes", [name for _, _, shapes in records
+                                                     for names in shapes.values() for name in names],
+                                    new_ids["shapes"])
+            participant_id = self._lookup(conn, "participants", [rec["participant"] for _, rec, _ in records
+                                                                 if rec.get("participant")],
+                                          new_ids["participants"])
+            next_id = conn.execute("SELECT COALESCE(MAX(trial_id), 0) + 1 FROM trials").fetchone()[0]
+            trials, trial_shapes, cells, shape_cells = [], [], {}, {}
+            for trial_id, (seq, rec, shapes) in enumerate(records, next_id):
+                correct = rec.get("correct")
+                correct = None if correct is None else int(bool(correct))
+                participant = rec.get("participant")
+                trials.append((trial_id, experiment, seq, str(rec["submitted_at"]),
+                               participant_id(participant) if participant else None,
+                               rec.get("mode"), rec.get("task_number"), rec.get("palette"),
+                               rec.get("n_categories"), rec.get("shape_combination"), rec.get("choice"),
+                               rec.get("answer"), correct, rec.get("response_time"), rec.get("seed"),
+                               rec.get("render_ms"), rec.get("transfer_ms"), rec.get("decision_ms")))
+                for plot, names in shapes.items():
+                    trial_shapes.extend((trial_id, plot, i, shape_id(name)) for i, name in enumerate(names))
+                if correct is not None:
+                    counts = cells.setdefault((experiment, rec.get("palette") or "", rec.get("n_categories") or 0),
+                                              [0, 0])
+                    counts[0] += 1
+                    counts[1] += correct
+                    for sid in {shape_id(name) for names in shapes.values() for name in names}:
+                        counts = shape_cells.setdefault((experiment, sid), [0, 0])
+                        counts[0] += 1
+                        counts[1] += correct
+            conn.executemany(f"INSERT INTO trials (trial_id, {', '.join(TRIAL_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * (len(TRIAL_COLUMNS) + 1))})", trials)
+            conn.executemany("INSERT INTO trial_shapes VALUES (?, ?, ?, ?)", trial_shapes)
+            conn.executemany(
+                "INSERT INTO cell_counts VALUES (?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+                "trials = trials + excluded.trials, correct = correct + excluded.correct",
+                [(*cell, n, n_correct) for cell, (n, n_correct) in cells.items()])
+            conn.executemany(
+                "INSERT INTO shape_counts VALUES (?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+                "trials = trials + excluded.trials, correct = correct + excluded.correct",
+                [(*cell, n, n_correct) for cell, (n, n_correct) in shape_cells.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._ids_lock:
+            for table, ids in new_ids.items():
+                self._ids[table].update(ids)
+        return len(trials)
+
+    # --- Queries ---
+    def accuracy(self, experiment, by=("palette", "n_categories"), from_counts=True):
+        """[(*group values, trials, accuracy)] for one experiment, grouped by columns of *by*.
+
+        Palette and category count, or shape alone, come from the running
+        counts (unless *from_counts* is false); other groupings are computed
+        over the trials themselves. A trial counts once for every shape it showed.
+        """
+        by = tuple(by)
+        conn = self.connection()
+        if from_counts and by == ("shape",):
+            return conn.execute(
+                "SELECT s.name, c.trials, CAST(c.correct AS REAL) / c.trials FROM shape_counts c "
+                "JOIN shapes s ON s.shape_id = c.shape_id WHERE c.experiment = ? ORDER BY s.name",
+                (experiment,)).fetchall()
+        if from_counts and set(by) <= {"palette", "n_categories"}:
+            cols = ", ".join(by)
+            sql = (f"SELECT {cols + ', ' if by else ''}SUM(trials), CAST(SUM(correct) AS REAL) / SUM(trials) "
+                   f"FROM cell_counts WHERE experiment = ?{' GROUP BY ' + cols + ' ORDER BY ' + cols if by else ''}")
+            return conn.execute(sql, (experiment,)).fetchall()
+        unknown = [c for c in by if c not in GROUP_COLUMNS + ("shape",)]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown}, expected columns of {GROUP_COLUMNS + ('shape',)}")
+        cols = ", ".join("s.name" if c == "shape" else f"t.{c}" for c in by)
+        join = ("JOIN (SELECT DISTINCT trial_id, shape_id FROM trial_shapes) ts ON ts.trial_id = t.trial_id "
+                "JOIN shapes s ON s.shape_id = ts.shape_id" if "shape" in by else "")
+        sql = (f"SELECT {cols}, COUNT(*), AVG(t.correct) FROM trials t {join} "
+               f"WHERE t.experiment = ? AND t.correct IS NOT NULL GROUP BY {cols} ORDER BY {cols}")
+        return conn.execute(sql, (experiment,)).fetchall()
+
+    def rankings(self):
+        """[(participant, [shape names, most preferred first])] of every Exp 3 submission, in order."""
+        rows = self.connection().execute(
+            "SELECT t.trial_id, p.label, s.name FROM trials t "
+            "LEFT JOIN participants p ON p.participant_id = t.participant_id "
+            "JOIN trial_shapes ts ON ts.trial_id = t.trial_id JOIN shapes s ON s.shape_id = ts.shape_id "
+            "WHERE t.experiment = 3 ORDER BY t.trial_id, ts.position")
+        out = {}
+        for trial_id, label, name in rows:
+            out.setdefault(trial_id, (label, []))[1].append(name)
+        return list(out.values())
+
+    def count(self, experiment=None):
+        if experiment is None:
+            return self.connection().execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+        return self.connection().execute("SELECT COUNT(*) FROM trials WHERE experiment = ?",
+                                         (experiment,)).fetchone()[0]
+
+
+def _shape_lists(record):
+    """{plot: shape names without extension} of a record ('' for single-plot experiments)."""
+    shapes = record.get("shapes") or []
+    if not isinstance(shapes, dict):
+        shapes = {"": shapes}
+    return {plot: [os.path.splitext(os.path.basename(name))[0] for name in names] for plot, names in shapes.items()}
+
+
+# --- One store per process ---
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_response_db(path=DB_PATH):
+    """Return the process-wide ResponseDB, creating the database on first use."""
+    global _db
+    with _db_lock:
+        if _db is None or _db.path != path:
+            _db = ResponseDB(path)
+    return _db
+
+
+# --- Import ---
+def read_entries(path):
+    """[(seq, row, record)] from a response log .jsonl, or [(None, row, None)] from a Sheets CSV export."""
+    entries = []
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn line
+                entries.append((entry["seq"], entry["row"], entry.get("record")))
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            entries.extend((None, row, None) for row in reader if any(row))
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load responses into the SQLite store and query them.")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="store a response log (.jsonl) or a Sheets CSV export (import CSVs once)")
+    imp.add_argument("worksheet", choices=sorted(EXPERIMENTS))
+    imp.add_argument("sources", nargs="+")
+    acc = sub.add_parser("accuracy", help="accuracy table of one experiment")
+    acc.add_argument("experiment", type=int, choices=(1, 2, 4))
+    acc.add_argument("--by", nargs="*", default=["palette", "n_categories"])
+    args = parser.parse_args(argv)
+
+    db = ResponseDB(args.db)
+    if args.command == "import":
+        for path in args.sources:
+            print(f"{path}: {db.insert(args.worksheet, read_entries(path))} trials stored")
+        return
+    for row in db.accuracy(args.experiment, args.by):
+        *groups, n, accuracy = row
+        print("  ".join(f"{g!s:<14}" for g in groups) + f"{n:>8}  {accuracy:.3f}")
+
+
+if __name__ == "__main__":
+    main()
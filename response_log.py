@@ -0,0 +1,379 @@
+# --- Durable response log with background flush to the response backends ---
+# Submit handlers append each row to a local JSONL write-ahead log (fsync'd)
+# and return immediately. Per worksheet, one worker thread drains the log into
+# the SQLite store (response_db.py) in batches, and another mirrors it to
+# Sheets with append_rows, each retrying with backoff until it succeeds.
+# RESPONSE_BACKENDS picks the backends (default "sqlite,sheets").
+#
+# Files per worksheet, in RESPONSE_LOG_DIR:
+#   <name>.jsonl     every row ever submitted, one {"seq": n, "row": [...], "record": {...}}
+#                    per line; the record holds the same answer as typed fields
+#   <name>.offset    highest seq known to be in the sheet
+#   <name>.inflight  the batch currently being sent and a lower bound on the sheet's rows
+#                    before it, so a crash mid-request can be resolved against the sheet
+#                    instead of re-sending blindly
+#   <name>.rejected  entries the SQLite store could not parse, one per line with the
+#                    error, skipped so they do not hold up the rest of the log
+import atexit
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import metrics
+from response_db import get_response_db
+
+LOG_DIR = os.environ.get("RESPONSE_LOG_DIR", "response_log")
+BACKENDS = frozenset(b.strip() for b in os.environ.get("RESPONSE_BACKENDS", "sqlite,sheets").split(",") if b.strip())
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 2.0     # seconds to wait for more rows before sending a batch
+STORE_BATCH_SIZE = 1000
+STORE_INTERVAL = 0.2     # the same for a batch of inserts into the SQLite store
+MAX_BACKOFF = 120.0
+
+
+def _fsync_write(path, text):
+    """Atomically replace *path* with *text*."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _last_row(response):
+    """Last sheet row an append_rows response says it wrote, or None."""
+    updated = ((response or {}).get("updates") or {}).get("updatedRange", "")
+    match = re.search(r"(\d+)$", updated)
+    return int(match.group(1)) if match else None
+
+
+def _same_row(sent, got):
+    """Loose match of a row we sent against what Sheets returns (all strings)."""
+    if len(got) < len(sent):
+        return False
+    for a, b in zip(sent, got):
+        if isinstance(a, (int, float)) and not isinstance(a, bool):
+            continue  # number formatting in the sheet may differ
+        if str(a) != b:
+            return False
+    return True
+
+
+class ResponseLog:
+    """Append-only local log for one worksheet, drained to its backends in the background.
+
+    With workers=False no threads are started and the caller drains the log
+    with _send_batch() / _store_batch() (benchmarks). *db* replaces the
+    process-wide ResponseDB as the SQLite backend.
+    """
+
+    def __init__(self, name, open_worksheet, log_dir=LOG_DIR, backends=BACKENDS, workers=True, db=None):
+        self.name = name
+        self.open_worksheet = open_worksheet
+        os.makedirs(log_dir, exist_ok=True)
+        self._log_path = os.path.join(log_dir, f"{name}.jsonl")
+        self._offset_path = os.path.join(log_dir, f"{name}.offset")
+        self._inflight_path = os.path.join(log_dir, f"{name}.inflight")
+        self._rejected_path = os.path.join(log_dir, f"{name}.rejected")
+        self.mirror = "sheets" in backends
+        self.db = (db or get_response_db()) if "sqlite" in backends else None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._store_wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._threads = []
+        self._worksheet = None
+        self._sheet_rows = 0  # rows known to be in the sheet, from the last append_rows response
+        self._stats = {"appended": 0, "flushed": 0, "batches": 0, "errors": 0,
+                       "stored": 0, "store_batches": 0, "store_errors": 0, "store_rejected": 0}
+        self.last_error = None
+        self.last_store_error = None
+
+        self._committed = self._read_offset()
+        stored = self.db.last_seq(name) if self.db else None
+        behind = [seq for seq, on in ((self._committed, self.mirror), (stored, self.db)) if on]
+        entries, last = self._read_entries(min(behind, default=float("inf")))
+        # Rows still to reach Sheets: (seq, row); rows still to reach the store: (seq, row, record)
+        self._pending = [(s, r) for s, r, _ in entries if s > self._committed] if self.mirror else []
+        rejected = self._read_rejected() if self.db else set()
+        self._unstored = [e for e in entries if e[0] > stored and e[0] not in rejected] if self.db else []
+        self._seq = max(last, self._committed, stored or 0)
+        self._file = open(self._log_path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write("\n")  # terminate a torn line so the next row parses
+
+        if workers and self.mirror:
+            self._threads.append(threading.Thread(target=self._run, name=f"response-log-{name}", daemon=True))
+        if workers and self.db:
+            self._threads.append(threading.Thread(target=self._run_store, name=f"response-store-{name}",
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    # --- Recovery ---
+    def _read_offset(self):
+        try:
+            with open(self._offset_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _read_entries(self, after):
+        """([(seq, row, record)] logged after seq *after*, last seq in the log)."""
+        entries, last = [], 0
+        try:
+            with open(self._log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-write
+                    last = entry["seq"]
+                    if last > after:
+                        entries.append((last, entry["row"], entry.get("record")))
+        except FileNotFoundError:
+            pass
+        return entries, last
+
+    def _read_rejected(self):
+        """Seqs already quarantined in the .rejected file."""
+        seqs = set()
+        try:
+            with open(self._rejected_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        seqs.add(json.loads(line)["seq"])
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return seqs
+
+    def _ends_with_newline(self):
+        with open(self._log_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    # --- Submit path ---
+    def append(self, row, record=None):
+        """Durably record *row* locally and return its sequence number.
+
+        *row* is what goes to the sheet; *record* is the same answer as typed
+        fields for the SQLite store (response_db.py), which otherwise parses
+        the row.
+        """
+        row = list(row)
+        entry = {"seq": None, "row": row}
+        if record is not None:
+            entry["record"] = record
+        with metrics.phase("log_append"), self._lock:
+            seq = entry["seq"] = self._seq + 1
+            self._file.write(json.dumps(entry, default=str) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._seq = seq
+            if self.mirror:
+                self._pending.append((seq, row))
+            if self.db:
+                self._unstored.append((seq, row, record))
+            self._stats["appended"] += 1
+        metrics.count("responses_logged")
+        self._wakeup.set()
+        self._store_wakeup.set()
+        return seq
+
+    # --- Background flush ---
+    def _get_worksheet(self):
+        if self._worksheet is None:
+            ws = self.open_worksheet()
+            if ws is None:
+                raise RuntimeError(f"Worksheet '{self.name}' is not available")
+            self._worksheet = ws
+        return self._worksheet
+
+    def _commit(self, last_seq):
+        _fsync_write(self._offset_path, str(last_seq))
+        try:
+            os.remove(self._inflight_path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._pending = [(s, r) for s, r in self._pending if s > last_seq]
+            self._committed = last_seq
+
+    def _resolve_inflight(self, ws):
+        """After a crash, find out whether the last in-flight batch reached the sheet."""
+        try:
+            with open(self._inflight_path, encoding="utf-8") as f:
+                inflight = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if inflight["last"] <= self._committed:
+            os.remove(self._inflight_path)
+            return
+        with self._lock:
+            batch = [r for s, r in self._pending if inflight["first"] <= s <= inflight["last"]]
+        metrics.count("sheets_calls")
+        values = ws.get_all_values()[inflight.get("rows_before") or 0:]
+        for start in range(len(values) - len(batch) + 1):
+            if all(_same_row(sent, got) for sent, got in zip(batch, values[start:start + len(batch)])):
+                self._commit(inflight["last"])
+                return
+        os.remove(self._inflight_path)
+
+    def _send_batch(self):
+        ws = self._get_worksheet()
+        self._resolve_inflight(ws)
+        with self._lock:
+            batch = self._pending[:BATCH_SIZE]
+        if not batch:
+            return 0
+        first, last = batch[0][0], batch[-1][0]
+        with metrics.phase("sheets_append"):
+            # The sheet only grows (other processes append too), so rows seen after
+            # our last append bound where this batch can land without reading the sheet
+            _fsync_write(self._inflight_path, json.dumps(
+                {"first": first, "last": last, "rows_before": self._sheet_rows}))
+            response = ws.append_rows([r for _, r in batch])
+        metrics.count("sheets_calls")
+        self._sheet_rows = _last_row(response) or self._sheet_rows
+        self._commit(last)
+        with self._lock:
+            self._stats["flushed"] += len(batch)
+            self._stats["batches"] += 1
+        return len(batch)
+
+    def _run(self):
+        failures = 0
+        while not self._closed.is_set():
+            if not self.pending_count():
+                self._wakeup.wait()
+                self._wakeup.clear()
+                # Give concurrent submits a moment to land in the same batch
+                if self._closed.wait(FLUSH_INTERVAL):
+                    return
+            try:
+                self._send_batch()
+                failures = 0
+                self.last_error = None
+            except Exception as e:  # quota, network, auth: keep the rows and retry
+                failures += 1
+                self._worksheet = None
+                self.last_error = e
+                with self._lock:
+                    self._stats["errors"] += 1
+                delay = min(MAX_BACKOFF, 2 ** failures) * (0.5 + random.random() / 2)
+                self._closed.wait(delay)  # new submits must not cut the backoff short
+
+    # --- Background store ---
+    def _store_batch(self):
+        with self._lock:
+            batch = self._unstored[:STORE_BATCH_SIZE]
+        if not batch:
+            return 0
+        rejected = []
+        with metrics.phase("store_insert"):
+            self.db.insert(self.name, batch, rejected)
+        if rejected:
+            # Old or malformed rows would fail every retry: set them aside and keep draining
+            with open(self._rejected_path, "a", encoding="utf-8") as f:
+                for seq, row, record, error in rejected:
+                    f.write(json.dumps({"seq": seq, "row": row, "record": record, "error": repr(error)},
+                                       default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        last = batch[-1][0]
+        with self._lock:
+            self._unstored = [e for e in self._unstored if e[0] > last]
+            self._stats["stored"] += len(batch) - len(rejected)
+            self._stats["store_rejected"] += len(rejected)
+            self._stats["store_batches"] += 1
+        return len(batch)
+
+    def _run_store(self):
+        failures = 0
+        while not self._closed.is_set():
+            if not self.unstored_count():
+                self._store_wakeup.wait()
+                self._store_wakeup.clear()
+                if self._closed.wait(STORE_INTERVAL):
+                    return
+            try:
+                self._store_batch()
+                failures = 0
+                self.last_store_error = None
+            except Exception as e:  # locked or full disk: keep the rows and retry
+                failures += 1
+                self.last_store_error = e
+                with self._lock:
+                    self._stats["store_errors"] += 1
+                delay = min(MAX_BACKOFF, 2 ** failures) * (0.5 + random.random() / 2)
+                self._closed.wait(delay)
+
+    # --- Introspection ---
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def unstored_count(self):
+        with self._lock:
+            return len(self._unstored)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["unstored"] = len(self._unstored)
+            stats["committed_seq"] = self._committed
+        return stats
+
+    def flush(self, timeout=10.0):
+        """Wait up to *timeout* seconds for the backlog to reach every backend."""
+        deadline = time.monotonic() + timeout
+        self._wakeup.set()
+        self._store_wakeup.set()
+        while (self.pending_count() or self.unstored_count()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.pending_count() == 0 and self.unstored_count() == 0
+
+    def close(self, timeout=5.0):
+        """Stop the workers and close the log file; unsent rows stay in the log for the next start."""
+        self._closed.set()
+        self._wakeup.set()
+        self._store_wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            self._file.close()
+
+
+# --- One log per worksheet per process ---
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_response_log(name, open_worksheet):
+    """Return the process-wide ResponseLog for worksheet *name*.
+
+    *open_worksheet* is a zero-argument callable returning a gspread worksheet;
+    it is called from the worker thread, and the latest one passed in wins.
+    """
+    with _logs_lock:
+        log = _logs.get(name)
+        if log is None:
+            log = _logs[name] = ResponseLog(name, open_worksheet)
+        else:
+            log.open_worksheet = open_worksheet
+    return log
+
+
+@atexit.register
+def _flush_on_exit():
+    # Best effort only: anything left over stays in the log for the next start.
+    for log in list(_logs.values()):
+        log.flush(timeout=5.0)
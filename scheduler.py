@@ -0,0 +1,214 @@
+# --- Adaptive trial scheduler for Exp 1 and Exp 2 ---
+# Picks the condition (design cell) of upcoming trials so every cell's
+# accuracy reaches a target 95% interval half-width with as few trials as
+# possible, instead of drawing conditions uniformly (Exp 1) or leaving them
+# to the participant (Exp 2). Switched on with TRIAL_SCHEDULER=adaptive.
+#
+# Each cell's accuracy has a Beta(1 + correct, 1 + wrong) posterior. For the
+# next trial, an accuracy is sampled from every posterior (Thompson
+# sampling) and the cell whose posterior variance one more answer would
+# shrink the most, were that the true accuracy, is picked. Cells already at
+# the target only get trials once every cell is there. Sampling keeps
+# concurrent sessions from all piling onto the same cell.
+#
+# Counts live in one small int64 array per experiment, shared by every
+# session of the process behind a lock, seeded from the SQLite store's
+# running counts (response_db.py) when it is in use and updated as answers
+# come in.
+#
+#   python scheduler.py --cells 55 --target 0.1 --runs 20     (simulator: adaptive vs uniform)
+import argparse
+import os
+import threading
+
+import numpy as np
+
+ADAPTIVE = os.environ.get("TRIAL_SCHEDULER", "uniform") == "adaptive"
+TARGET_HALF_WIDTH = float(os.environ.get("SCHEDULER_TARGET", "0.1"))   # of the 95% interval
+Z = 1.96
+
+
+# --- Beta posterior arithmetic (vectorized over cells) ---
+def _variance(a, b):
+    return a * b / ((a + b) ** 2 * (a + b + 1))
+
+
+def half_width(trials, correct):
+    """Normal-approximation 95% half-width of each cell's Beta posterior."""
+    a, b = 1.0 + correct, 1.0 + trials - correct
+    return Z * np.sqrt(_variance(a, b))
+
+
+def pick(trials, correct, rng, n=1, target=TARGET_HALF_WIDTH):
+    """Indices of the cells for the next *n* trials.
+
+    Within a batch each pick counts as a pending answer at the posterior
+    mean, so one batch spreads over cells the way n sequential picks would.
+    """
+    trials = np.asarray(trials, float).copy()
+    correct = np.asarray(correct, float).copy()
+    picks = np.empty(n, np.intp)
+    for k in range(n):
+        a, b = 1.0 + correct, 1.0 + trials - correct
+        p = rng.beta(a, b)
+        gain = _variance(a, b) - (p * _variance(a + 1, b) + (1 - p) * _variance(a, b + 1))
+        open_cells = Z * np.sqrt(_variance(a, b)) > target
+        if open_cells.any():
+            gain = np.where(open_cells, gain, -np.inf)
+        i = picks[k] = int(np.argmax(gain))
+        trials[i] += 1
+        correct[i] += a[i] / (a[i] + b[i])
+    return picks
+
+
+# --- Shared counts ---
+class CellCounts:
+    """Trials and correct answers per design cell in one small array, shared by all sessions."""
+
+    def __init__(self, cells):
+        self.cells = tuple(cells)
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+        self._counts = np.zeros((len(self.cells), 2), np.int64)   # trials, correct
+        self._lock = threading.Lock()
+
+    def add(self, cell, trials, correct):
+        """Count *trials* answers to *cell*, *correct* of them right; unknown cells are ignored."""
+        i = self.index.get(cell)
+        if i is None:
+            return False
+        with self._lock:
+            self._counts[i, 0] += trials
+            self._counts[i, 1] += correct
+        return True
+
+    def snapshot(self):
+        """(trials, correct) arrays, copied under the lock."""
+        with self._lock:
+            counts = self._counts.copy()
+        return counts[:, 0], counts[:, 1]
+
+
+class Scheduler:
+    """Thompson-style allocator of design cells over a shared CellCounts table."""
+
+    def __init__(self, cells, target=TARGET_HALF_WIDTH, seed=None):
+        self.table = CellCounts(cells)
+        self.target = target
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def cells(self):
+        return self.table.cells
+
+    def assign(self, n=1):
+        """Cells for the next *n* trials."""
+        trials, correct = self.table.snapshot()
+        with self._rng_lock:
+            picks = pick(trials, correct, self._rng, n, self.target)
+        return [self.cells[i] for i in picks]
+
+    def record(self, cell, correct):
+        """Count one answer; False if *cell* is not part of the design."""
+        return self.table.add(cell, 1, int(bool(correct)))
+
+    def progress(self):
+        """(cells at the target half-width, cells, trials counted)."""
+        trials, correct = self.table.snapshot()
+        done = int((half_width(trials, correct) <= self.target).sum())
+        return done, len(self.cells), int(trials.sum())
+
+
+# --- One scheduler per experiment per process ---
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def _seed_counts(experiment, table):
+    """Load the SQLite store's counts into *table*, if the store is in use."""
+    from response_log import BACKENDS
+    if "sqlite" not in BACKENDS:
+        return
+    from response_db import get_response_db
+    db = get_response_db()
+    by = ("n_categories", "shape_combination") if experiment == 1 else ("palette", "n_categories")
+    # Exp 1 cells are not in the running counts, so they are grouped over the trials once
+    for *cell, trials, accuracy in db.accuracy(experiment, by, from_counts=experiment != 1):
+        table.add(tuple(cell), trials, round(accuracy * trials))
+
+
+def get_scheduler(experiment, cells):
+    """Return the process-wide Scheduler of *experiment* (1 or 2) over *cells*.
+
+    A new one (seeded from the store again) replaces it when the design
+    cells change, e.g. after shapes were added.
+    """
+    cells = tuple(cells)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(experiment)
+        if scheduler is None or scheduler.cells != cells:
+            scheduler = _schedulers[experiment] = Scheduler(cells)
+            _seed_counts(experiment, scheduler.table)
+    return scheduler
+
+
+def exp2_conditions(palette_sizes, max_categories=10):
+    """Exp 2 design cells: (palette, n_categories) for {palette: number of shapes}."""
+    return [(p, n) for p, size in palette_sizes.items() for n in range(2, min(max_categories, size) + 1)]
+
+
+# --- Simulator ---
+def true_accuracies(n_cells, rng):
+    """Plausible per-cell accuracies: mostly 0.4-0.95, a few near ceiling."""
+    return 1 / (1 + np.exp(-rng.normal(1.2, 1.0, n_cells)))
+
+
+def simulate(accuracy, strategy, rng, target=TARGET_HALF_WIDTH, batch=1, max_trials=1_000_000):
+    """Trials until every cell's half-width is at most *target*, allocating with *strategy*.
+
+    "adaptive" uses pick() in batches of *batch* (a session's plan); "uniform"
+    draws cells at random, as Exp 1's plans do.
+    """
+    n_cells = len(accuracy)
+    trials = np.zeros(n_cells)
+    correct = np.zeros(n_cells)
+    total = 0
+    while total < max_trials:
+        if (half_width(trials, correct) <= target).all():
+            return total
+        if strategy == "adaptive":
+            cells = pick(trials, correct, rng, batch, target)
+        else:
+            cells = rng.integers(n_cells, size=batch)
+        outcomes = rng.random(len(cells)) < accuracy[cells]
+        np.add.at(trials, cells, 1)
+        np.add.at(correct, cells, outcomes)
+        total += len(cells)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate adaptive vs uniform trial allocation.")
+    parser.add_argument("--cells", type=int, default=55, help="design cells (Exp 1: 55, Exp 2: 41)")
+    parser.add_argument("--target", type=float, default=TARGET_HALF_WIDTH, help="95%% half-width per cell")
+    parser.add_argument("--batch", type=int, default=53, help="trials assigned at once (one session's plan)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    totals = {"uniform": [], "adaptive": []}
+    for _ in range(args.runs):
+        accuracy = true_accuracies(args.cells, rng)
+        for strategy, batch in (("uniform", 1), ("adaptive", args.batch)):
+            totals[strategy].append(simulate(accuracy, strategy, rng, args.target, batch))
+    uniform, adaptive = (np.array(totals[s], float) for s in ("uniform", "adaptive"))
+    print(f"{args.cells} cells, 95% half-width <= {args.target}, {args.runs} runs")
+    for name, values in (("uniform", uniform), ("adaptive", adaptive)):
+        print(f"  {name:<9} {np.median(values):>9,.0f} trials (median), "
+              f"{np.median(values) / 53:>6.0f} Exp 1 sessions")
+    print(f"  adaptive needs {100 * (1 - np.median(adaptive / uniform)):.0f}% fewer trials")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# --- Compact per-session state ---
+# What a session keeps between reruns: its trial plan (seed plus small shape
+# ids, see trial_plan.py), a fixed-size structured array of its responses,
+# and a few scalars. Rendered images of finished trials are dropped from the
+# stimulus cache as soon as the trial is in the response log.
+import sys
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+
+# choice: answered category (Exp 1/2) or plot 0 = A, 1 = B (Exp 4)
+RESPONSE_DTYPE = np.dtype([
+    ("trial", np.int16),
+    ("choice", np.int8),
+    ("correct", np.bool_),
+    ("response_time", np.float32),   # seconds, NaN if not measured
+    ("seq", np.int64),               # response log sequence number, -1 if not logged
+])
+
+
+class ResponseRecords:
+    """A session's responses in one preallocated structured array."""
+
+    def __init__(self, capacity):
+        self.records = np.zeros(capacity, RESPONSE_DTYPE)
+        self.records["seq"] = -1
+        self.n = 0
+
+    def add(self, trial, choice, correct, response_time=float("nan"), seq=-1):
+        if self.n == len(self.records):
+            # More answers than planned (e.g. repeated training trials): grow once
+            self.records = np.concatenate([self.records, np.zeros(len(self.records), RESPONSE_DTYPE)])
+        self.records[self.n] = (trial, choice, correct, response_time, seq)
+        self.n += 1
+
+    def __len__(self):
+        return self.n
+
+    def view(self):
+        return self.records[:self.n]
+
+    def n_correct(self):
+        return int(self.view()["correct"].sum())
+
+
+# --- Sizing ---
+def deep_sizeof(obj, _seen=None):
+    """Approximate bytes held by *obj*: NumPy buffers, containers, dataclasses."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        size = sys.getsizeof(obj)  # includes the buffer if the array owns it
+        if obj.base is not None:
+            size += deep_sizeof(obj.base, seen)
+        if obj.dtype == object:
+            size += sum(deep_sizeof(v, seen) for v in obj.ravel())
+        return size
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    elif is_dataclass(obj):
+        size += sum(deep_sizeof(getattr(obj, f.name), seen) for f in fields(obj))
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def session_bytes(state, shared=()):
+    """Bytes held by one session's state, not counting objects in *shared*.
+
+    *shared* lists objects every session points at (e.g. the process-wide
+    shape pool tuple), which cost nothing extra per session.
+    """
+    seen = {id(obj) for obj in shared}
+    return sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in dict(state).items())
@@ -0,0 +1,156 @@
+# --- Shape registry: every shape PNG scanned once, looked up by integer id ---
+# The palette folders are listed when the registry is created, and every
+# shape gets an id with its palette, fill type and name precomputed as
+# arrays. Apps read the current ShapeIndex (an attribute lookup) and never
+# touch the filesystem on a rerun. A background thread re-stats the folders
+# and files every REFRESH_INTERVAL seconds and swaps in a new index only
+# when an mtime changed.
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from trial_plan import SHAPE_TYPES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REFRESH_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class ShapeIndex:
+    palettes: tuple          # palette names, in registry order
+    paths: tuple             # id -> absolute PNG path
+    files: tuple             # id -> file name
+    names: tuple             # id -> shape name (file stem)
+    palette: np.ndarray      # id -> index into palettes, int8
+    fill_type: np.ndarray    # id -> index into SHAPE_TYPES, -1 if not in the type map, int8
+    name_id: np.ndarray      # id -> index into unique_names, int16
+    unique_names: tuple
+    by_palette: dict         # palette -> ids sorted by file name
+    by_type: dict            # fill type -> ids
+    by_name: dict            # name -> ids, one per palette the shape appears in
+
+    def __len__(self):
+        return len(self.paths)
+
+    def ids(self, palette=None, fill_type=None, name=None):
+        """Ids matching every given filter, in id order."""
+        mask = np.ones(len(self), bool)
+        if palette is not None:
+            mask &= self.palette == (self.palettes.index(palette) if palette in self.palettes else -2)
+        if fill_type is not None:
+            mask &= self.fill_type == SHAPE_TYPES.index(fill_type)
+        if name is not None:
+            mask &= self.name_id == (self.unique_names.index(name) if name in self.unique_names else -2)
+        return np.flatnonzero(mask)
+
+    def first_per_name(self, palettes, mapped_only=True):
+        """One id per shape name; the first palette in *palettes* that has it wins."""
+        order = [self.by_palette.get(p, ()) for p in palettes]
+        chosen = {}
+        for ids in order:
+            for i in ids:
+                if mapped_only and self.fill_type[i] < 0:
+                    continue
+                chosen.setdefault(self.name_id[i], int(i))
+        return np.array(list(chosen.values()), np.int16)
+
+    def select(self, ids, field="paths"):
+        column = getattr(self, field)
+        return [column[i] for i in ids]
+
+
+def _scan(folders):
+    """{folder: (mtime_ns, {file: mtime_ns})} for every PNG in the palette folders."""
+    signature = {}
+    for palette, folder in folders.items():
+        path = os.path.join(BASE_DIR, folder)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            files = {f: os.stat(os.path.join(path, f)).st_mtime_ns
+                     for f in os.listdir(path) if f.lower().endswith(".png")}
+        except FileNotFoundError:
+            mtime, files = None, {}
+        signature[palette] = (mtime, files)
+    return signature
+
+
+def _build(folders, type_map, signature):
+    palettes = tuple(folders)
+    paths, files, names, palette_codes = [], [], [], []
+    for code, palette in enumerate(palettes):
+        for fname in sorted(signature[palette][1]):
+            paths.append(os.path.join(BASE_DIR, folders[palette], fname))
+            files.append(fname)
+            names.append(os.path.splitext(fname)[0])
+            palette_codes.append(code)
+    unique_names = tuple(sorted(set(names)))
+    name_codes = {n: i for i, n in enumerate(unique_names)}
+    palette = np.array(palette_codes, np.int8)
+    fill_type = np.array([SHAPE_TYPES.index(type_map[n]) if n in type_map else -1 for n in names], np.int8)
+    name_id = np.array([name_codes[n] for n in names], np.int16)
+    for arr in (palette, fill_type, name_id):
+        arr.setflags(write=False)
+
+    def group(keys, labels):
+        out = {}
+        for label_code, label in enumerate(labels):
+            ids = np.flatnonzero(keys == label_code).astype(np.int16)
+            ids.setflags(write=False)
+            out[label] = ids
+        return out
+
+    return ShapeIndex(
+        palettes=palettes, paths=tuple(paths), files=tuple(files), names=tuple(names),
+        palette=palette, fill_type=fill_type, name_id=name_id, unique_names=unique_names,
+        by_palette=group(palette, palettes), by_type=group(fill_type, SHAPE_TYPES),
+        by_name=group(name_id, unique_names),
+    )
+
+
+class ShapeRegistry:
+    """Holds the current ShapeIndex for a set of palette folders and keeps it fresh."""
+
+    def __init__(self, folders, type_map, refresh_interval=REFRESH_INTERVAL):
+        self.folders = dict(folders)
+        self.type_map = type_map
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._signature = _scan(self.folders)
+        self.index = _build(self.folders, type_map, self._signature)
+        self.refreshes = 0
+        if refresh_interval:
+            threading.Thread(target=self._watch, args=(refresh_interval,),
+                             name="shape-registry", daemon=True).start()
+
+    def on_change(self, callback):
+        """Call ``callback(paths)`` with the absolute paths added, removed or modified."""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Re-stat the folders; rebuild the index if anything changed. Returns True if it did."""
+        signature = _scan(self.folders)
+        with self._lock:
+            if signature == self._signature:
+                return False
+            changed = []
+            for palette, (_, files) in signature.items():
+                old = self._signature.get(palette, (None, {}))[1]
+                folder = os.path.join(BASE_DIR, self.folders[palette])
+                changed += [os.path.join(folder, f) for f in set(files) | set(old) if files.get(f) != old.get(f)]
+            self._signature = signature
+            self.index = _build(self.folders, self.type_map, signature)
+            self.refreshes += 1
+        for callback in self._listeners:
+            callback(changed)
+        return True
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except OSError:
+                pass  # a folder mid-rename; the next pass sees the final state
@@ -0,0 +1,126 @@
+# --- Shared Google Sheets client ---
+# One authorized gspread client per process, created on first use (the
+# response log worker), with worksheet handles cached by name. All Streamlit
+# sessions share the client and its HTTP connection pool, and the OAuth
+# token is refreshed by a background thread before it expires.
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import metrics
+
+SPREADSHEET_KEY = "1aZ0LjvdZs1WHGphqb_nYrvPma8xEG9mxfM-O1_fsi3g"
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+WORKSHEETS = ("Eksperimen_1", "Eksperimen_2", "Eksperimen_3", "Eksperimen_4")
+
+POOL_SIZE = 16
+REFRESH_MARGIN = timedelta(minutes=5)
+
+_lock = threading.RLock()
+_client = None
+_creds = None
+_spreadsheet = None
+_worksheets = {}
+_client_factory = None
+_stats = {"auth_calls": 0, "metadata_calls": 0, "token_refreshes": 0, "refresh_errors": 0}
+
+
+def set_client_factory(factory):
+    """Use ``factory()`` instead of service-account auth to build the client.
+
+    Meant for offline runs (benchmarks, load tests) with a local stand-in for
+    gspread; pass None to go back to the real thing.
+    """
+    global _client_factory
+    with _lock:
+        _client_factory = factory
+        reset()
+
+
+def _authorize():
+    """Build the gspread client from st.secrets; returns (client, creds)."""
+    import gspread
+    import streamlit as st
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(st.secrets["google_sheets"], scopes=SCOPES)
+    client = gspread.authorize(creds)
+    session = getattr(getattr(client, "http_client", None), "session", None)
+    if session is not None:
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        session.mount("https://", adapter)
+    return client, creds
+
+
+def _refresh_loop(creds):
+    from google.auth.transport.requests import Request
+
+    while True:
+        with _lock:
+            if creds is not _creds:
+                return  # client was reset, a new thread owns the new creds
+        expiry = creds.expiry
+        if expiry is not None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        if creds.token is None or expiry is None or expiry - now <= REFRESH_MARGIN:
+            try:
+                creds.refresh(Request())
+                _stats["token_refreshes"] += 1
+                continue
+            except Exception:
+                _stats["refresh_errors"] += 1
+                time.sleep(30)
+                continue
+        time.sleep(max(1.0, (expiry - now - REFRESH_MARGIN).total_seconds()))
+
+
+def get_client():
+    """Return the process-wide gspread client, authorizing on first call."""
+    global _client, _creds
+    with _lock:
+        if _client is None:
+            if _client_factory is not None:
+                _client, _creds = _client_factory(), None
+            else:
+                _client, _creds = _authorize()
+            _stats["auth_calls"] += 1
+            metrics.count("sheets_calls")
+            if _creds is not None:
+                threading.Thread(target=_refresh_loop, args=(_creds,),
+                                 name="sheets-token-refresh", daemon=True).start()
+        return _client
+
+
+def get_worksheet(name):
+    """Return the cached handle for worksheet *name* of the experiment spreadsheet."""
+    global _spreadsheet
+    with _lock:
+        ws = _worksheets.get(name)
+        if ws is not None:
+            return ws
+        client = get_client()
+        if _spreadsheet is None:
+            _spreadsheet = client.open_by_key(SPREADSHEET_KEY)
+            _stats["metadata_calls"] += 1
+            metrics.count("sheets_calls")
+        ws = _worksheets[name] = _spreadsheet.worksheet(name)
+        _stats["metadata_calls"] += 1
+        metrics.count("sheets_calls")
+        return ws
+
+
+def reset():
+    """Drop the client and cached handles, e.g. after an auth error."""
+    global _client, _creds, _spreadsheet
+    with _lock:
+        _client = _creds = _spreadsheet = None
+        _worksheets.clear()
+
+
+def stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["cached_worksheets"] = sorted(_worksheets)
+    return stats
@@ -0,0 +1,169 @@
+# --- Sprite atlas: every unique shape packed into one image ---
+# Build step (also run on demand when the atlas is missing or stale):
+#
+#   python sprite_atlas.py            # writes atlas/atlas.json, atlas-<hash>.npy, atlas-<hash>.png
+#
+# Shapes are deduplicated by the hash of their decoded pixels, so e.g.
+# circle-filled.png copied into several palettes occupies one slot. Each
+# unique shape is resized once per size in ATLAS_SIZES and packed on a grid,
+# one block of rows per size. atlas.json maps every source PNG (relative to
+# the repo) to its hash, and every hash to its pixel rect and UV rect at each
+# size. At run time the .npy is memory-mapped, so sprites are views into one
+# file read instead of one PNG decode each; the .png is the same pixels for
+# the browser (client_render.py).
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from sprites import decode
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ATLAS_DIR = os.path.join(BASE_DIR, "atlas")
+ATLAS_SIZES = (12, 20)   # EXP4_SPRITE_SIZE, SPRITE_SIZE
+INDEX_FILE = "atlas.json"
+VERSION = 1
+# Final files of a build; temporaries (atlas-<hash>.npy.<pid>.tmp) may belong to a build still running
+BUILD_FILE = re.compile(r"atlas-[0-9a-f]{12}\.(npy|png)")
+
+
+@dataclass(frozen=True)
+class SpriteAtlas:
+    pixels: np.ndarray       # (H, W, 4) uint8, memory-mapped read-only
+    png: str                 # file name of the same pixels as PNG, next to the index
+    directory: str
+    sizes: tuple
+    rects: dict              # (abs path, size) -> (x, y, w, h) in pixels
+
+    def sprite(self, path, size):
+        """Read-only (size, size, 4) view of a shape, or None if it is not in the atlas."""
+        rect = self.rects.get((os.path.abspath(path), int(size)))
+        if rect is None:
+            return None
+        x, y, w, h = rect
+        return self.pixels[y:y + h, x:x + w]
+
+    def uv(self, path, size):
+        x, y, w, h = self.rects[(os.path.abspath(path), int(size))]
+        height, width = self.pixels.shape[:2]
+        return (x / width, y / height, (x + w) / width, (y + h) / height)
+
+
+def _relpath(path):
+    return os.path.relpath(os.path.abspath(path), BASE_DIR).replace(os.sep, "/")
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _content_hash(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        img = img.convert("RGBA")
+        return hashlib.sha1(f"{img.size}".encode() + img.tobytes()).hexdigest()[:16]
+
+
+def _write(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# --- Build ---
+def build(paths, sizes=ATLAS_SIZES, out_dir=ATLAS_DIR):
+    """Pack the PNGs in *paths* into an atlas under *out_dir* and return it loaded."""
+    sources, unique = {}, {}
+    for path in sorted(set(os.path.abspath(p) for p in paths)):
+        digest = _content_hash(path)
+        unique.setdefault(digest, path)
+        sources[_relpath(path)] = {"hash": digest, "stamp": _source_stamp(path)}
+
+    cols = max(1, math.ceil(math.sqrt(len(unique))))
+    rows = max(1, math.ceil(len(unique) / cols))
+    width = cols * max(sizes)
+    height = rows * sum(sizes)
+    pixels = np.zeros((height, width, 4), np.uint8)
+    sprites, top = {digest: {} for digest in unique}, 0
+    for size in sizes:
+        for k, (digest, path) in enumerate(unique.items()):
+            x, y = (k % cols) * size, top + (k // cols) * size
+            pixels[y:y + size, x:x + size] = decode(path, size)
+            sprites[digest][str(size)] = {
+                "rect": [x, y, size, size],
+                "uv": [x / width, y / height, (x + size) / width, (y + size) / height],
+            }
+        top += rows * size
+
+    os.makedirs(out_dir, exist_ok=True)
+    digest = hashlib.sha1(pixels.tobytes()).hexdigest()[:12]
+    buf = io.BytesIO()
+    np.save(buf, pixels)
+    _write(os.path.join(out_dir, f"atlas-{digest}.npy"), buf.getvalue())
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.fromarray(pixels, "RGBA").save(buf, format="PNG", optimize=True)
+    _write(os.path.join(out_dir, f"atlas-{digest}.png"), buf.getvalue())
+    index = {"version": VERSION, "width": width, "height": height, "sizes": list(sizes),
+             "npy": f"atlas-{digest}.npy", "png": f"atlas-{digest}.png",
+             "sources": sources, "sprites": sprites}
+    # The index goes last, so readers never see it point at missing arrays
+    _write(os.path.join(out_dir, INDEX_FILE), json.dumps(index, indent=1).encode())
+    for name in os.listdir(out_dir):
+        if BUILD_FILE.fullmatch(name) and name not in (index["npy"], index["png"]):
+            os.remove(os.path.join(out_dir, name))  # earlier builds; open memmaps keep their pages
+    return load(paths, sizes, out_dir)
+
+
+# --- Load ---
+def load(paths, sizes=ATLAS_SIZES, out_dir=ATLAS_DIR):
+    """The atlas under *out_dir* if it covers *paths* at *sizes* unchanged, else None."""
+    try:
+        with open(os.path.join(out_dir, INDEX_FILE), encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != VERSION or not set(sizes) <= set(index["sizes"]):
+            return None
+        rects = {}
+        for path in paths:
+            source = index["sources"].get(_relpath(path))
+            if source is None or source["stamp"] != _source_stamp(path):
+                return None
+            for size in sizes:
+                rects[(os.path.abspath(path), size)] = tuple(index["sprites"][source["hash"]][str(size)]["rect"])
+        pixels = np.load(os.path.join(out_dir, index["npy"]), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+    return SpriteAtlas(pixels=pixels, png=index["png"], directory=out_dir, sizes=tuple(sizes), rects=rects)
+
+
+def load_or_build(paths, sizes=ATLAS_SIZES, out_dir=ATLAS_DIR):
+    """Load the atlas, rebuilding it first if a source PNG was added or changed."""
+    atlas = load(paths, sizes, out_dir)
+    if atlas is None:
+        atlas = build(paths, sizes, out_dir)
+    return atlas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack every Shapes-* PNG into one sprite atlas.")
+    parser.add_argument("--out", default=ATLAS_DIR)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(ATLAS_SIZES))
+    args = parser.parse_args()
+    from stimuli import SHAPES
+    paths = SHAPES.index.paths
+    atlas = build(paths, tuple(args.sizes), args.out)
+    unique = len({rect for (_, size), rect in atlas.rects.items() if size == args.sizes[0]})
+    print(f"{len(paths)} PNGs -> {unique} unique shapes at {args.sizes} px: "
+          f"{atlas.pixels.shape[1]}x{atlas.pixels.shape[0]} atlas in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
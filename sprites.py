@@ -0,0 +1,95 @@
+# --- Process-wide cache of decoded shape sprites ---
+# Streamlit re-runs the app script on every interaction but keeps imported
+# modules alive, so this cache is shared by every session of the process.
+# Lookups never touch the filesystem after the first decode; the shape
+# registry's watcher calls invalidate() for PNGs that changed on disk. When a
+# sprite atlas is attached (use_atlas, see sprite_atlas.py), sprites are
+# views into its memory-mapped pixels and only shapes missing from it are
+# decoded.
+import os
+import threading
+
+import numpy as np
+
+import metrics
+
+_lock = threading.Lock()
+_cache = {}          # (abs path, size) -> uint8 RGBA array
+_atlas = None        # SpriteAtlas or None
+_stats = {"hits": 0, "misses": 0, "reloads": 0, "from_atlas": 0}
+
+
+def use_atlas(atlas):
+    """Serve sprites from *atlas* (None detaches it); cached entries are dropped."""
+    global _atlas
+    with _lock:
+        _atlas = atlas
+        _cache.clear()
+
+
+def get_atlas():
+    return _atlas
+
+
+def decode(path, size):
+    """Decode a PNG exactly like the apps did: RGBA, resized to size×size."""
+    from PIL import Image
+    with metrics.phase("sprite_decode"), Image.open(path) as img:
+        arr = np.asarray(img.convert("RGBA").resize((size, size)), dtype=np.uint8)
+    metrics.count("sprites_decoded")
+    arr.setflags(write=False)  # shared between sessions, must stay read-only
+    return arr
+
+
+def get_sprite(path, size):
+    """Return the ready-to-blit (size, size, 4) uint8 array for a shape PNG.
+
+    Entries are keyed by (path, size) and stay until invalidate() drops them.
+    """
+    key = (os.path.abspath(path), int(size))
+    with _lock:
+        arr = _cache.get(key)
+        if arr is not None:
+            _stats["hits"] += 1
+            return arr
+    atlas, source = _atlas, "from_atlas"
+    arr = atlas.sprite(key[0], key[1]) if atlas is not None else None
+    if arr is None:
+        arr, source = decode(key[0], key[1]), "misses"
+    with _lock:
+        _stats[source] += 1
+        _cache[key] = arr
+    return arr
+
+
+def warm(paths, sizes):
+    """Decode every PNG in *paths* at each of *sizes*; cached ones are skipped."""
+    for path in paths:
+        for size in sizes:
+            get_sprite(path, size)
+
+
+def invalidate(paths):
+    """Forget *paths* at every size, so changed PNGs are decoded again on next use."""
+    paths = {os.path.abspath(p) for p in paths}
+    with _lock:
+        stale = [key for key in _cache if key[0] in paths]
+        for key in stale:
+            del _cache[key]
+        _stats["reloads"] += len(stale)
+
+
+def cache_stats():
+    """Hit/miss counters plus the number of cached sprites and their bytes."""
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+        stats["bytes"] = sum(arr.nbytes for arr in _cache.values())
+    return stats
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,248 @@
+# --- Stimulus definitions shared by the apps and the offline generator ---
+import io
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+
+import sprite_atlas
+import sprites
+from shape_registry import BASE_DIR, ShapeRegistry
+from sprites import get_sprite
+
+# --- Shape Mapping ---
+SHAPE_TYPE_MAP = {
+    "circle": "filled", "circle-unfilled": "unfilled", "circle-filled": "filled", "dot": "filled",
+    "square": "filled", "square-unfilled": "unfilled", "square-x-open": "open", "square-filled": "filled",
+    "triangle-filled": "filled", "triangle-unfilled": "unfilled", "triangle-downward-unfilled": "unfilled",
+    "triangle-left-unfilled": "unfilled", "triangle-right-unfilled": "unfilled",
+    "star-filled": "filled", "star-unfilled": "unfilled", "sixlinestar-open": "open", "eightline-star-open": "open",
+    "plus-filled": "filled", "plus-unfilled": "unfilled", "plus-open": "open",
+    "cross-open": "open", "diamond": "filled", "diamond-filled": "filled", "diamond-unfilled": "unfilled",
+    "diamond-plus-open": "open", "y": "filled", "y-filled": "filled", "minus-open": "open",
+    "arrow-vertical-open": "open", "arrow-horizontal-open": "open",
+}
+
+LABEL_MAP = {k: k for k in SHAPE_TYPE_MAP}
+
+# --- Palette folders ---
+EXP1_PALETTES = ["D3", "Excel", "Tableau", "Matlab", "R"]    # Exp 1, first palette wins per shape
+ROOT_FOLDERS = [f"Shapes-{p}" for p in EXP1_PALETTES]
+PALETTES = ["D3", "Tableau", "Excel", "Matlab", "R"]         # Exp 2
+ALL_SHAPES = "All"                                           # Exp 3 / Exp 4
+SHAPES_FOLDER = "Shapes-All"
+
+SPRITE_SIZE = 20        # Exp 1 / Exp 2
+EXP4_SPRITE_SIZE = 12
+
+
+def palette_folder(palette):
+    return f"Shapes-{palette}"
+
+
+def palette_dir(palette):
+    """Absolute folder of a palette, matching the registry's paths."""
+    return os.path.join(BASE_DIR, palette_folder(palette))
+
+
+# --- Shape registry (folders scanned once per process) ---
+SHAPES = ShapeRegistry({p: palette_folder(p) for p in PALETTES + [ALL_SHAPES]}, SHAPE_TYPE_MAP)
+
+
+def _attach_atlas():
+    """Serve sprites from the prebuilt atlas, rebuilding it if a shape changed."""
+    try:
+        sprites.use_atlas(sprite_atlas.load_or_build(SHAPES.index.paths))
+    except OSError as e:  # e.g. a read-only checkout: decode the PNGs one by one instead
+        logging.getLogger(__name__).warning("sprite atlas unavailable, decoding PNGs: %s", e)
+        sprites.use_atlas(None)
+
+
+def _shapes_changed(paths):
+    _attach_atlas()
+    sprites.invalidate(paths)
+    thumbnail_grid.cache_clear()
+
+
+_attach_atlas()
+SHAPES.on_change(_shapes_changed)
+
+
+def collect_unique_shapes():
+    """Paths of the Exp 1 pool: one PNG per mapped shape name across the palettes."""
+    index = SHAPES.index
+    return index.select(index.first_per_name(EXP1_PALETTES))
+
+
+def palette_files(palette):
+    """Sorted PNG file names of a palette folder, from the registry."""
+    index = SHAPES.index
+    return index.select(index.by_palette.get(palette, ()), "files")
+
+
+def palette_paths(palette):
+    """Absolute PNG paths of a palette folder, from the registry."""
+    index = SHAPES.index
+    return index.select(index.by_palette.get(palette, ()))
+
+
+# --- Plot specs ---
+# A spec describes one scatterplot independently of how it is drawn:
+# figure_from_spec() renders it with matplotlib on the server and
+# client_render.py ships it to the browser. Each group is
+# (sprite path, sprite size in points, xs, ys).
+DEFAULT_FIGSIZE = (6.4, 4.8)
+
+
+def scatter_spec(groups, xlim, ylim, size=DEFAULT_FIGSIZE, xlabel=None, ylabel=None,
+                 ticks=True, guides=None, legend=None):
+    return {"size": size, "xlim": xlim, "ylim": ylim, "xlabel": xlabel, "ylabel": ylabel,
+            "ticks": ticks, "guides": guides, "legend": legend, "groups": groups}
+
+
+def figure_from_spec(spec):
+    from matplotlib.figure import Figure
+    from rendering import add_sprite_markers
+
+    fig = Figure(figsize=spec["size"])
+    ax = fig.subplots()
+    for label in spec["legend"] or ():
+        ax.scatter([], [], label=label)
+    add_sprite_markers(ax, [(get_sprite(path, size), xs, ys) for path, size, xs, ys in spec["groups"]])
+
+    ax.set_xlim(*spec["xlim"])
+    ax.set_ylim(*spec["ylim"])
+    if spec["guides"] is not None:
+        ax.axhline(spec["guides"], color='gray', linestyle='--', linewidth=0.5)
+        ax.axvline(spec["guides"], color='gray', linestyle='--', linewidth=0.5)
+    if not spec["ticks"]:
+        ax.set_xticks([])
+        ax.set_yticks([])
+    if spec["xlabel"]:
+        ax.set_xlabel(spec["xlabel"])
+    if spec["ylabel"]:
+        ax.set_ylabel(spec["ylabel"])
+    if spec["legend"]:
+        ax.legend()
+    return fig
+
+
+# --- Experiment 1 ---
+def exp1_spec(trial):
+    groups = [(path, SPRITE_SIZE, trial["x_data"][i], trial["y_data"][i])
+              for i, path in enumerate(trial["chosen_shapes"])]
+    legend = [f"Category {i+1} ({LABEL_MAP[label]})" for i, label in enumerate(trial["shape_labels"])]
+    return scatter_spec(groups, (-0.1, 1.6), (-0.1, 1.6), xlabel="X", ylabel="Y", legend=legend)
+
+
+def exp1_figure(trial):
+    """Scatterplot for one Exp 1 trial (a dict from Exp1Plan.trial)."""
+    return figure_from_spec(exp1_spec(trial))
+
+
+# --- Experiment 3 ---
+THUMB_SIZE = 80          # CSS pixels per thumbnail
+THUMB_SCALE = 2          # rendered at 2x so thumbnails stay sharp on HiDPI screens
+THUMB_COLUMNS = 5
+THUMB_CELL = (150, 112)  # cell width, height incl. a two-line caption, CSS pixels
+
+
+def _caption_lines(draw, font, text, width):
+    """*text* on one line, or split at the hyphen nearest its middle if too wide."""
+    if draw.textlength(text, font=font) <= width or "-" not in text:
+        return [text]
+    cuts = [i for i, c in enumerate(text) if c == "-"]
+    cut = min(cuts, key=lambda i: abs(i - len(text) / 2))
+    return [text[:cut + 1], text[cut + 1:]]
+
+
+@lru_cache(maxsize=8)
+def thumbnail_grid(palette, columns=THUMB_COLUMNS):
+    """(PNG bytes, CSS width) of every shape in *palette* as one captioned grid.
+
+    Built once per process from pre-resized sprites; the registry watcher
+    clears it when a shape changes.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    paths, files = palette_paths(palette), palette_files(palette)
+    s = THUMB_SCALE
+    cell_w, cell_h = THUMB_CELL[0] * s, THUMB_CELL[1] * s
+    rows = max(1, -(-len(paths) // columns))
+    grid = Image.new("RGBA", (columns * cell_w, rows * cell_h), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(grid)
+    font = ImageFont.load_default(size=12 * s)
+    for i, (path, fname) in enumerate(zip(paths, files)):
+        x, y = (i % columns) * cell_w, (i // columns) * cell_h
+        thumb = Image.fromarray(np.asarray(get_sprite(path, THUMB_SIZE * s)), "RGBA")
+        grid.alpha_composite(thumb, (x + (cell_w - thumb.width) // 2, y))
+        for j, line in enumerate(_caption_lines(draw, font, fname.replace(".png", ""), cell_w)):
+            draw.text((x + cell_w / 2, y + THUMB_SIZE * s + (4 + 14 * j) * s), line,
+                      fill=(49, 51, 63, 255), font=font, anchor="ma")
+    buf = io.BytesIO()
+    # Black shapes and gray text: a 64-color palette keeps the PNG about a third the size
+    grid.quantize(colors=64, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG", optimize=True)
+    return buf.getvalue(), columns * THUMB_CELL[0]
+
+
+# --- Experiment 2 ---
+def make_exp2_trial(shape_files, n_categories, rng):
+    """Pick shapes and draw data for one Exp 2 trial.
+
+    *rng* is a ``numpy.random.Generator``; the app seeds it from the
+    session's trial seed, so a trial can be redrawn from the logged seed.
+    """
+    selected_shapes = rng.choice(shape_files, size=n_categories, replace=False)
+    x_data = [rng.uniform(0, 1.5, 20) for _ in range(n_categories)]
+    y_data = [rng.normal(loc=rng.uniform(0.3, 1.2), scale=0.1, size=20) for _ in range(n_categories)]
+    return {"selected_shapes": selected_shapes, "x_data": x_data, "y_data": y_data}
+
+
+def exp2_target(y_data):
+    return int(np.argmax([np.mean(y) for y in y_data]))
+
+
+def exp2_spec(palette_path, selected_shapes, x_data, y_data):
+    groups = [(os.path.join(palette_path, shape), SPRITE_SIZE, x_data[i], y_data[i])
+              for i, shape in enumerate(selected_shapes)]
+    legend = [f"Category {i+1} ({shape.replace('.png', '')})" for i, shape in enumerate(selected_shapes)]
+    return scatter_spec(groups, (-0.1, 1.6), (-0.1, 1.6), xlabel="X", ylabel="Y", legend=legend)
+
+
+def exp2_figure(palette_path, selected_shapes, x_data, y_data):
+    return figure_from_spec(exp2_spec(palette_path, selected_shapes, x_data, y_data))
+
+
+# --- Experiment 4 ---
+EXP4_PLOTS = ("A", "B")
+EXP4_POINTS = 20
+HIGH_CORR_COV = [[0.02, 0.015], [0.015, 0.02]]
+NO_CORR_COV = [[0.02, 0], [0, 0.02]]
+
+
+@lru_cache(maxsize=1024)
+def scatter_data(seed, plot, n_shapes, is_high_corr):
+    """(n_shapes, EXP4_POINTS, 2) points of one Exp 4 plot, read-only and memoized.
+
+    Plot A and Plot B draw from independent child streams of the trial seed,
+    so the same (seed, plot) always gives the same data on any thread.
+    """
+    stream = np.random.SeedSequence(seed).spawn(len(EXP4_PLOTS))[EXP4_PLOTS.index(plot)]
+    rng = np.random.default_rng(stream)
+    means = rng.uniform(0.3, 1.2, (n_shapes, 2))
+    cov = HIGH_CORR_COV if is_high_corr else NO_CORR_COV
+    data = rng.multivariate_normal([0.0, 0.0], cov, size=(n_shapes, EXP4_POINTS)) + means[:, None, :]
+    data.setflags(write=False)
+    return data
+
+
+def exp4_spec(is_high_corr, shape_paths, seed, plot):
+    data = scatter_data(seed, plot, len(shape_paths), bool(is_high_corr))
+    groups = [(path, EXP4_SPRITE_SIZE, points[:, 0], points[:, 1]) for path, points in zip(shape_paths, data)]
+    return scatter_spec(groups, (0, 1.6), (0, 1.6), size=(4, 4), ticks=False, guides=0.8)
+
+
+def generate_scatterplot(is_high_corr, shape_paths, seed, plot):
+    """Scatterplot for Plot A or B of a trial, reproducible from the trial seed"""
+    return figure_from_spec(exp4_spec(is_high_corr, shape_paths, seed, plot))
@@ -0,0 +1,133 @@
+# --- Rendered stimulus cache with background prefetch ---
+# Each trial's figure is rendered once to PNG bytes and kept in a process-wide
+# LRU keyed by the trial's seed and parameters; widget reruns serve the bytes
+# with st.image instead of rebuilding and re-serializing the figure. While a
+# participant answers trial k, trial k+1 is rendered on a small thread pool.
+#
+# Builders must use matplotlib.figure.Figure directly (not pyplot), since
+# pyplot's global figure manager is not safe to use from worker threads.
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+MAX_ENTRIES = 256
+PREFETCH_WORKERS = 2
+# Same savefig options st.pyplot uses, so cached images look identical
+DPI = 200
+
+_lock = threading.Lock()
+_cache = OrderedDict()   # key -> PNG bytes, least recently used first
+_inflight = {}           # key -> Future of a running prefetch
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="stimulus-prefetch")
+_warm = None             # Future of warm_renderer()
+_stats = {"hits": 0, "misses": 0, "prefetched": 0, "waited": 0, "prefetch_errors": 0}
+
+
+def figure_to_png(fig, dpi=DPI):
+    buf = io.BytesIO()
+    with metrics.phase("png_encode"):
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    metrics.count("figures_rendered")
+    return buf.getvalue()
+
+
+def _render(build):
+    with metrics.phase("stimulus_build"):
+        fig = build()
+    return figure_to_png(fig)
+
+
+def _store(key, png):
+    with _lock:
+        _cache[key] = png
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def get_png(key, build):
+    """Return PNG bytes for *key*, calling ``build() -> Figure`` only on a miss."""
+    with _lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            metrics.count("stimulus_cache_hits")
+            return png
+        future = _inflight.get(key)
+    if future is not None:
+        try:
+            with metrics.phase("prefetch_wait"):
+                png = future.result()
+            with _lock:
+                _stats["waited"] += 1
+            return png
+        except Exception:
+            pass  # render it here instead, so the error surfaces in the app
+    png = _render(build)
+    with _lock:
+        _stats["misses"] += 1
+    _store(key, png)
+    return png
+
+
+def _prefetch_job(key, build):
+    try:
+        png = _render(build)
+        _store(key, png)
+        with _lock:
+            _stats["prefetched"] += 1
+        return png
+    except Exception:
+        with _lock:
+            _stats["prefetch_errors"] += 1
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def discard(key):
+    """Drop *key* once its trial is answered and logged, freeing room for live trials."""
+    with _lock:
+        _cache.pop(key, None)
+
+
+def prefetch(key, build):
+    """Render *key* in the background unless it is cached or already rendering."""
+    with _lock:
+        if key in _cache or key in _inflight:
+            return
+        _inflight[key] = _executor.submit(_prefetch_job, key, build)
+
+
+def warm_renderer():
+    """Import matplotlib and load its fonts on the prefetch pool, once per process.
+
+    Lets the top of a fresh process's first script run reach the browser
+    while the figure stack loads; the first render then finds it ready.
+    """
+    global _warm
+    with _lock:
+        if _warm is not None:
+            return _warm
+        _warm = _executor.submit(_warm_job)
+    return _warm
+
+
+def _warm_job():
+    from rendering import warm
+    with metrics.phase("renderer_warm"):
+        warm()
+
+
+def stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+        stats["bytes"] = sum(len(png) for png in _cache.values())
+        stats["inflight"] = len(_inflight)
+    return stats
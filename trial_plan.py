@@ -0,0 +1,209 @@
+# --- Per-participant trial plans, generated up front from one seed ---
+# A plan holds every trial of a session as small stacked integer arrays, so a
+# rerun only indexes into it. Unused category slots are padded with -1 ids.
+# Point data is not stored: each trial draws it from its own stream of the
+# plan seed, so it can be regenerated exactly whenever it is needed.
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+SHAPE_TYPES = ("filled", "unfilled", "open")
+MAX_CATEGORIES = 10
+POINTS_PER_CATEGORY = 20
+
+
+@lru_cache(maxsize=4096)
+def shape_label(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def shape_type_index(paths, type_map):
+    """Type code (index into SHAPE_TYPES) for each path, -1 if unmapped."""
+    return np.array([SHAPE_TYPES.index(type_map[shape_label(p)]) if shape_label(p) in type_map else -1
+                     for p in paths], dtype=np.int8)
+
+
+def _sample_rows(rng, valid, k):
+    """Per row, pick k[row] distinct column indices where *valid* is True.
+
+    Random keys with invalid columns pushed to +inf, then argsort: one call
+    samples without replacement for every row at once.
+    """
+    keys = rng.random(valid.shape)
+    keys[~valid] = np.inf
+    order = np.argsort(keys, axis=1)
+    picked = np.where(np.arange(valid.shape[1]) < np.asarray(k)[:, None], order, -1)
+    return picked
+
+
+# --- Experiment 1 ---
+@dataclass(frozen=True)
+class Exp1Plan:
+    seed: int
+    shape_paths: tuple      # the pool the ids index into
+    shape_types: np.ndarray  # (shapes,) int8 code into SHAPE_TYPES
+    shape_ids: np.ndarray    # (trials, MAX_CATEGORIES) int16, -1 padded
+    n_categories: np.ndarray  # (trials,) int8
+    target_idx: np.ndarray   # (trials,) int8
+
+    def __len__(self):
+        return len(self.n_categories)
+
+    def data(self, i):
+        """(x, y) float32 arrays of shape (MAX_CATEGORIES, POINTS_PER_CATEGORY) for trial i."""
+        return _exp1_data(self.seed, i)
+
+    def trial(self, i):
+        n = int(self.n_categories[i])
+        ids = self.shape_ids[i, :n]
+        x, y = self.data(i)
+        return {
+            "x_data": list(x[:n]),
+            "y_data": list(y[:n]),
+            "chosen_shapes": [self.shape_paths[j] for j in ids],
+            "shape_labels": [shape_label(self.shape_paths[j]) for j in ids],
+            "shape_types_used": "+".join(sorted({SHAPE_TYPES[t] for t in self.shape_types[ids]})),
+            "target_idx": int(self.target_idx[i]),
+        }
+
+
+def _exp1_data(seed, i):
+    rng = np.random.default_rng([seed, i])
+    means = rng.uniform(0.3, 1.0, MAX_CATEGORIES)
+    y = rng.normal(means[:, None], 0.05, (MAX_CATEGORIES, POINTS_PER_CATEGORY)).astype(np.float32)
+    x = rng.uniform(0.0, 1.5, (MAX_CATEGORIES, POINTS_PER_CATEGORY)).astype(np.float32)
+    return x, y
+
+
+def _valid_types(types):
+    """Codes of the shape types with at least 3 shapes in the pool."""
+    counts = np.bincount(types[types >= 0], minlength=len(SHAPE_TYPES))
+    return np.flatnonzero(counts >= 3)
+
+
+def exp1_conditions(shape_paths, type_map):
+    """Exp 1 design cells: (n_categories, "+"-joined shape types) a plan can show."""
+    types = shape_type_index(tuple(shape_paths), type_map)
+    valid = [SHAPE_TYPES[t] for t in _valid_types(types)]
+    conditions = []
+    for k in range(1, len(valid) + 1):
+        for combo in combinations(valid, k):
+            n_shapes = int(np.isin(types, [SHAPE_TYPES.index(t) for t in combo]).sum())
+            label = "+".join(sorted(combo))
+            conditions.extend((n, label) for n in range(max(2, k), min(MAX_CATEGORIES, n_shapes) + 1))
+    return sorted(conditions)
+
+
+def make_exp1_plan(shape_paths, type_map, n_trials, seed, conditions=None):
+    """Draw all Exp 1 trials in one pass, same distributions as the original app.
+
+    Each trial uses 1-3 shape types that have at least 3 shapes, 2-10
+    categories from those types, y ~ N(U(0.3, 1.0), 0.05) and x ~ U(0, 1.5)
+    with 20 points per category. Raises ValueError if the pool is too small.
+
+    *conditions*, one (n_categories, shape types) cell of exp1_conditions()
+    per trial (e.g. from scheduler.py), fixes the category count and the
+    types instead; every listed type then gets at least one shape.
+    """
+    rng = np.random.default_rng(seed)
+    shape_paths = tuple(shape_paths)
+    types = shape_type_index(shape_paths, type_map)
+    valid_types = _valid_types(types)
+    if len(valid_types) < 1:
+        raise ValueError("Not enough shape types for experiment.")
+
+    if conditions is None:
+        # Shape types per trial: a random subset of 1..3 valid types
+        n_types = rng.integers(1, min(3, len(valid_types)) + 1, n_trials)
+        picked_types = _sample_rows(rng, np.ones((n_trials, len(valid_types)), bool), n_types)
+        selected = np.zeros((n_trials, len(SHAPE_TYPES)), bool)
+        rows, cols = np.nonzero(picked_types >= 0)
+        selected[rows, valid_types[picked_types[rows, cols]]] = True
+    else:
+        if len(conditions) != n_trials:
+            raise ValueError(f"Expected {n_trials} conditions, got {len(conditions)}.")
+        selected = np.array([[t in combo.split("+") for t in SHAPE_TYPES] for _, combo in conditions], bool)
+        if selected[:, np.setdiff1d(np.arange(len(SHAPE_TYPES)), valid_types)].any():
+            raise ValueError("Condition uses a shape type with fewer than 3 shapes.")
+
+    # Shapes of those types, then N of them
+    valid_shapes = (types >= 0) & selected[:, np.maximum(types, 0)]
+    n_valid = valid_shapes.sum(axis=1)
+    if (n_valid < 3).any():
+        raise ValueError("Not enough valid shapes to continue.")
+    if conditions is None:
+        n_categories = rng.integers(2, np.minimum(MAX_CATEGORIES, n_valid) + 1)
+        shape_ids = _sample_rows(rng, valid_shapes, n_categories)[:, :MAX_CATEGORIES]
+    else:
+        n_categories = np.array([n for n, _ in conditions])
+        n_types = selected.sum(axis=1)
+        if ((n_categories < np.maximum(n_types, 2)) | (n_categories > np.minimum(MAX_CATEGORIES, n_valid))).any():
+            raise ValueError("Condition asks for more or fewer categories than its shape types allow.")
+        # One shape of every listed type, the rest from all of their shapes, in random order
+        forced = np.stack([_sample_rows(rng, valid_shapes & (types == t), selected[:, t].astype(int))[:, 0]
+                           for t in range(len(SHAPE_TYPES))], axis=1)
+        rest_valid = valid_shapes.copy()
+        rows, cols = np.nonzero(forced >= 0)
+        rest_valid[rows, forced[rows, cols]] = False
+        rest = _sample_rows(rng, rest_valid, n_categories - n_types)
+        ids = np.concatenate([forced, rest], axis=1)
+        keys = rng.random(ids.shape)
+        keys[ids < 0] = np.inf
+        shape_ids = np.take_along_axis(ids, np.argsort(keys, axis=1), axis=1)[:, :MAX_CATEGORIES]
+
+    # The target needs the data once; only the answer is kept
+    y_means = np.array([_exp1_data(seed, i)[1].mean(axis=1) for i in range(n_trials)]).reshape(n_trials, MAX_CATEGORIES)
+    used = np.arange(MAX_CATEGORIES) < n_categories[:, None]
+    target_idx = np.argmax(np.where(used, y_means, -np.inf), axis=1)
+
+    return Exp1Plan(
+        seed=seed,
+        shape_paths=shape_paths,
+        shape_types=types,
+        shape_ids=shape_ids.astype(np.int16),
+        n_categories=n_categories.astype(np.int8),
+        target_idx=target_idx.astype(np.int8),
+    )
+
+
+# --- Experiment 4 ---
+@dataclass(frozen=True)
+class Exp4Plan:
+    seed: int
+    shape_paths: tuple
+    shape_ids: np.ndarray    # (trials, 2, 4) int16, -1 padded; [:, 0] is Plot A
+    n_shapes: np.ndarray     # (trials, 2) int8
+    high_corr: np.ndarray    # (trials,) int8, 0 = A, 1 = B
+    seeds: np.ndarray        # (trials,) int64, data seed per trial
+
+    def __len__(self):
+        return len(self.high_corr)
+
+    def trial(self, i):
+        plots = [[self.shape_paths[j] for j in self.shape_ids[i, p, :self.n_shapes[i, p]]] for p in (0, 1)]
+        return {
+            "plotA_shapes": plots[0],
+            "plotB_shapes": plots[1],
+            "high_corr_plot": "AB"[self.high_corr[i]],
+            "seed": int(self.seeds[i]),
+        }
+
+
+def make_exp4_plan(shape_paths, n_trials, seed):
+    """Draw all Exp 4 trials: 2-4 distinct shapes per plot, which plot is correlated, data seed."""
+    rng = np.random.default_rng(seed)
+    shape_paths = tuple(sorted(shape_paths))
+    n_shapes = rng.integers(2, 5, (n_trials, 2))
+    valid = np.ones((n_trials * 2, len(shape_paths)), bool)
+    shape_ids = _sample_rows(rng, valid, n_shapes.ravel())[:, :4].reshape(n_trials, 2, 4)
+    return Exp4Plan(
+        seed=seed,
+        shape_paths=shape_paths,
+        shape_ids=shape_ids.astype(np.int16),
+        n_shapes=n_shapes.astype(np.int8),
+        high_corr=rng.integers(0, 2, n_trials).astype(np.int8),
+        seeds=rng.integers(0, 1000000, n_trials, endpoint=True),
+    )